@@ -0,0 +1,112 @@
+"""
+App-scoped services, built once per worker by the lifespan in main.py
+
+Routers depend on the get_* functions below instead of constructing
+services (and their Anthropic, Pinecone or boto3 clients) per request.
+"""
+from app.services.registry import ServiceRegistry
+from app.services.vocabulary_service import VocabularyService
+from app.services.vision_service import VisionService
+from app.services.kana_service import KanaService, KANA_LOCAL_RECOGNIZER
+from app.services.s3_service import S3Service
+from app.services.vector_store_service import VectorStoreService
+from app.services.youtube_transcription_service import YouTubeTranscriptionService
+from app.services.question_generation_service import QuestionGenerationService
+from app.services.tts_service import TTSService
+from app.services.ingestion import IngestionQueue
+from app.services.question_bank import QuestionBank
+from app.services.question_cache import SemanticQuestionCache
+from app.services.review_buffer import ReviewWriteBuffer
+from app.models.study_progress import StudyProgressRepository
+
+registry = ServiceRegistry()
+
+async def warm_kana(service: KanaService):
+    """Fetch kana-data.json and build the search index and local recognizer"""
+    await service.get_index()
+    if await service.get_recognizer() is None and KANA_LOCAL_RECOGNIZER:
+        # Reported by /ready; every evaluation goes to Claude
+        raise RuntimeError("recognizer disabled: no font")
+
+def close_vector_store(service: VectorStoreService):
+    service.claude.close()
+    VectorStoreService.shutdown()
+
+registry.register("vocabulary", VocabularyService, warmup=lambda service: service.get_index())
+registry.register("vision", VisionService, close=lambda service: service.claude.close())
+registry.register(
+    "kana",
+    lambda: KanaService(vision_service=registry.get("vision")),
+    warmup=warm_kana,
+    close=lambda service: KanaService.evaluation_cache.close()
+)
+registry.register("s3", S3Service)
+registry.register("vector_store", VectorStoreService, close=close_vector_store)
+registry.register("youtube", YouTubeTranscriptionService, close=lambda service: service.close())
+registry.register(
+    "ingestion",
+    lambda: IngestionQueue(registry.get("youtube"), registry.get("vector_store")),
+    warmup=lambda queue: queue.start(),
+    close=lambda queue: queue.shutdown()
+)
+registry.register("question_generator", QuestionGenerationService)
+registry.register(
+    "question_bank",
+    lambda: QuestionBank(
+        registry.get("question_generator"),
+        lambda topic, top_k: registry.get("vector_store").search_similar(topic, top_k)
+    ),
+    warmup=lambda bank: bank.start(),
+    close=lambda bank: bank.close()
+)
+registry.register(
+    "question_cache",
+    lambda: SemanticQuestionCache(lambda texts: registry.get("vector_store").embed_texts(texts))
+)
+registry.register("tts", TTSService)
+registry.register("study_progress", StudyProgressRepository)
+registry.register(
+    "review_buffer",
+    lambda: ReviewWriteBuffer(registry.get("study_progress")),
+    warmup=lambda buffer: buffer.start(),
+    close=lambda buffer: buffer.shutdown()
+)
+
+def get_vocabulary_service() -> VocabularyService:
+    return registry.get("vocabulary")
+
+def get_vision_service() -> VisionService:
+    return registry.get("vision")
+
+def get_kana_service() -> KanaService:
+    return registry.get("kana")
+
+def get_s3_service() -> S3Service:
+    return registry.get("s3")
+
+def get_vector_store() -> VectorStoreService:
+    return registry.get("vector_store")
+
+def get_youtube_service() -> YouTubeTranscriptionService:
+    return registry.get("youtube")
+
+def get_ingestion_queue() -> IngestionQueue:
+    return registry.get("ingestion")
+
+def get_question_generator() -> QuestionGenerationService:
+    return registry.get("question_generator")
+
+def get_question_bank() -> QuestionBank:
+    return registry.get("question_bank")
+
+def get_question_cache() -> SemanticQuestionCache:
+    return registry.get("question_cache")
+
+def get_tts_service() -> TTSService:
+    return registry.get("tts")
+
+def get_study_progress_repository() -> StudyProgressRepository:
+    return registry.get("study_progress")
+
+def get_review_buffer() -> ReviewWriteBuffer:
+    return registry.get("review_buffer")
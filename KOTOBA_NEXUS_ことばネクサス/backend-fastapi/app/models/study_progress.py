@@ -1,11 +1,27 @@
 import boto3
 import os
+import time
 import uuid
+import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Parallel DynamoDB requests per worker when writing a batch of reviews
+DYNAMODB_MAX_PARALLEL = int(os.getenv("DYNAMODB_MAX_PARALLEL", 8))
+# Attempts for items DynamoDB returns unprocessed (throttling)
+DYNAMODB_BATCH_ATTEMPTS = int(os.getenv("DYNAMODB_BATCH_ATTEMPTS", 5))
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource("dynamodb", region_name=os.getenv("AWS_REGION", "us-east-1"))
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name=os.getenv("AWS_REGION", "us-east-1"),
+    config=Config(max_pool_connections=DYNAMODB_MAX_PARALLEL * 2, retries={"max_attempts": 3, "mode": "standard"})
+)
 
 # Table references
 USER_PROGRESS_TABLE = os.getenv("DYNAMODB_USER_PROGRESS_TABLE", "KOTOBA_NEXUS_UserProgress")
@@ -16,13 +32,95 @@ user_progress_table = dynamodb.Table(USER_PROGRESS_TABLE)
 study_sessions_table = dynamodb.Table(STUDY_SESSIONS_TABLE)
 review_logs_table = dynamodb.Table(REVIEW_LOGS_TABLE)
 
+PROFICIENCY_MAX = 10
+# BatchWriteItem accepts at most 25 items per request
+BATCH_WRITE_SIZE = 25
+# Namespace of log ids derived from client-supplied review ids and idempotency keys
+REVIEW_ID_NAMESPACE = uuid.UUID("6f1d8a52-3c4e-4b7a-9d2f-0e5b7c9a1f34")
+# Batch markers kept per session and word item (oldest first); past this the
+# oldest are pruned down to half, so a retry is recognized while fewer than
+# REVIEW_MARKERS_MAX / 2 later idempotent batches have touched the same item
+REVIEW_MARKERS_MAX = int(os.getenv("REVIEW_MARKERS_MAX", 100))
+
+def review_item(
+    user_id: str,
+    session_id: str,
+    word_id: str,
+    correct: bool,
+    timestamp: Optional[str] = None,
+    review_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """A ReviewLogs item; a given review_id always maps to the same log id for this user"""
+    return {
+        "id": str(uuid.uuid5(REVIEW_ID_NAMESPACE, f"{user_id}\0{review_id}")) if review_id else str(uuid.uuid4()),
+        "user_id": user_id,
+        "session_id": session_id,
+        "word_id": word_id,
+        "correct": correct,
+        "timestamp": timestamp or datetime.now().isoformat()
+    }
+
+@dataclass
+class ReviewBatch:
+    """
+    Reviews coalesced for writing: their log items, totals per session and per word
+
+    StudyProgressRepository.apply_reviews() removes each part once it is
+    written, so a batch that failed part-way is retried without counting
+    anything twice. A batch with a `marker` (from a client idempotency key)
+    can also be sent again from scratch: its session and word updates are
+    recorded under the marker and skipped where it is already present
+    (within the last REVIEW_MARKERS_MAX / 2 batches of that item).
+    """
+    marker: Optional[str] = None
+    logs: List[Dict[str, Any]] = field(default_factory=list)
+    sessions: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    words: Dict[Tuple[str, str], Dict[str, Any]] = field(default_factory=dict)
+    # (user_id, word_id) -> proficiency level after the batch
+    proficiency: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+    def add(self, review: Dict[str, Any]):
+        self.logs.append(review)
+        outcome = "correct_count" if review["correct"] else "wrong_count"
+        session = self.sessions.setdefault(review["session_id"], {"review_count": 0, "correct_count": 0, "wrong_count": 0})
+        session["review_count"] += 1
+        session[outcome] += 1
+        word = self.words.setdefault(
+            (review["user_id"], review["word_id"]),
+            {"correct_count": 0, "wrong_count": 0, "last_reviewed": review["timestamp"]}
+        )
+        word[outcome] += 1
+        word["last_reviewed"] = max(word["last_reviewed"], review["timestamp"])
+
+    @property
+    def done(self) -> bool:
+        return not (self.logs or self.sessions or self.words)
+
 class StudyProgressRepository:
-    """Handles study progress tracking across multiple DynamoDB tables"""
+    """
+    Handles study progress tracking across multiple DynamoDB tables
+
+    Reviews are written as a ReviewBatch: log items in BatchWriteItem
+    requests of 25, one ADD per session with the batch's totals, and one
+    conditional update per word that moves proficiency_level by the net
+    result (correct minus wrong, kept within 0-10) without reading it
+    first. The requests run in parallel.
+    """
+
+    # Shared by every instance in this worker
+    _executor = ThreadPoolExecutor(max_workers=DYNAMODB_MAX_PARALLEL, thread_name_prefix="dynamodb")
+
+    def __init__(self, resource=None):
+        # Another resource (tests, DynamoDB Local) gets the same table names
+        self.dynamodb = resource or dynamodb
+        self.user_progress_table = self.dynamodb.Table(USER_PROGRESS_TABLE) if resource else user_progress_table
+        self.study_sessions_table = self.dynamodb.Table(STUDY_SESSIONS_TABLE) if resource else study_sessions_table
+        self.review_logs_table = self.dynamodb.Table(REVIEW_LOGS_TABLE) if resource else review_logs_table
 
     def get_user_progress(self, user_id: str) -> Dict[str, Any]:
         """Retrieve all study progress data for a user from DynamoDB"""
         try:
-            response = user_progress_table.query(
+            response = self.user_progress_table.query(
                 KeyConditionExpression="user_id = :uid",
                 ExpressionAttributeValues={":uid": user_id}
             )
@@ -61,77 +159,280 @@ class StudyProgressRepository:
             print(f"Error retrieving user progress: {str(e)}")
             return {"error": str(e)}
 
-    def update_word_progress(self, user_id: str, word_id: str, correct: bool) -> Dict[str, Any]:
-        """Update word progress in the UserProgress table"""
-        now = datetime.now().isoformat()
-        
-        # Get current progress
-        current_progress = self.get_word_progress(user_id, word_id)
-        
-        # Calculate new proficiency level
-        current_proficiency = current_progress.get("proficiency_level", 0)
-        new_proficiency = min(10, current_proficiency + 1) if correct else max(0, current_proficiency - 1)
-
-        # Update item
-        response = user_progress_table.update_item(
-            Key={"user_id": user_id, "word_id": word_id},
-            UpdateExpression=(
-                "SET last_reviewed = :now, proficiency_level = :prof, "
-                + ("correct_count = if_not_exists(correct_count, :zero) + :one" if correct
-                   else "wrong_count = if_not_exists(wrong_count, :zero) + :one")
-            ),
-            ExpressionAttributeValues={":now": now, ":prof": new_proficiency, ":zero": 0, ":one": 1},
-            ReturnValues="ALL_NEW",
-        )
-        
-        return response.get("Attributes", {})
+    def write_review_logs(self, items: List[Dict[str, Any]]):
+        """Put up to 25 ReviewLogs items in one BatchWriteItem, retrying unprocessed ones with backoff"""
+        requests = [{"PutRequest": {"Item": item}} for item in items]
+        for attempt in range(DYNAMODB_BATCH_ATTEMPTS):
+            response = self.dynamodb.batch_write_item(RequestItems={REVIEW_LOGS_TABLE: requests})
+            requests = response.get("UnprocessedItems", {}).get(REVIEW_LOGS_TABLE, [])
+            if not requests:
+                return
+            time.sleep(random.uniform(0, min(2.0, 0.05 * 2 ** attempt)))
+        raise RuntimeError(f"{len(requests)} review logs still unprocessed after {DYNAMODB_BATCH_ATTEMPTS} attempts")
 
-    def log_review(self, user_id: str, session_id: str, word_id: str, correct: bool) -> Dict[str, Any]:
-        """Log a review event and update study session stats"""
+    def _prune_markers(self, table, key: Dict[str, str], markers: List[str]):
+        """Drop the oldest batch markers of an item once it holds more than REVIEW_MARKERS_MAX"""
+        if len(markers) <= REVIEW_MARKERS_MAX:
+            return
+        stale = len(markers) - REVIEW_MARKERS_MAX // 2
         try:
-            review_id = str(uuid.uuid4())
-            now = datetime.now().isoformat()
-
-            # Insert into ReviewLogs
-            review_item = {
-                "id": review_id,
-                "user_id": user_id,
-                "session_id": session_id,
-                "word_id": word_id,
-                "correct": correct,
-                "timestamp": now
-            }
-            review_logs_table.put_item(Item=review_item)
+            table.update_item(
+                Key=key,
+                UpdateExpression="REMOVE " + ", ".join(f"applied_batches[{i}]" for i in range(stale)),
+                # Not pruned meanwhile by another writer
+                ConditionExpression="applied_batches[0] = :oldest",
+                ExpressionAttributeValues={":oldest": markers[0]}
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
 
-            # Update Study Session Statistics
-            update_expr = "ADD review_count :inc, "
-            update_expr += "correct_count :inc" if correct else "wrong_count :inc"
+    def add_session_totals(self, session_id: str, totals: Dict[str, int], marker: Optional[str] = None):
+        """
+        Add a batch's review, correct and wrong counts to a study session in one update
 
-            study_sessions_table.update_item(
+        With a marker, the update is appended to applied_batches and skipped
+        when that batch was already added.
+        """
+        values = {
+            ":reviews": totals["review_count"],
+            ":correct": totals["correct_count"],
+            ":wrong": totals["wrong_count"]
+        }
+        if marker is None:
+            self.study_sessions_table.update_item(
+                Key={"id": session_id},
+                UpdateExpression="ADD review_count :reviews, correct_count :correct, wrong_count :wrong",
+                ExpressionAttributeValues=values
+            )
+            return
+        try:
+            response = self.study_sessions_table.update_item(
                 Key={"id": session_id},
-                UpdateExpression=update_expr,
-                ExpressionAttributeValues={":inc": 1}
+                UpdateExpression=(
+                    "SET applied_batches = list_append(if_not_exists(applied_batches, :none), :markers)"
+                    " ADD review_count :reviews, correct_count :correct, wrong_count :wrong"
+                ),
+                ConditionExpression="NOT contains(applied_batches, :marker)",
+                ExpressionAttributeValues={**values, ":none": [], ":markers": [marker], ":marker": marker},
+                ReturnValues="UPDATED_NEW"
             )
+        except ClientError as e:
+            # The only condition: this batch was added before
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            return
+        self._prune_markers(
+            self.study_sessions_table, {"id": session_id}, response.get("Attributes", {}).get("applied_batches", [])
+        )
+
+    def _applied_word(self, user_id: str, word_id: str, marker: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The word's progress if the batch with this marker was already applied to it"""
+        if marker is None:
+            return None
+        item = self.user_progress_table.get_item(
+            Key={"user_id": user_id, "word_id": word_id}, ConsistentRead=True
+        ).get("Item", {})
+        if marker in item.get("applied_batches", []):
+            return {"proficiency_level": item.get("proficiency_level", 0)}
+        return None
+
+    def _applied(self, user_id: str, word_id: str, attributes: Dict[str, Any]) -> Dict[str, Any]:
+        """The attributes of a word update, after pruning its markers"""
+        markers = attributes.pop("applied_batches", [])
+        self._prune_markers(self.user_progress_table, {"user_id": user_id, "word_id": word_id}, markers)
+        return attributes
+
+    def apply_word_progress(
+        self,
+        user_id: str,
+        word_id: str,
+        correct_count: int,
+        wrong_count: int,
+        last_reviewed: str,
+        marker: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Add reviews to a word's progress atomically, without reading it first
+
+        proficiency_level moves by correct_count - wrong_count. The update
+        is conditional on the result staying within 0-PROFICIENCY_MAX; when
+        it would not, a second conditional update sets the bound instead.
+        Either way the counters and last_reviewed are updated in the same
+        write. Returns the updated attributes.
+
+        The bound applies to the net change, not after each review, so the
+        result can differ from logging the same reviews one by one: from
+        level 9, correct, correct, wrong gives 9 one at a time (10, 10, 9)
+        but 10 as a batch (9 + 1). The counters are the same either way.
+
+        With a marker, the update also appends it to applied_batches and is
+        skipped (returning the current level) when the marker is already
+        there, so a retried batch is not applied twice.
+        """
+        delta = correct_count - wrong_count
+        values = {":now": last_reviewed, ":correct": correct_count, ":wrong": wrong_count}
+        counters = " ADD correct_count :correct, wrong_count :wrong"
+        not_applied = ""
+        if marker is not None:
+            values.update({":none": [], ":markers": [marker], ":marker": marker})
+            counters = ", applied_batches = list_append(if_not_exists(applied_batches, :none), :markers)" + counters
+            not_applied = " AND NOT contains(applied_batches, :marker)"
+
+        for _ in range(4):
+            # Moved by delta, if the result stays in range
+            low, high = max(0, -delta), min(PROFICIENCY_MAX, PROFICIENCY_MAX - delta)
+            if low <= high:
+                condition = "proficiency_level BETWEEN :low AND :high"
+                if 0 <= delta <= PROFICIENCY_MAX:
+                    condition = "attribute_not_exists(proficiency_level) OR " + condition
+                condition = f"({condition}){not_applied}"
+                try:
+                    response = self.user_progress_table.update_item(
+                        Key={"user_id": user_id, "word_id": word_id},
+                        UpdateExpression="SET last_reviewed = :now, proficiency_level = if_not_exists(proficiency_level, :zero) + :delta" + counters,
+                        ConditionExpression=condition,
+                        ExpressionAttributeValues={**values, ":zero": 0, ":delta": delta, ":low": low, ":high": high},
+                        ReturnValues="UPDATED_NEW"
+                    )
+                    return self._applied(user_id, word_id, response.get("Attributes", {}))
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                        raise
+                    applied = self._applied_word(user_id, word_id, marker)
+                    if applied is not None:
+                        return applied
+
+            # Clamped to the bound it would have crossed (unless another writer moved it back meanwhile)
+            if delta > 0:
+                bound, crossed = PROFICIENCY_MAX, {":limit": high}
+                condition = "attribute_not_exists(proficiency_level) OR proficiency_level > :limit"
+            else:
+                bound, crossed = 0, {":limit": low}
+                condition = "attribute_not_exists(proficiency_level) OR proficiency_level < :limit"
+            condition = f"({condition}){not_applied}"
+            try:
+                response = self.user_progress_table.update_item(
+                    Key={"user_id": user_id, "word_id": word_id},
+                    UpdateExpression="SET last_reviewed = :now, proficiency_level = :bound" + counters,
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues={**values, ":bound": bound, **crossed},
+                    ReturnValues="UPDATED_NEW"
+                )
+                return self._applied(user_id, word_id, response.get("Attributes", {}))
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                applied = self._applied_word(user_id, word_id, marker)
+                if applied is not None:
+                    return applied
+        raise RuntimeError(f"Progress of {word_id} for {user_id} kept changing during the update")
+
+    def apply_reviews(self, batch: ReviewBatch) -> ReviewBatch:
+        """
+        Write a batch in parallel requests, removing each written part from it
 
-            # Update word progress
-            progress = self.update_word_progress(user_id, word_id, correct)
+        Raises the first error once every request has finished; the batch
+        then holds only what is left to write.
+        """
+        futures = {}
+        for start in range(0, len(batch.logs), BATCH_WRITE_SIZE):
+            items = batch.logs[start:start + BATCH_WRITE_SIZE]
+            futures[self._executor.submit(self.write_review_logs, items)] = ("logs", items)
+        for session_id, totals in batch.sessions.items():
+            futures[self._executor.submit(self.add_session_totals, session_id, totals, batch.marker)] = ("session", session_id)
+        for key, totals in batch.words.items():
+            futures[self._executor.submit(self.apply_word_progress, *key, **totals, marker=batch.marker)] = ("word", key)
 
+        failed_logs, error = [], None
+        for future, (kind, what) in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                if kind == "logs":
+                    failed_logs += what
+                continue
+            if kind == "session":
+                del batch.sessions[what]
+            elif kind == "word":
+                del batch.words[what]
+                batch.proficiency[what] = int(result.get("proficiency_level", 0))
+        batch.logs = failed_logs
+        if error is not None:
+            raise error
+        return batch
+
+    def update_word_progress(self, user_id: str, word_id: str, correct: bool) -> Dict[str, Any]:
+        """Update word progress in the UserProgress table"""
+        return self.apply_word_progress(
+            user_id, word_id,
+            correct_count=1 if correct else 0,
+            wrong_count=0 if correct else 1,
+            last_reviewed=datetime.now().isoformat()
+        )
+
+    def log_review(self, user_id: str, session_id: str, word_id: str, correct: bool) -> Dict[str, Any]:
+        """Log a review event and update study session stats"""
+        try:
+            review = review_item(user_id, session_id, word_id, correct)
+            batch = ReviewBatch()
+            batch.add(review)
+            self.apply_reviews(batch)
             return {
-                "review_id": review_id,
+                "review_id": review["id"],
                 "session_id": session_id,
                 "word_id": word_id,
                 "correct": correct,
-                "timestamp": now,
-                "proficiency_level": progress.get("proficiency_level", 0)
+                "timestamp": review["timestamp"],
+                "proficiency_level": batch.proficiency[(user_id, word_id)]
             }
         except Exception as e:
             print(f"Error logging review: {str(e)}")
             raise
 
+    def log_reviews(
+        self,
+        user_id: str,
+        session_id: str,
+        reviews: List[Dict[str, Any]],
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Log a whole session's reviews ({"word_id", "correct", optional "timestamp" and "id"}) in one batch
+
+        Idempotent when the client identifies the batch, by an
+        idempotency_key or by an id on every review: log ids are derived
+        from those ids (so a retry overwrites the same items), and the
+        session and word updates are conditional on a marker of the batch,
+        so a retry after a partial failure only applies what is missing.
+        """
+        if idempotency_key is None and reviews and all(review.get("id") for review in reviews):
+            idempotency_key = "\0".join(sorted(str(review["id"]) for review in reviews))
+        marker = None
+        if idempotency_key is not None:
+            marker = hashlib.sha256(f"{user_id}\0{session_id}\0{idempotency_key}".encode("utf-8")).hexdigest()[:16]
+
+        batch = ReviewBatch(marker=marker)
+        for position, review in enumerate(reviews):
+            review_id = review.get("id") or (f"{idempotency_key}\0{position}" if idempotency_key is not None else None)
+            batch.add(review_item(
+                user_id, session_id, review["word_id"], review["correct"], review.get("timestamp"), review_id
+            ))
+        correct = sum(1 for review in reviews if review["correct"])
+        self.apply_reviews(batch)
+        return {
+            "session_id": session_id,
+            "logged": len(reviews),
+            "correct": correct,
+            "wrong": len(reviews) - correct,
+            "proficiency": {word_id: level for (_, word_id), level in batch.proficiency.items()}
+        }
+
     def get_user_progress_summary(self, user_id: str) -> Dict[str, Any]:
         """Get overall study progress summary for a user"""
         try:
-            response = user_progress_table.query(
+            response = self.user_progress_table.query(
                 KeyConditionExpression="user_id = :uid",
                 ExpressionAttributeValues={":uid": user_id}
             )
@@ -163,4 +464,4 @@ class StudyProgressRepository:
                 "user_id": user_id,
                 "total_words_studied": 0,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
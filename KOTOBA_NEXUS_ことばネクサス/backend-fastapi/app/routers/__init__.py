@@ -1,4 +1,4 @@
-from .vocabulary_router import router as vocabulary_router
+from .vocabulary import router as vocabulary_router
 from .kana_practice import router as kana_practice_router
 from .study_progress import router as study_progress_router
 from .listening import router as listening_router
@@ -1,77 +1,232 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from typing import Optional
-from ..services.kana_service import KanaService
+import os
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request, BackgroundTasks, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime
+from urllib.parse import unquote_plus
+import orjson
+from ..services.kana_service import KanaService, KANA_BATCH_MAX_ITEMS
+from ..services.s3_service import S3Service, S3_UPLOAD_PREFIX
+from ..dependencies import get_kana_service, get_s3_service
+from ..services.image_preprocessing import DEFAULT_CONFIG as PREPROCESS_DEFAULTS
+from ..utils.responses import catalog_responses
+from ..utils.concurrency import cancel_on_disconnect
 
 router = APIRouter(prefix="/kana-practice", tags=["Kana Practice"])
 
-# Dependency
-def get_kana_service():
-    return KanaService()
+# Shared secret for /s3-events; the endpoint is disabled when unset
+S3_EVENT_TOKEN = os.getenv("S3_EVENT_TOKEN")
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload, rejecting it before buffering if it is over the size limit"""
+    max_bytes = PREPROCESS_DEFAULTS.max_upload_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {max_bytes} bytes")
+    return await file.read(max_bytes + 1)
+
+def check_upload_key(file_key: str) -> str:
+    """Only objects written through /upload-url may be read back"""
+    if not file_key.startswith(S3_UPLOAD_PREFIX) or ".." in file_key:
+        raise HTTPException(status_code=400, detail=f"file_key must be under {S3_UPLOAD_PREFIX}")
+    return file_key
+
+def parse_expected_kana(expected_kana: Optional[str], count: int) -> List[Optional[str]]:
+    """Comma-separated expected kana, one per image (empty entries mean unknown)"""
+    if not expected_kana:
+        return [None] * count
+    expected = [kana.strip() or None for kana in expected_kana.split(",")]
+    if len(expected) != count:
+        raise HTTPException(status_code=400, detail=f"expected_kana lists {len(expected)} kana for {count} images")
+    return expected
 
 @router.post("/evaluate")
 async def evaluate_kana(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    file_key: Optional[str] = Form(None),
     eval_type: str = Form("character"),
     expected_kana: Optional[str] = Form(None),
-    kana_service: KanaService = Depends(get_kana_service)
+    kana_service: KanaService = Depends(get_kana_service),
+    s3_service: S3Service = Depends(get_s3_service)
 ):
-    """Evaluate kana writing from uploaded image"""
+    """
+    Evaluate kana writing from an uploaded image, or from `file_key`
+    returned by /upload-url after the client PUT the image to S3
+    """
     try:
-        contents = await file.read()
-        result = await kana_service.evaluate_kana_image(
-            image_data=contents, 
-            eval_type=eval_type,
-            expected_kana=expected_kana
-        )
+        if file_key:
+            evaluation = kana_service.evaluate_s3_object(check_upload_key(file_key), expected_kana, s3_service)
+        elif file is not None:
+            # Reject oversized uploads before buffering or decoding them
+            contents = await read_upload(file)
+            evaluation = kana_service.evaluate_kana_image(image_data=contents, expected_kana=expected_kana)
+        else:
+            raise HTTPException(status_code=400, detail="Upload a file or give a file_key")
+        # Abandon the vision call (and free its slot) if the client goes away
+        result = await cancel_on_disconnect(request, evaluation)
         
         if not result.get("success", False):
             raise HTTPException(status_code=400, detail=result.get("error", "Evaluation failed"))
             
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/evaluate-batch")
+async def evaluate_kana_batch(
+    files: List[UploadFile] = File(default=[]),
+    worksheet: Optional[UploadFile] = File(None),
+    rows: int = Form(0),
+    cols: int = Form(0),
+    expected_kana: Optional[str] = Form(None),
+    kana_service: KanaService = Depends(get_kana_service)
+):
+    """
+    Evaluate many kana drawings in one request
+
+    Send either several `files`, or one `worksheet` image with `rows` and
+    `cols` to split it into grid cells (read row by row). `expected_kana` is
+    a comma-separated list in the same order. Results stream back as NDJSON,
+    one line per item ({"index": ..., ...evaluation}) as each one finishes.
+    """
+    if worksheet is not None:
+        if rows < 1 or cols < 1:
+            raise HTTPException(status_code=400, detail="rows and cols are required with a worksheet")
+        if rows * cols > KANA_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {KANA_BATCH_MAX_ITEMS} cells per batch")
+        images = await kana_service.vision_service.prepare_worksheet(await read_upload(worksheet), rows, cols)
+    elif files:
+        if len(files) > KANA_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {KANA_BATCH_MAX_ITEMS} images per batch")
+        images = [await read_upload(file) for file in files]
+    else:
+        raise HTTPException(status_code=400, detail="Upload files or a worksheet")
+
+    expected = parse_expected_kana(expected_kana, len(images))
+
+    async def stream():
+        async for result in kana_service.evaluate_batch(images, expected):
+            yield orjson.dumps(result) + b"\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"X-Total-Count": str(len(images))}
+    )
+
 @router.get("/data")
 async def get_kana_data(
+    request: Request,
     kana_service: KanaService = Depends(get_kana_service)
 ):
     """Get kana character data"""
     try:
-        return await kana_service.get_kana()
+        index = await kana_service.get_index()
+        kana_data = await kana_service.get_kana()
+        return await catalog_responses.respond(request, index.version, lambda: kana_data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search")
 async def search_kana(
+    request: Request,
     query: str,
     kana_service: KanaService = Depends(get_kana_service)
 ):
     """Search for kana characters"""
     try:
-        return await kana_service.search_kana(query)
+        index = await kana_service.get_index()
+        return await catalog_responses.respond(request, index.version, lambda: index.search(query))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/upload-url")
 async def get_upload_url(
     filename: str,
+    expected_kana: Optional[str] = None,
     s3_service: S3Service = Depends(get_s3_service)
 ):
-    """Get a presigned URL for uploading an image to S3"""
+    """
+    Get a presigned URL for uploading an image to S3
+
+    With `expected_kana`, the upload must also send the returned `headers`;
+    the kana is then stored with the object, so an S3-event-triggered
+    evaluation knows what to compare against.
+    """
     try:
         # Generate a unique file key
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        file_key = f"user-uploads/{timestamp}_{filename}"
+        file_key = f"{S3_UPLOAD_PREFIX}{timestamp}_{filename}"
+        metadata = s3_service.upload_metadata(expected_kana)
         
         # Generate the presigned URL
-        presigned_url = s3_service.generate_presigned_url(file_key)
+        presigned_url = s3_service.generate_presigned_url(file_key, metadata=metadata)
         
         if not presigned_url:
             raise HTTPException(status_code=500, detail="Failed to generate upload URL")
         
         return {
             "upload_url": presigned_url,
-            "file_key": file_key
+            "file_key": file_key,
+            "headers": {
+                "Content-Type": "image/jpeg",
+                **{f"x-amz-meta-{name}": value for name, value in metadata.items()}
+            }
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/s3-events", status_code=202)
+async def handle_s3_events(
+    event: dict,
+    background_tasks: BackgroundTasks,
+    x_s3_event_token: Optional[str] = Header(None),
+    kana_service: KanaService = Depends(get_kana_service),
+    s3_service: S3Service = Depends(get_s3_service)
+):
+    """
+    Pre-evaluate uploads from an S3 ObjectCreated notification
+
+    Accepts the standard S3 event JSON (forwarded by SNS, EventBridge or a
+    Lambda) and evaluates every new object under the upload prefix in the
+    background. A later /evaluate with the same file_key then returns the
+    stored result without touching S3 again.
+    """
+    if not S3_EVENT_TOKEN:
+        raise HTTPException(status_code=404, detail="S3 events are not enabled")
+    if x_s3_event_token != S3_EVENT_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid event token")
+
+    file_keys = []
+    for record in event.get("Records", []):
+        if not record.get("eventName", "").startswith("ObjectCreated"):
+            continue
+        s3 = record.get("s3", {})
+        if s3.get("bucket", {}).get("name") != s3_service.bucket_name:
+            continue
+        # Keys in S3 notifications are URL-encoded
+        file_key = unquote_plus(s3.get("object", {}).get("key", ""))
+        if file_key.startswith(S3_UPLOAD_PREFIX) and ".." not in file_key:
+            file_keys.append(file_key)
+
+    async def evaluate_all():
+        results = await asyncio.gather(
+            *(kana_service.evaluate_s3_object(file_key, s3_service=s3_service) for file_key in file_keys),
+            return_exceptions=True
+        )
+        for file_key, result in zip(file_keys, results):
+            if isinstance(result, Exception):
+                print(f"Error evaluating {file_key} from S3 event: {str(result)}")
+
+    if file_keys:
+        background_tasks.add_task(evaluate_all)
+    return {"accepted": file_keys}
\ No newline at end of file
@@ -1,34 +1,34 @@
-from fastapi import APIRouter, Body, HTTPException, Depends
-from typing import List, Dict, Any, Optional
-from ..services.vector_store import VectorStoreService
-from ..services.youtube_transcription import YouTubeTranscriptionService
-from ..services.tts_service import TTSService
-from ..services.question_generator import QuestionGeneratorService
+import time
+import asyncio
+from fastapi import APIRouter, Body, HTTPException, Depends, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import List, Dict, Any, AsyncIterator, Optional
+from ..services.vocabulary_service import VocabularyService
+from ..services.youtube_transcription_service import YOUTUBE_SUBTITLE_LANG
+from ..services.question_generation_service import DIFFICULTIES
+from ..services.question_bank import question_id, topic_pool, word_pool
+from ..services.tts_service import TTS_VOICE
+from ..services.audio_cache import AUDIO_CACHE_CONTROL, CONTENT_TYPES, is_audio_name
+from ..utils.responses import SSE_HEADERS, sse_event
+from ..dependencies import (
+    get_vector_store, get_youtube_service, get_tts_service, get_question_generator, get_vocabulary_service,
+    get_ingestion_queue, get_question_bank, get_question_cache
+)
 
 router = APIRouter(prefix="/api/listening", tags=["Listening Practice"])
 
-# Dependency injection
-def get_vector_store():
-    return VectorStoreService()
-
-def get_youtube_service():
-    return YouTubeTranscriptionService()
-
-def get_tts_service():
-    return TTSService()
-
-def get_question_generator():
-    return QuestionGeneratorService()
-
 @router.post("/youtube/transcribe")
 async def transcribe_youtube(
     youtube_url: str = Body(..., embed=True),
+    lang: str = Body(YOUTUBE_SUBTITLE_LANG, embed=True),
     youtube_service = Depends(get_youtube_service)
 ):
-    """Get transcriptions from YouTube video"""
+    """Get timestamped subtitle segments and embedding windows for a YouTube video (cached per video and language)"""
     try:
-        transcription = await youtube_service.get_transcription(youtube_url)
+        transcription = await youtube_service.get_transcription(youtube_url, lang)
         return {"success": True, "transcription": transcription}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -37,65 +37,312 @@ async def store_transcriptions(
     transcriptions: List[str] = Body(...),
     vector_store = Depends(get_vector_store)
 ):
-    """Store transcriptions in vector database"""
+    """Store transcriptions in vector database (texts already stored are skipped); large sets belong in /ingest/transcriptions"""
     try:
-        vector_store.add_transcriptions(transcriptions)
-        return {"success": True, "message": f"Stored {len(transcriptions)} transcriptions"}
+        counts = await asyncio.to_thread(vector_store.add_transcriptions, transcriptions)
+        return {"success": True, "message": f"Stored {counts['added']} new transcriptions", **counts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/ingest/youtube", status_code=202)
+async def ingest_youtube(
+    youtube_url: str = Body(..., embed=True),
+    lang: str = Body(YOUTUBE_SUBTITLE_LANG, embed=True),
+    ingestion = Depends(get_ingestion_queue)
+):
+    """Queue a video for transcription, chunking, embedding and upsert; poll /ingest/jobs/{job_id}"""
+    job = await ingestion.submit_video(youtube_url, lang)
+    return {"success": True, "job": job}
+
+@router.post("/ingest/transcriptions", status_code=202)
+async def ingest_transcriptions(
+    transcriptions: List[str] = Body(...),
+    ingestion = Depends(get_ingestion_queue)
+):
+    """Queue transcriptions for embedding and upsert in the background"""
+    job = await ingestion.submit_texts(transcriptions)
+    return {"success": True, "job": job}
+
+@router.get("/ingest/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, ingestion = Depends(get_ingestion_queue)):
+    """Status, stage and progress of an ingestion job"""
+    job = await ingestion.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return {"success": True, "job": job}
+
+def stored_question_events(question: Dict[str, Any]) -> List[bytes]:
+    """The SSE events of a question served from the bank or cache, all at once"""
+    events = [sse_event("context", {"context": question.get("context", "")})]
+    events += [
+        sse_event("field", {"field": name, "value": question[name]})
+        for name in ("question", "options", "correct_answer", "explanation") if name in question
+    ]
+    return events + [sse_event("done", question)]
+
+async def stored_question(
+    topic: str,
+    difficulty: str,
+    user_id: Optional[str],
+    bypass_cache: bool,
+    question_generator,
+    question_bank,
+    question_cache
+) -> Optional[Dict[str, Any]]:
+    """
+    A question from the bank, else one generated for a similar topic; None when bypassed or missed
+
+    Both skip the questions this user was served recently.
+    """
+    if not bypass_cache:
+        question = await question_bank.take_topic(topic, difficulty, user_id)
+        if question is not None:
+            return question
+    question = await question_cache.get(
+        topic, difficulty, question_generator.model_id, bypass=bypass_cache,
+        exclude=question_bank.recently_served(user_id)
+    )
+    if question is not None:
+        question_bank.mark_served(user_id, question["id"])
+    return question
+
+async def store_question(
+    topic: str,
+    difficulty: str,
+    user_id: Optional[str],
+    question: Dict[str, Any],
+    started: float,
+    question_generator,
+    question_bank,
+    question_cache
+):
+    """Keep a live question for later requests (the bank and the semantic cache), except this user's"""
+    generation_ms = (time.perf_counter() - started) * 1000
+    key = topic_pool(topic, difficulty)
+    await question_bank.add(key, [question], user_id)
+    # Cached under its bank id, so a user's recent set covers both
+    await question_cache.put(
+        topic, difficulty, question_generator.model_id, {**question, "id": question_id(key, question)}, generation_ms
+    )
+
+async def question_events(
+    topic: str,
+    difficulty: str,
+    user_id: Optional[str],
+    bypass_cache: bool,
+    vector_store,
+    question_generator,
+    question_bank,
+    question_cache
+) -> AsyncIterator[bytes]:
+    """SSE stream: the retrieved context, then tokens and completed fields, then the whole question"""
+    try:
+        stored = await stored_question(
+            topic, difficulty, user_id, bypass_cache, question_generator, question_bank, question_cache
+        )
+        if stored is not None:
+            for event in stored_question_events(stored):
+                yield event
+            return
+
+        started = time.perf_counter()
+        similar_texts = await asyncio.to_thread(vector_store.search_similar, topic, 3)
+        context = " ".join([item["text"] for item in similar_texts])
+        yield sse_event("context", {"context": context})
+        async for event in question_generator.stream_question(context, topic, difficulty):
+            name = event.pop("event")
+            if name == "done":
+                question = {**event["question"], "context": context}
+                await store_question(topic, difficulty, user_id, question, started, question_generator, question_bank, question_cache)
+                yield sse_event("done", {**question, "source": "live"})
+            else:
+                yield sse_event(name, event)
+    except HTTPException as e:
+        # Headers are already sent; report the failure in-band
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        yield sse_event("error", {"status_code": 500, "detail": str(e)})
+
 @router.post("/generate-question")
 async def generate_question(
+    request: Request,
     topic: str = Body(..., embed=True),
     difficulty: str = Body("medium"),
+    user_id: Optional[str] = Body(None),
+    bypass_cache: bool = Body(False),
     vector_store = Depends(get_vector_store),
-    question_generator = Depends(get_question_generator)
+    question_generator = Depends(get_question_generator),
+    question_bank = Depends(get_question_bank),
+    question_cache = Depends(get_question_cache)
 ):
-    """Generate a listening question based on a topic"""
+    """
+    Generate a listening question based on a topic
+
+    Questions come from the pre-generated bank when it has one this user
+    (if given) was not served recently, then from the semantic cache when
+    a question was generated recently for a similar topic (with its
+    provenance under "cache"); otherwise one is generated live and stored
+    in both. bypass_cache=true always generates. With "Accept: text/event-stream" the question is
+    streamed as Server-Sent Events (context, token, field, done, error).
+    """
+    if difficulty not in DIFFICULTIES:
+        raise HTTPException(status_code=400, detail=f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            question_events(
+                topic, difficulty, user_id, bypass_cache, vector_store, question_generator, question_bank, question_cache
+            ),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+
     try:
-        # Get similar transcriptions from vector store
-        similar_texts = vector_store.search_similar(topic, top_k=3)
-        
-        # Generate question using the retrieved context
-        context = " ".join([item["text"] for item in similar_texts])
-        question = await question_generator.generate_question(context, topic, difficulty)
-        
-        return {
+        question = await stored_question(
+            topic, difficulty, user_id, bypass_cache, question_generator, question_bank, question_cache
+        )
+        if question is None:
+            started = time.perf_counter()
+            # Get similar transcriptions from vector store
+            similar_texts = await asyncio.to_thread(vector_store.search_similar, topic, 3)
+
+            # Generate question using the retrieved context
+            context = " ".join([item["text"] for item in similar_texts])
+            question = await question_generator.generate_question(context, topic, difficulty)
+            await store_question(topic, difficulty, user_id, question, started, question_generator, question_bank, question_cache)
+            question["source"] = "live"
+
+        response = {
             "success": True,
             "question": question["question"],
             "options": question["options"],
             "correct_answer": question["correct_answer"],
-            "context": question["context"]
+            "context": question["context"],
+            "source": question["source"]
         }
+        if "cache" in question:
+            response["cache"] = question["cache"]
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/generate-question/stream")
+async def stream_question(
+    topic: str,
+    difficulty: str = "medium",
+    user_id: Optional[str] = None,
+    bypass_cache: bool = False,
+    vector_store = Depends(get_vector_store),
+    question_generator = Depends(get_question_generator),
+    question_bank = Depends(get_question_bank),
+    question_cache = Depends(get_question_cache)
+):
+    """Server-Sent Events variant of POST /generate-question, usable with EventSource"""
+    if difficulty not in DIFFICULTIES:
+        raise HTTPException(status_code=400, detail=f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+    return StreamingResponse(
+        question_events(
+            topic, difficulty, user_id, bypass_cache, vector_store, question_generator, question_bank, question_cache
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.post("/generate-audio")
 async def generate_audio(
     text: str = Body(..., embed=True),
+    voice: str = Body(TTS_VOICE),
     tts_service = Depends(get_tts_service)
 ):
-    """Generate audio for a given text using TTS service"""
+    """Generate audio for a given text using TTS service (stable URL; synthesized once per text and voice)"""
     try:
-        audio_url = await tts_service.generate_audio(text)
+        audio_url = await tts_service.generate_audio(text, voice)
         return {"success": True, "audio_url": audio_url}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def audio_stream_response(text: str, voice: str, tts_service) -> StreamingResponse:
+    """Stream MP3 for a passage; the first chunk is awaited here so a failure is still an HTTP error"""
+    chunks = tts_service.stream_audio(text, voice)
+    try:
+        first = await chunks.__anext__()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Speech synthesis failed: {str(e)}")
+
+    async def body() -> AsyncIterator[bytes]:
+        yield first
+        try:
+            async for audio in chunks:
+                yield audio
+        except Exception as e:
+            # Headers are sent; the client sees the audio end early
+            print(f"Audio stream failed after the first chunk: {str(e)}")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type="audio/mpeg", headers={"Cache-Control": "no-store"})
+
+@router.post("/stream-audio")
+async def stream_audio(
+    text: str = Body(..., embed=True),
+    voice: str = Body(TTS_VOICE),
+    tts_service = Depends(get_tts_service)
+):
+    """
+    Read a long passage aloud as streamed MP3
+
+    The text is split on sentence boundaries (。！？) and the chunks are
+    synthesized in parallel; audio is sent in order as each chunk is
+    ready, so playback starts after the first sentence. Every chunk is
+    cached, so repeated passages and sentences are not synthesized again.
+    """
+    return await audio_stream_response(text, voice, tts_service)
+
+@router.get("/stream-audio")
+async def stream_audio_get(text: str, voice: str = TTS_VOICE, tts_service = Depends(get_tts_service)):
+    """GET variant of POST /stream-audio, usable as an <audio> src"""
+    return await audio_stream_response(text, voice, tts_service)
+
+@router.get("/audio/{name}")
+async def get_audio(name: str, tts_service = Depends(get_tts_service)):
+    """Serve synthesized audio by its content address (immutable, so cacheable forever)"""
+    if not is_audio_name(name):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    path = await tts_service.audio_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return FileResponse(
+        path,
+        media_type=CONTENT_TYPES[name.rsplit(".", 1)[1]],
+        headers={"Cache-Control": AUDIO_CACHE_CONTROL}
+    )
+
 @router.post("/vocabulary-to-question")
 async def vocabulary_to_question(
     word_id: str = Body(..., embed=True),
-    from_vocabulary_router = Depends(vocabulary_router.get_word),
+    user_id: Optional[str] = Body(None),
+    vocabulary_service: VocabularyService = Depends(get_vocabulary_service),
     question_generator = Depends(get_question_generator),
+    question_bank = Depends(get_question_bank),
     tts_service = Depends(get_tts_service)
 ):
-    """Create a question and audio from vocabulary item"""
+    """Create a question and audio from vocabulary item (pre-generated when the bank has one)"""
     try:
         # Get vocabulary word
-        word = await from_vocabulary_router(word_id)
+        word = await vocabulary_service.get_word_by_id(word_id)
+        if word is None:
+            raise HTTPException(status_code=404, detail=f"Word {word_id} not found")
         
         # Generate question using the vocabulary
-        question = await question_generator.generate_from_vocabulary(word)
+        question = await question_bank.take_word(word, user_id)
+        if question is None:
+            question = await question_generator.generate_from_vocabulary(word)
+            await question_bank.add(word_pool(word["id"]), [question], user_id)
         
         # Generate audio for the question
         audio_url = await tts_service.generate_audio(question["audio_text"])
@@ -108,5 +355,33 @@ async def vocabulary_to_question(
             "correct_answer": question["correct_answer"],
             "audio_url": audio_url
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/question-bank/prefill", status_code=202)
+async def prefill_question_bank(
+    topics: List[str] = Body([]),
+    difficulties: List[str] = Body(list(DIFFICULTIES)),
+    word_ids: List[str] = Body([]),
+    vocabulary_service: VocabularyService = Depends(get_vocabulary_service),
+    question_bank = Depends(get_question_bank)
+):
+    """Pre-generate questions for topics (at each difficulty) and vocabulary words in the background"""
+    unknown = [difficulty for difficulty in difficulties if difficulty not in DIFFICULTIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown difficulties: {', '.join(unknown)}")
+
+    pools = []
+    for topic in topics:
+        for difficulty in difficulties:
+            question_bank.refill_topic(topic, difficulty)
+            pools.append({"topic": topic, "difficulty": difficulty})
+    for word_id in word_ids:
+        word = await vocabulary_service.get_word_by_id(word_id)
+        if word is None:
+            raise HTTPException(status_code=404, detail=f"Word {word_id} not found")
+        question_bank.refill_word(word)
+        pools.append({"word_id": word_id})
+    return {"success": True, "pools": pools}
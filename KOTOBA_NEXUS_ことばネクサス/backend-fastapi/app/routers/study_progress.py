@@ -0,0 +1,91 @@
+import asyncio
+from fastapi import APIRouter, Body, Header, HTTPException, Depends
+from datetime import datetime
+from pydantic import BaseModel
+from typing import List, Optional
+from ..models.study_progress import StudyProgressRepository
+from ..dependencies import get_study_progress_repository, get_review_buffer
+
+router = APIRouter(prefix="/api/study-progress", tags=["Study Progress"])
+
+# Reviews accepted by one bulk request (a long session is a few hundred cards)
+REVIEW_BULK_MAX = 2000
+
+class Review(BaseModel):
+    word_id: str
+    correct: bool
+    # ISO 8601, when the card was answered; defaults to the time of the request
+    timestamp: Optional[datetime] = None
+    # Client-generated, unique per review; makes a retried request safe (like Idempotency-Key)
+    id: Optional[str] = None
+
+def review_fields(review: Review) -> dict:
+    """A review as the repository takes it, its timestamp normalized to isoformat()"""
+    fields = review.model_dump()
+    if review.timestamp is not None:
+        fields["timestamp"] = review.timestamp.isoformat()
+    return fields
+
+@router.post("/reviews", status_code=202)
+async def log_review(
+    user_id: str = Body(...),
+    session_id: str = Body(...),
+    word_id: str = Body(...),
+    correct: bool = Body(...),
+    review_buffer = Depends(get_review_buffer)
+):
+    """Record an answered card; it is written with other reviews within the flush interval"""
+    review = await review_buffer.add(user_id, session_id, word_id, correct)
+    return {"success": True, "queued": True, "review_id": review["id"], "timestamp": review["timestamp"]}
+
+@router.post("/reviews/bulk")
+async def log_reviews(
+    user_id: str = Body(...),
+    session_id: str = Body(...),
+    reviews: List[Review] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    repository: StudyProgressRepository = Depends(get_study_progress_repository)
+):
+    """
+    Record a whole session's reviews at once; returns each word's proficiency afterwards
+
+    Send an Idempotency-Key header (or an id on every review) to make
+    retries safe: a request that failed part-way can be sent again as is,
+    and nothing it already wrote is counted twice.
+    """
+    if not reviews:
+        raise HTTPException(status_code=400, detail="No reviews to log")
+    if len(reviews) > REVIEW_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {REVIEW_BULK_MAX} reviews per request")
+    review_ids = [review.id for review in reviews if review.id]
+    if len(set(review_ids)) != len(review_ids):
+        raise HTTPException(status_code=400, detail="Review ids must be unique")
+    try:
+        result = await asyncio.to_thread(
+            repository.log_reviews, user_id, session_id, [review_fields(review) for review in reviews], idempotency_key
+        )
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{user_id}")
+async def get_user_progress(
+    user_id: str,
+    repository: StudyProgressRepository = Depends(get_study_progress_repository)
+):
+    """Totals, success rate and study streak for a user"""
+    progress = await asyncio.to_thread(repository.get_user_progress, user_id)
+    if "error" in progress:
+        raise HTTPException(status_code=500, detail=progress["error"])
+    return progress
+
+@router.get("/{user_id}/summary")
+async def get_user_progress_summary(
+    user_id: str,
+    repository: StudyProgressRepository = Depends(get_study_progress_repository)
+):
+    """Totals and the distribution of proficiency levels for a user"""
+    summary = await asyncio.to_thread(repository.get_user_progress_summary, user_id)
+    if "error" in summary:
+        raise HTTPException(status_code=500, detail=summary["error"])
+    return summary
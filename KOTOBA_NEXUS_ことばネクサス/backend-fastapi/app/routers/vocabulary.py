@@ -1,39 +1,129 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path, Request
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Any, Optional
 
 from app.services.vocabulary_service import VocabularyService
+from app.utils.pagination import encode_cursor, decode_cursor, parse_fields, project, ndjson_stream
+from app.utils.responses import ORJSONResponse, catalog_responses
 
-router = APIRouter(prefix="/api/vocabulary", tags=["Vocabulary"])
+router = APIRouter(prefix="/api/vocabulary", tags=["Vocabulary"], default_response_class=ORJSONResponse)
+
+MAX_PAGE_SIZE = 1000
+
+async def list_words(
+    request: Request,
+    word_type: Optional[str],
+    limit: Optional[int],
+    cursor: Optional[str],
+    fields: Optional[str],
+    format: str
+):
+    """
+    Shared implementation of the bulk endpoints
+
+    - format=ndjson streams one word per line as rows are serialized
+    - limit/cursor return a page: {"items", "next_cursor", "total"}
+    - otherwise the whole dataset is returned in its original shape
+    Rows are projected to `fields` (e.g. "id,japanese,english") when given.
+    JSON bodies are cached per dataset version with an ETag and
+    precompressed gzip/brotli variants.
+    """
+    index = await VocabularyService.get_index()
+    projection = parse_fields(fields, index.field_names)
+
+    if format == "ndjson" or limit is not None or cursor:
+        total = index.count(word_type)
+        offset = decode_cursor(cursor, index.version, total)
+        end = total if limit is None else min(total, offset + limit)
+        next_cursor = encode_cursor(end, index.version) if end < total else None
+
+        if format == "ndjson":
+            headers = {"X-Total-Count": str(total)}
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            return StreamingResponse(
+                ndjson_stream(index.iter_words(word_type, offset, limit), projection),
+                media_type="application/x-ndjson",
+                headers=headers
+            )
+
+        return await catalog_responses.respond(request, index.version, lambda: {
+            "items": [project(word, projection) for word in index.iter_words(word_type, offset, limit)],
+            "next_cursor": next_cursor,
+            "total": total
+        })
+
+    if word_type == "verb":
+        words = await VocabularyService.get_verbs()
+    elif word_type == "adjective":
+        words = await VocabularyService.get_adjectives()
+    else:
+        all_words = await VocabularyService.get_all_words()
+        if not projection:
+            return await catalog_responses.respond(request, index.version, lambda: all_words)
+        return await catalog_responses.respond(request, index.version, lambda: {
+            **all_words,
+            "verbs": [project(word, projection) for word in all_words["verbs"]],
+            "adjectives": [project(word, projection) for word in all_words["adjectives"]]
+        })
+
+    return await catalog_responses.respond(request, index.version, lambda: [project(word, projection) for word in words])
 
 @router.get("/verbs")
-async def get_verbs():
+async def get_verbs(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,japanese,english"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json or ndjson (streamed)")
+):
     """Get all verbs from the CloudFront-hosted JSON file"""
-    return await VocabularyService.get_verbs()
+    return await list_words(request, "verb", limit, cursor, fields, format)
 
 @router.get("/adjectives")
-async def get_adjectives():
+async def get_adjectives(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,japanese,english"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json or ndjson (streamed)")
+):
     """Get all adjectives from the CloudFront-hosted JSON file"""
-    return await VocabularyService.get_adjectives()
+    return await list_words(request, "adjective", limit, cursor, fields, format)
 
 @router.get("/all")
-async def get_all_words():
+async def get_all_words(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,japanese,english"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json or ndjson (streamed)")
+):
     """Get all vocabulary words from all hosted JSON files"""
-    return await VocabularyService.get_all_words()
+    return await list_words(request, None, limit, cursor, fields, format)
 
 @router.get("/search")
-async def search_words(query: str = Query(..., description="Search term")):
+async def search_words(
+    query: str = Query(..., description="Search term"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum results to return"),
+    offset: int = Query(0, ge=0, description="Number of ranked results to skip")
+):
     """Search for words across all vocabulary types"""
-    results = await VocabularyService.search_words(query)
+    total, results = await VocabularyService.search_words(query, limit=limit, offset=offset)
     return {
         "query": query,
         "results": results,
-        "count": len(results)
+        "count": len(results),
+        "total": total,
+        "limit": limit,
+        "offset": offset
     }
 
 @router.get("/{word_id}")
-async def get_word(word_id: str = Path(..., description="Word ID")):
+async def get_word(request: Request, word_id: str = Path(..., description="Word ID")):
     """Get a specific word by ID"""
-    word = await VocabularyService.get_word_by_id(word_id)
+    index = await VocabularyService.get_index()
+    word = index.get(word_id)
     if not word:
         raise HTTPException(status_code=404, detail="Word not found")
-    return word
\ No newline at end of file
+    return await catalog_responses.respond(request, index.version, lambda: word)
\ No newline at end of file
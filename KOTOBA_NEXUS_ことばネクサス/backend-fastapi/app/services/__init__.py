@@ -2,6 +2,6 @@ from .cloudfront_service import CloudFrontService
 from .vocabulary_service import VocabularyService
 from .kana_service import KanaService
 from .vector_store_service import VectorStoreService
-from .youtube_transcription import YouTubeTranscriptionService
-from .question_generator_service import QuestionGeneratorService
-from .tts_service import TTSGeneratorService
+from .youtube_transcription_service import YouTubeTranscriptionService
+from .question_generation_service import QuestionGenerationService
+from .tts_service import TTSService
@@ -0,0 +1,231 @@
+# audio_cache.py
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+from botocore.exceptions import ClientError
+from app.services.embedding_cache import normalize_text
+
+# Local disk tier, trimmed to AUDIO_CACHE_MAX_BYTES by least recent use
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "kotoba-audio"))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Optional S3 tier shared by every worker (unset = disk only)
+AUDIO_S3_BUCKET = os.getenv("AUDIO_S3_BUCKET")
+AUDIO_S3_PREFIX = os.getenv("AUDIO_S3_PREFIX", "tts-audio/")
+# Public base of the S3 tier (e.g. a CloudFront distribution); unset = served by this app
+AUDIO_PUBLIC_BASE_URL = os.getenv("AUDIO_PUBLIC_BASE_URL")
+AUDIO_URL_PREFIX = os.getenv("AUDIO_URL_PREFIX", "/api/listening/audio")
+# Names known to be in the S3 tier, remembered per worker (most recent kept)
+AUDIO_REMOTE_NAMES_MAX = 100000
+
+# Polly output format -> (file extension, content type)
+AUDIO_FORMATS = {"mp3": ("mp3", "audio/mpeg"), "ogg_vorbis": ("ogg", "audio/ogg")}
+CONTENT_TYPES = {extension: content_type for extension, content_type in AUDIO_FORMATS.values()}
+
+# Content-addressed names are immutable, so clients and CDNs may cache them for good
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+AUDIO_NAME = re.compile(r"^[0-9a-f]{32}\.(mp3|ogg)$")
+
+def audio_name(text: str, voice: str, output_format: str, engine: str) -> str:
+    """Content address of a synthesis: hash(normalized text, voice, format, engine) plus the extension"""
+    digest = hashlib.sha256(f"{normalize_text(text)}\0{voice}\0{output_format}\0{engine}".encode("utf-8")).hexdigest()
+    return f"{digest[:32]}.{AUDIO_FORMATS[output_format][0]}"
+
+def is_audio_name(name: str) -> bool:
+    return bool(AUDIO_NAME.match(name))
+
+class AudioStore:
+    """
+    Synthesized audio stored under its content address
+
+    Names come from audio_name(), so the same text read by the same voice,
+    format and engine always has the same name and URL. The disk tier
+    under `cache_dir` is trimmed to `max_bytes` by least recent use (the
+    order is rebuilt from file modification times at startup). With
+    `bucket` set, audio is uploaded to S3 under `prefix` before it is
+    written to disk, where other workers and restarts find it. url() points
+    at `public_base_url` (the bucket behind a CDN) only for audio this
+    worker has seen in the bucket, and at this app's audio endpoint
+    otherwise. Blocking and thread-safe; callers run it in a thread.
+    """
+
+    stats = {
+        "stores": 0, "evictions": 0, "evicted_bytes": 0, "s3_uploads": 0, "s3_upload_errors": 0,
+        "s3_downloads": 0, "files": 0, "bytes": 0
+    }
+
+    def __init__(
+        self,
+        cache_dir: str = AUDIO_CACHE_DIR,
+        max_bytes: int = AUDIO_CACHE_MAX_BYTES,
+        bucket: Optional[str] = AUDIO_S3_BUCKET,
+        prefix: str = AUDIO_S3_PREFIX,
+        public_base_url: Optional[str] = AUDIO_PUBLIC_BASE_URL,
+        url_prefix: str = AUDIO_URL_PREFIX,
+        s3_client=None
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.url_prefix = url_prefix.rstrip("/")
+        self._s3 = s3_client
+        self._lock = threading.Lock()
+        # name -> size in bytes, in LRU order
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        # Names seen in the S3 tier (uploaded, found or downloaded), in LRU order
+        self._remote: "OrderedDict[str, None]" = OrderedDict()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            if is_audio_name(name):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+        self._gauge()
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            from app.services.s3_service import S3Service
+            self._s3 = S3Service.get_client()
+        return self._s3
+
+    def url(self, name: str) -> str:
+        """Public S3 URL when the audio is known to be in the bucket, this app's audio URL otherwise"""
+        if self.public_base_url and self.bucket and self.in_remote(name):
+            return f"{self.public_base_url}/{self.prefix}{name}"
+        return f"{self.url_prefix}/{name}"
+
+    def in_remote(self, name: str) -> bool:
+        """Whether this worker has seen the audio in the S3 tier (no request)"""
+        with self._lock:
+            return name in self._remote
+
+    def _mark_remote(self, name: str):
+        with self._lock:
+            self._remote[name] = None
+            self._remote.move_to_end(name)
+            while len(self._remote) > AUDIO_REMOTE_NAMES_MAX:
+                self._remote.popitem(last=False)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def has_local(self, name: str) -> bool:
+        """Whether the disk tier holds this audio (counts as a use)"""
+        with self._lock:
+            if name not in self._files:
+                return False
+            self._files.move_to_end(name)
+            return True
+
+    def local_path(self, name: str) -> Optional[str]:
+        """Path of the audio on disk, if present"""
+        if not self.has_local(name):
+            return None
+        path = self.path(name)
+        try:
+            # Keep the LRU order across restarts
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(name)
+            return None
+        return path
+
+    def _forget(self, name: str):
+        with self._lock:
+            size = self._files.pop(name, None)
+            if size is not None:
+                self._bytes -= size
+            self._gauge()
+
+    def save_local(self, name: str, audio: bytes):
+        """Write atomically, then trim the tier"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, self.path(name))
+        with self._lock:
+            self._bytes += len(audio) - self._files.get(name, 0)
+            self._files[name] = len(audio)
+            self._files.move_to_end(name)
+            self.stats["stores"] += 1
+        self._evict()
+        self._gauge()
+
+    def _gauge(self):
+        self.stats["files"] = len(self._files)
+        self.stats["bytes"] = self._bytes
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                # The newest file stays even if it alone exceeds the bound
+                if self._bytes <= self.max_bytes or len(self._files) <= 1:
+                    return
+                name, size = self._files.popitem(last=False)
+                self._bytes -= size
+                self.stats["evictions"] += 1
+                self.stats["evicted_bytes"] += size
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def save(self, name: str, audio: bytes):
+        """Store in every tier: S3 first, so a failed upload leaves no disk copy to be served as uploaded"""
+        if self.bucket:
+            try:
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=self.prefix + name,
+                    Body=audio,
+                    ContentType=CONTENT_TYPES[name.rsplit(".", 1)[1]],
+                    CacheControl=AUDIO_CACHE_CONTROL
+                )
+            except Exception:
+                self.stats["s3_upload_errors"] += 1
+                raise
+            self.stats["s3_uploads"] += 1
+            self._mark_remote(name)
+        self.save_local(name, audio)
+
+    def has_remote(self, name: str) -> bool:
+        """Whether the S3 tier holds this audio"""
+        if not self.bucket:
+            return False
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=self.prefix + name)
+            self._mark_remote(name)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def fetch(self, name: str) -> Optional[str]:
+        """Path of the audio on disk, downloading it from S3 first if needed; None if no tier has it"""
+        path = self.local_path(name)
+        if path is not None or not self.bucket:
+            return path
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.prefix + name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        self._mark_remote(name)
+        self.save_local(name, response["Body"].read())
+        self.stats["s3_downloads"] += 1
+        return self.path(name)
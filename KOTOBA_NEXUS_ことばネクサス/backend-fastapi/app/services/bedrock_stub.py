@@ -0,0 +1,95 @@
+# bedrock_stub.py
+import io
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# Answer used when no text is given: a valid listening question
+DEFAULT_RESPONSE = json.dumps({
+    "question": "話し手は週末に何をしましたか？",
+    "options": ["公園を散歩した", "友達と映画を見た", "家で料理をした", "図書館で勉強した"],
+    "correct_answer": "友達と映画を見た",
+    "explanation": "話し手は「土曜日に友達と映画を見ました」と言っています。"
+}, ensure_ascii=False)
+
+class StubEventStream:
+    """Iterable of Bedrock response-stream events that can be closed early, like botocore's EventStream"""
+
+    def __init__(self, events: Iterator[Dict[str, Any]]):
+        self._events = events
+        self.closed = False
+
+    def __iter__(self):
+        for event in self._events:
+            if self.closed:
+                return
+            yield event
+
+    def close(self):
+        self.closed = True
+
+class StubBedrockClient:
+    """
+    In-process stand-in for the bedrock-runtime client (tests, offline development)
+
+    invoke_model and invoke_model_with_response_stream take boto3's
+    arguments and answer with `text` in the Anthropic Messages format.
+    The streaming variant sends it in pieces of `chunk_chars` characters,
+    the first after `first_token_delay` seconds and the rest `token_delay`
+    apart, so time-to-first-token can be measured without AWS. Requests
+    are recorded in `calls` and the streams handed out in `streams`.
+    Enabled in the app with BEDROCK_STUB=true.
+    """
+
+    def __init__(
+        self,
+        text: Optional[str] = None,
+        chunk_chars: int = 4,
+        first_token_delay: float = 0.0,
+        token_delay: float = 0.0
+    ):
+        self.text = DEFAULT_RESPONSE if text is None else text
+        self.chunk_chars = chunk_chars
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.calls: List[Dict[str, Any]] = []
+        self.streams: List[StubEventStream] = []
+
+    def _record(self, modelId: str, body: Any) -> Dict[str, Any]:
+        request = json.loads(body) if isinstance(body, (str, bytes)) else body
+        self.calls.append({"modelId": modelId, "body": request})
+        return request
+
+    def invoke_model(self, modelId: str, body: Any, **kwargs) -> Dict[str, Any]:
+        self._record(modelId, body)
+        time.sleep(self.first_token_delay + self.token_delay * (len(self.text) // self.chunk_chars))
+        response = {
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "text", "text": self.text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": 0, "output_tokens": len(self.text)},
+        }
+        return {"body": io.BytesIO(json.dumps(response).encode("utf-8")), "contentType": "application/json"}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: Any, **kwargs) -> Dict[str, Any]:
+        self._record(modelId, body)
+        stream = StubEventStream(self._events())
+        self.streams.append(stream)
+        return {"body": stream, "contentType": "application/json"}
+
+    def _events(self) -> Iterator[Dict[str, Any]]:
+        def chunk(event: Dict[str, Any]) -> Dict[str, Any]:
+            return {"chunk": {"bytes": json.dumps(event, ensure_ascii=False).encode("utf-8")}}
+
+        time.sleep(self.first_token_delay)
+        yield chunk({"type": "message_start", "message": {"role": "assistant", "content": []}})
+        yield chunk({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for start in range(0, len(self.text), self.chunk_chars):
+            if start and self.token_delay:
+                time.sleep(self.token_delay)
+            piece = self.text[start:start + self.chunk_chars]
+            yield chunk({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}})
+        yield chunk({"type": "content_block_stop", "index": 0})
+        yield chunk({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": len(self.text)}})
+        yield chunk({"type": "message_stop"})
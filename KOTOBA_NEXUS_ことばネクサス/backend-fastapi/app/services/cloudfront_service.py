@@ -1,7 +1,13 @@
 import os
-import requests
+import time
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import httpx
 from fastapi import HTTPException
 from dotenv import load_dotenv
+from app.utils.single_flight import SingleFlight
 
 # Load environment variables
 load_dotenv()
@@ -10,22 +16,236 @@ CLOUDFRONT_URL = os.getenv("CLOUDFRONT_URL")
 if not CLOUDFRONT_URL:
     raise ValueError("CLOUDFRONT_URL is not set. Check your .env file.")
 
+# Connection pool and timeout settings (seconds)
+CLOUDFRONT_TIMEOUT = float(os.getenv("CLOUDFRONT_TIMEOUT", 10))
+CLOUDFRONT_CONNECT_TIMEOUT = float(os.getenv("CLOUDFRONT_CONNECT_TIMEOUT", 3))
+CLOUDFRONT_MAX_CONNECTIONS = int(os.getenv("CLOUDFRONT_MAX_CONNECTIONS", 20))
+CLOUDFRONT_MAX_KEEPALIVE = int(os.getenv("CLOUDFRONT_MAX_KEEPALIVE", 10))
+CLOUDFRONT_HTTP2 = os.getenv("CLOUDFRONT_HTTP2", "true").lower() == "true"
+
+# Cache settings: fresh TTL, extra window where stale data is served while
+# revalidating in the background, and a memory budget for cached payloads
+CLOUDFRONT_CACHE_TTL = float(os.getenv("CLOUDFRONT_CACHE_TTL", 300))
+CLOUDFRONT_CACHE_STALE_TTL = float(os.getenv("CLOUDFRONT_CACHE_STALE_TTL", 600))
+CLOUDFRONT_CACHE_MAX_BYTES = int(os.getenv("CLOUDFRONT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+def _parse_ttls(value: str) -> Dict[str, float]:
+    """Parse per-file TTL overrides, e.g. "kana-data.json=3600,data_verb.json=600" """
+    ttls = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            ttls[name.strip().lstrip("/")] = float(seconds)
+    return ttls
+
+CLOUDFRONT_CACHE_TTLS = _parse_ttls(os.getenv("CLOUDFRONT_CACHE_TTLS", ""))
+
+@dataclass
+class CachedFile:
+    """A parsed seed file plus the validators needed to revalidate it"""
+    data: Any
+    version: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    size: int
+    fetched_at: float
+
 class CloudFrontService:
     """Service to fetch JSON data from CloudFront"""
 
+    # Shared per-worker client, opened by startup() and closed by shutdown()
+    _client: Optional[httpx.AsyncClient] = None
+
+    # filename -> CachedFile, in least-recently-used order
+    _cache: "OrderedDict[str, CachedFile]" = OrderedDict()
+    _cache_bytes = 0
+    # One in-flight fetch/revalidation per filename, shared by all waiters
+    _flight = SingleFlight()
+    _stats = {
+        "hits": 0,
+        "stale_hits": 0,
+        "misses": 0,
+        "revalidations": 0,
+        "not_modified": 0,
+        "evictions": 0,
+        "errors": 0,
+    }
+
+    @staticmethod
+    def _build_client() -> httpx.AsyncClient:
+        """Create a pooled async client (all requests go to the one CloudFront host)"""
+        return httpx.AsyncClient(
+            base_url=CLOUDFRONT_URL,
+            http2=CLOUDFRONT_HTTP2,
+            limits=httpx.Limits(
+                max_connections=CLOUDFRONT_MAX_CONNECTIONS,
+                max_keepalive_connections=CLOUDFRONT_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(CLOUDFRONT_TIMEOUT, connect=CLOUDFRONT_CONNECT_TIMEOUT),
+        )
+
+    @classmethod
+    async def startup(cls):
+        """Open the shared HTTP client"""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = cls._build_client()
+
+    @classmethod
+    async def shutdown(cls):
+        """Close the shared HTTP client and cancel pending fetches"""
+        cls._flight.cancel_all()
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """Return the shared client, creating it lazily outside the app lifespan (scripts, tests)"""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = cls._build_client()
+        return cls._client
+
     @staticmethod
-    async def fetch_json(filename: str):
+    def get_ttl(filename: str) -> float:
+        """Fresh lifetime for a file, honouring CLOUDFRONT_CACHE_TTLS overrides"""
+        return CLOUDFRONT_CACHE_TTLS.get(filename, CLOUDFRONT_CACHE_TTL)
+
+    @classmethod
+    async def fetch_json(cls, filename: str):
         """Fetch JSON from CloudFront with correct path"""
+        entry = await cls.fetch_entry(filename)
+        return entry.data
+
+    @classmethod
+    async def fetch_entry(cls, filename: str) -> CachedFile:
+        """
+        Return the cached file, fetching or revalidating it as needed
+
+        Fresh entries are returned directly. Entries inside the stale window are
+        returned immediately while a background task revalidates them. Anything
+        older is revalidated before returning.
+        """
+        # Ensure filename does not start with a slash
+        filename = filename.lstrip('/')
+
+        entry = cls._cache.get(filename)
+        if entry is None:
+            cls._stats["misses"] += 1
+            return await cls._flight.do(filename, lambda: cls._fetch(filename, None))
+
+        age = time.monotonic() - entry.fetched_at
+        ttl = cls.get_ttl(filename)
+        if age < ttl:
+            cls._stats["hits"] += 1
+            cls._cache.move_to_end(filename)
+            return entry
+
+        if age < ttl + CLOUDFRONT_CACHE_STALE_TTL:
+            cls._stats["stale_hits"] += 1
+            cls._cache.move_to_end(filename)
+            cls._schedule_refresh(filename, entry)
+            return entry
+
         try:
-            # Ensure filename does not start with a slash
-            filename = filename.lstrip('/')
+            return await cls._flight.do(filename, lambda: cls._fetch(filename, entry))
+        except HTTPException:
+            # Serve the last good copy rather than failing the request
+            return entry
+
+    @classmethod
+    def _schedule_refresh(cls, filename: str, entry: CachedFile):
+        """Revalidate an entry in the background (at most one refresh per file)"""
+        if cls._flight.in_flight(filename):
+            return
 
+        async def refresh():
+            try:
+                return await cls._fetch(filename, entry)
+            except HTTPException as e:
+                print(f"Background refresh of {filename} failed: {e.detail}")
+                return entry
+
+        cls._flight.start(filename, refresh)
+
+    @classmethod
+    async def _fetch(cls, filename: str, entry: Optional[CachedFile]) -> CachedFile:
+        """GET the file, sending conditional headers when a cached copy exists"""
+        headers = {}
+        if entry is not None:
+            cls._stats["revalidations"] += 1
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        try:
             # Ensure correct path format: /seed/{filename}
-            url = f"{CLOUDFRONT_URL}/seed/{filename}"
+            response = await cls.get_client().get(f"/seed/{filename}", headers=headers)
+
+            if response.status_code == 304 and entry is not None:
+                cls._stats["not_modified"] += 1
+                entry.fetched_at = time.monotonic()
+                if filename not in cls._cache:
+                    cls._store(filename, entry)
+                return entry
 
-            response = requests.get(url)
             response.raise_for_status()
-            return response.json()
+            content = response.content
+            new_entry = CachedFile(
+                data=response.json(),
+                version=hashlib.sha256(content).hexdigest()[:16],
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                size=len(content),
+                fetched_at=time.monotonic(),
+            )
 
-        except requests.exceptions.HTTPError as e:
+        except httpx.TimeoutException as e:
+            cls._stats["errors"] += 1
+            raise HTTPException(status_code=504, detail=f"Timed out fetching {filename}: {str(e)}")
+        except httpx.HTTPError as e:
+            cls._stats["errors"] += 1
             raise HTTPException(status_code=500, detail=f"Failed to fetch {filename}: {str(e)}")
+
+        cls._store(filename, new_entry)
+        return new_entry
+
+    @classmethod
+    def _store(cls, filename: str, entry: CachedFile):
+        """Insert an entry and evict least-recently-used files over the memory budget"""
+        old = cls._cache.pop(filename, None)
+        if old is not None:
+            cls._cache_bytes -= old.size
+
+        # Payloads larger than the whole budget are served but never cached
+        if entry.size > CLOUDFRONT_CACHE_MAX_BYTES:
+            return
+
+        cls._cache[filename] = entry
+        cls._cache_bytes += entry.size
+        while cls._cache_bytes > CLOUDFRONT_CACHE_MAX_BYTES:
+            _, evicted = cls._cache.popitem(last=False)
+            cls._cache_bytes -= evicted.size
+            cls._stats["evictions"] += 1
+
+    @classmethod
+    def invalidate(cls, filename: Optional[str] = None):
+        """Drop one cached file, or the whole cache"""
+        if filename is None:
+            cls._cache.clear()
+            cls._cache_bytes = 0
+            return
+        entry = cls._cache.pop(filename.lstrip('/'), None)
+        if entry is not None:
+            cls._cache_bytes -= entry.size
+
+    @classmethod
+    def cache_stats(cls) -> Dict[str, Any]:
+        """Cache counters plus current size, for the /metrics endpoint"""
+        return {
+            **cls._stats,
+            "coalesced": cls._flight.shared,
+            "entries": len(cls._cache),
+            "bytes": cls._cache_bytes,
+            "max_bytes": CLOUDFRONT_CACHE_MAX_BYTES,
+        }
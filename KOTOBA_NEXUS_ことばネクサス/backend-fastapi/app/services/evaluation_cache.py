@@ -0,0 +1,214 @@
+# evaluation_cache.py
+import os
+import json
+import time
+import asyncio
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.services.image_preprocessing import hamming_distance
+
+# Memory tier size, match threshold (bits out of 64) and optional disk tier
+KANA_EVAL_CACHE_SIZE = int(os.getenv("KANA_EVAL_CACHE_SIZE", 2048))
+KANA_EVAL_CACHE_MAX_DISTANCE = int(os.getenv("KANA_EVAL_CACHE_MAX_DISTANCE", 6))
+KANA_EVAL_CACHE_PATH = os.getenv("KANA_EVAL_CACHE_PATH")
+KANA_EVAL_CACHE_DISK_SIZE = int(os.getenv("KANA_EVAL_CACHE_DISK_SIZE", 50000))
+
+class EvaluationCache:
+    """
+    Evaluation results keyed by perceptual hash, expected kana and prompt version
+
+    A lookup returns the stored result whose image hash is within
+    `max_distance` bits of the query hash, among entries with the same
+    expected kana and prompt version. Without an expected kana the entry
+    could be any character, and near-identical hashes of similar shapes
+    (シ/ツ, ソ/ン) must not share a recognition, so only an exact hash
+    matches. The memory tier is an LRU bounded to
+    `max_entries`; the optional SQLite tier at `path` survives restarts and
+    is consulted on memory misses.
+
+    Results for uploads evaluated straight from S3 are also stored by exact
+    object identity (bucket/key@etag), so a re-submitted key is answered
+    without downloading or decoding it again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = KANA_EVAL_CACHE_SIZE,
+        max_distance: int = KANA_EVAL_CACHE_MAX_DISTANCE,
+        path: Optional[str] = KANA_EVAL_CACHE_PATH,
+        disk_max_entries: int = KANA_EVAL_CACHE_DISK_SIZE
+    ):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.disk_max_entries = disk_max_entries
+        # (expected_kana, prompt_version, phash) -> result, in LRU order
+        self._entries: "OrderedDict[Tuple[str, str, int], Dict[str, Any]]" = OrderedDict()
+        # (expected_kana, prompt_version) -> set of phashes, for bucketed scans
+        self._buckets: Dict[Tuple[str, str], set] = {}
+        # (object_key, expected_kana, prompt_version) -> result, in LRU order
+        self._objects: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "object_hits": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS kana_evaluations ("
+                " expected_kana TEXT NOT NULL, prompt_version TEXT NOT NULL, phash TEXT NOT NULL,"
+                " result TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (expected_kana, prompt_version, phash))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS kana_object_evaluations ("
+                " object_key TEXT NOT NULL, expected_kana TEXT NOT NULL, prompt_version TEXT NOT NULL,"
+                " result TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (object_key, expected_kana, prompt_version))"
+            )
+            self._db.commit()
+            self._db_lock = asyncio.Lock()
+
+    def _nearest(self, bucket_key: Tuple[str, str], phash: int, max_distance: int) -> Tuple[Optional[int], int]:
+        if max_distance == 0:
+            return (phash, 0) if phash in self._buckets.get(bucket_key, ()) else (None, 1)
+        best, best_distance = None, max_distance + 1
+        for candidate in self._buckets.get(bucket_key, ()):
+            distance = hamming_distance(candidate, phash)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+                if distance == 0:
+                    break
+        return best, best_distance
+
+    def _remember(self, key: Tuple[str, str, int], result: Dict[str, Any]):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        self._buckets.setdefault(key[:2], set()).add(key[2])
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            bucket = self._buckets.get(evicted[:2])
+            if bucket is not None:
+                bucket.discard(evicted[2])
+                if not bucket:
+                    del self._buckets[evicted[:2]]
+            self.stats["evictions"] += 1
+
+    def _remember_object(self, key: Tuple[str, str, str], result: Dict[str, Any]):
+        self._objects[key] = result
+        self._objects.move_to_end(key)
+        while len(self._objects) > self.max_entries:
+            self._objects.popitem(last=False)
+
+    async def get(self, phash: int, expected_kana: Optional[str], prompt_version: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result for a near-identical image, with its Hamming distance"""
+        bucket_key = (expected_kana or "", prompt_version)
+        # Open recognition: exact matches only
+        max_distance = self.max_distance if expected_kana else 0
+        match, distance = self._nearest(bucket_key, phash, max_distance)
+        if match is not None:
+            key = bucket_key + (match,)
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return {**self._entries[key], "cache_distance": distance}
+
+        if self._db is not None:
+            if max_distance == 0:
+                rows = await self._db_call(
+                    "SELECT phash, result FROM kana_evaluations WHERE expected_kana = ? AND prompt_version = ? AND phash = ?",
+                    bucket_key + (format(phash, "016x"),)
+                )
+            else:
+                rows = await self._db_call(
+                    "SELECT phash, result FROM kana_evaluations WHERE expected_kana = ? AND prompt_version = ?",
+                    bucket_key
+                )
+            best = None
+            for stored_hash, result in rows:
+                distance = hamming_distance(int(stored_hash, 16), phash)
+                if distance <= max_distance and (best is None or distance < best[0]):
+                    best = (distance, int(stored_hash, 16), result)
+            if best is not None:
+                distance, stored_hash, result = best
+                result = json.loads(result)
+                self._remember(bucket_key + (stored_hash,), result)
+                self.stats["disk_hits"] += 1
+                return {**result, "cache_distance": distance}
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, phash: int, expected_kana: Optional[str], prompt_version: str, result: Dict[str, Any]):
+        """Store an evaluation result in memory and, when configured, on disk"""
+        key = (expected_kana or "", prompt_version, phash)
+        self._remember(key, result)
+        self.stats["stores"] += 1
+
+        if self._db is not None:
+            await self._db_call(
+                "INSERT OR REPLACE INTO kana_evaluations VALUES (?, ?, ?, ?, ?)",
+                (key[0], key[1], format(phash, "016x"), json.dumps(result, ensure_ascii=False), time.time()),
+                commit=True
+            )
+            if self.stats["stores"] % 100 == 0:
+                for table in ("kana_evaluations", "kana_object_evaluations"):
+                    await self._db_call(
+                        f"DELETE FROM {table} WHERE rowid IN ("
+                        f" SELECT rowid FROM {table} ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_max_entries,),
+                        commit=True
+                    )
+
+    async def get_object_result(self, object_key: str, expected_kana: Optional[str], prompt_version: str) -> Optional[Dict[str, Any]]:
+        """Return the stored result for exactly this S3 object version, if it was evaluated before"""
+        key = (object_key, expected_kana or "", prompt_version)
+        result = self._objects.get(key)
+        if result is None and self._db is not None:
+            rows = await self._db_call(
+                "SELECT result FROM kana_object_evaluations WHERE object_key = ? AND expected_kana = ? AND prompt_version = ?",
+                key
+            )
+            if rows:
+                result = json.loads(rows[0][0])
+        if result is None:
+            return None
+        self._remember_object(key, result)
+        self.stats["object_hits"] += 1
+        return result
+
+    async def put_object_result(self, object_key: str, expected_kana: Optional[str], prompt_version: str, result: Dict[str, Any]):
+        """Record the result for an S3 object version"""
+        key = (object_key, expected_kana or "", prompt_version)
+        self._remember_object(key, result)
+
+        if self._db is not None:
+            await self._db_call(
+                "INSERT OR REPLACE INTO kana_object_evaluations VALUES (?, ?, ?, ?, ?)",
+                key + (json.dumps(result, ensure_ascii=False), time.time()),
+                commit=True
+            )
+
+    async def _db_call(self, sql: str, params: tuple, commit: bool = False):
+        """Run one SQLite statement off the event loop (serialized on one connection)"""
+        def run():
+            rows = self._db.execute(sql, params).fetchall()
+            if commit:
+                self._db.commit()
+            return rows
+
+        async with self._db_lock:
+            return await asyncio.to_thread(run)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "object_entries": len(self._objects),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "disk": self._db is not None
+        }
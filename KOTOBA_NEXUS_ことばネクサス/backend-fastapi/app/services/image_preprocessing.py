@@ -0,0 +1,207 @@
+# image_preprocessing.py
+import os
+from io import BytesIO
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+import numpy as np
+from PIL import Image, ImageOps
+from fastapi import HTTPException
+
+# Uploads with more pixels are refused (413) before their pixel data is decoded.
+# Pillow itself only warns up to twice its MAX_IMAGE_PIXELS, so decode_image
+# checks the header dimensions explicitly.
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 40_000_000))
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+# Fraction of each worksheet cell trimmed on every side to drop grid lines
+WORKSHEET_CELL_INSET = float(os.getenv("WORKSHEET_CELL_INSET", 0.06))
+
+# Leading bytes of the formats we accept
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+)
+
+@dataclass
+class PreprocessConfig:
+    """Tunable preprocessing settings (defaults come from the environment)"""
+    max_upload_bytes: int = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+    target_size: int = int(os.getenv("IMAGE_TARGET_SIZE", 256))
+    jpeg_quality: int = int(os.getenv("IMAGE_JPEG_QUALITY", 80))
+    ink_threshold: int = int(os.getenv("IMAGE_INK_THRESHOLD", 160))
+    crop_padding: float = float(os.getenv("IMAGE_CROP_PADDING", 0.12))
+    autocontrast_cutoff: float = float(os.getenv("IMAGE_AUTOCONTRAST_CUTOFF", 1))
+    grayscale: bool = True
+    auto_crop: bool = True
+
+@dataclass
+class PreprocessedImage:
+    """Encoded image ready for upload, plus what preprocessing saved"""
+    data: bytes
+    media_type: str
+    width: int
+    height: int
+    original_bytes: int
+    image: Image.Image = field(repr=False)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "original_bytes": self.original_bytes,
+            "processed_bytes": len(self.data),
+            "bytes_saved": self.bytes_saved,
+            "size": [self.width, self.height]
+        }
+
+DEFAULT_CONFIG = PreprocessConfig()
+
+def sniff_image_format(image_data: bytes) -> str:
+    """Identify the image format from its signature without decoding it"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if image_data.startswith(signature):
+            return image_format
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "WEBP"
+    return ""
+
+def validate_upload(image_data: bytes, config: PreprocessConfig = DEFAULT_CONFIG) -> str:
+    """Reject oversized or non-image uploads before any decoding work"""
+    if len(image_data) > config.max_upload_bytes:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {config.max_upload_bytes} bytes")
+    image_format = sniff_image_format(image_data)
+    if not image_format:
+        raise HTTPException(status_code=415, detail="Unsupported or invalid image format")
+    return image_format
+
+def ink_bounding_box(image: Image.Image, threshold: int):
+    """Bounding box of pixels darker than threshold (the strokes), or None for a blank image"""
+    return image.point(lambda p: 255 if p < threshold else 0).getbbox()
+
+def decode_image(image_data: bytes, config: PreprocessConfig = DEFAULT_CONFIG) -> Image.Image:
+    """Validate an upload, decode it, fix EXIF orientation and flatten transparency on white"""
+    validate_upload(image_data, config)
+
+    too_large = HTTPException(status_code=413, detail=f"Image exceeds {IMAGE_MAX_PIXELS} pixels")
+    try:
+        # open() only reads the header; load() decodes, so truncated data fails here too
+        image = Image.open(BytesIO(image_data))
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            raise too_large
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError:
+        raise too_large
+    except (OSError, SyntaxError, ValueError) as e:
+        raise HTTPException(status_code=415, detail=f"Could not decode image: {str(e)}")
+
+    # Canvas exports are often transparent: strokes on nothing. Put them on white.
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    return image
+
+def normalize_image(image: Image.Image, original_bytes: int, config: PreprocessConfig = DEFAULT_CONFIG) -> PreprocessedImage:
+    """Grayscale, contrast-normalize, crop to the ink, downscale and JPEG-encode a decoded image"""
+    if config.grayscale:
+        image = ImageOps.autocontrast(image.convert("L"), cutoff=config.autocontrast_cutoff)
+        gray = image
+    else:
+        image = ImageOps.autocontrast(image.convert("RGB"), cutoff=config.autocontrast_cutoff)
+        gray = image.convert("L")
+
+    if config.auto_crop:
+        box = ink_bounding_box(gray, config.ink_threshold)
+        if box:
+            left, top, right, bottom = box
+            side = max(right - left, bottom - top)
+            side += int(side * config.crop_padding * 2)
+            center_x, center_y = (left + right) // 2, (top + bottom) // 2
+            half = side // 2
+            left, top = center_x - half, center_y - half
+            # crop() would pad out-of-bounds areas with black; paste onto white instead
+            crop = image.crop((max(left, 0), max(top, 0), min(left + side, image.width), min(top + side, image.height)))
+            canvas = Image.new(image.mode, (side, side), 255 if image.mode == "L" else (255, 255, 255))
+            canvas.paste(crop, (max(-left, 0), max(-top, 0)))
+            image = canvas
+
+    if max(image.size) > config.target_size:
+        image.thumbnail((config.target_size, config.target_size), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=config.jpeg_quality, optimize=True)
+
+    return PreprocessedImage(
+        data=buffer.getvalue(),
+        media_type="image/jpeg",
+        width=image.width,
+        height=image.height,
+        original_bytes=original_bytes,
+        image=image
+    )
+
+def preprocess_image(image_data: bytes, config: PreprocessConfig = DEFAULT_CONFIG) -> PreprocessedImage:
+    """
+    Normalize a handwriting photo or canvas export for recognition
+
+    Steps: signature/size check, EXIF orientation fix, flatten transparency on
+    white, grayscale, contrast normalization, crop to the ink bounding box
+    (with padding, squared), downscale to target_size, and a single JPEG encode.
+    CPU bound; call it via asyncio.to_thread from async code.
+    """
+    return normalize_image(decode_image(image_data, config), len(image_data), config)
+
+def split_grid(image: Image.Image, rows: int, cols: int, inset: float = WORKSHEET_CELL_INSET) -> List[Image.Image]:
+    """
+    Cut a worksheet into rows x cols cells, row by row
+
+    Each cell is shrunk by `inset` (a fraction of its size) on every side so
+    printed grid lines do not end up in the crop as ink.
+    """
+    cells = []
+    cell_width, cell_height = image.width / cols, image.height / rows
+    for row in range(rows):
+        for col in range(cols):
+            left, top = col * cell_width, row * cell_height
+            dx, dy = cell_width * inset, cell_height * inset
+            cells.append(image.crop((
+                round(left + dx), round(top + dy),
+                round(left + cell_width - dx), round(top + cell_height - dy)
+            )))
+    return cells
+
+def preprocess_worksheet(image_data: bytes, rows: int, cols: int, config: PreprocessConfig = DEFAULT_CONFIG) -> List[PreprocessedImage]:
+    """Decode a worksheet once and preprocess each grid cell like a single upload"""
+    image = decode_image(image_data, config)
+    cell_bytes = len(image_data) // (rows * cols)
+    return [normalize_image(cell, cell_bytes, config) for cell in split_grid(image, rows, cols)]
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so dct(x) = M @ x @ M.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT_32 = _dct_matrix(32)
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    64-bit pHash: low-frequency DCT coefficients of a 32x32 grayscale
+    thumbnail, thresholded at their median. Near-identical drawings differ in
+    only a few bits (compare with hamming_distance).
+    """
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    coefficients = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].flatten()
+    bits = coefficients > np.median(coefficients[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
@@ -0,0 +1,397 @@
+# ingestion.py
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import orjson
+from fastapi import HTTPException
+from app.services.vector_store_service import EMBED_BATCH_SIZE, transcription_id
+from app.services.youtube_transcription_service import check_language, video_id_from_url
+
+# Job checkpoints (SQLite file; unset = memory only, jobs do not survive a restart)
+INGEST_JOB_DB_PATH = os.getenv("INGEST_JOB_DB_PATH")
+# Jobs processed at once per worker, and the stage pools they share
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", 2))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", 4))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", 2))
+
+# Job status values; "queued"/"running" jobs are resumed from their checkpoints
+UNFINISHED = ("queued", "running")
+
+def job_id_for(kind: str, *parts: str) -> str:
+    """Identical submissions map to the same job"""
+    return hashlib.sha256("\0".join((kind,) + parts).encode("utf-8")).hexdigest()[:24]
+
+class JobStore:
+    """
+    Jobs and their per-batch checkpoints in SQLite
+
+    A job's chunks are written once, split into embedding batches, when the
+    chunk stage finishes. Each batch then records its embeddings (embed
+    stage) and whether it was upserted; the vectors are dropped once
+    upserted. Progress is derived from the batches, so it is exactly what a
+    resumed job would skip. Thread-safe: stage pools write from their
+    threads.
+    """
+
+    def __init__(self, path: Optional[str] = INGEST_JOB_DB_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingestion_jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, stage TEXT NOT NULL, chunks INTEGER, skipped INTEGER,"
+            " error TEXT, owner TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingestion_batches ("
+            " job_id TEXT NOT NULL, batch INTEGER NOT NULL, size INTEGER NOT NULL, items TEXT NOT NULL,"
+            " vectors BLOB, upserted INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (job_id, batch))"
+        )
+        self._db.commit()
+
+    def create(self, job_id: str, kind: str, payload: Dict[str, Any], owner: str) -> Tuple[Dict[str, Any], bool]:
+        """Insert a queued job unless it exists; returns (job, created)"""
+        now = time.time()
+        with self._lock:
+            created = self._db.execute(
+                "INSERT OR IGNORE INTO ingestion_jobs VALUES (?, ?, ?, 'queued', 'queued', NULL, NULL, NULL, ?, ?, ?)",
+                (job_id, kind, orjson.dumps(payload).decode(), owner, now, now)
+            ).rowcount == 1
+            self._db.commit()
+        return self.get(job_id), created
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload, status, stage, chunks, skipped, error, owner, created_at, updated_at"
+                " FROM ingestion_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            batches, embedded, upserted = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(CASE WHEN vectors IS NOT NULL OR upserted THEN size END), 0),"
+                " COALESCE(SUM(CASE WHEN upserted THEN size END), 0) FROM ingestion_batches WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        job_id, kind, payload, status, stage, chunks, skipped, error, owner, created_at, updated_at = row
+        payload = orjson.loads(payload)
+        new = (chunks or 0) - (skipped or 0)
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "source": {key: value for key, value in payload.items() if key != "texts"},
+            "status": status,
+            "stage": stage,
+            "progress": {
+                "chunks": chunks,
+                "skipped": skipped,
+                "batches": batches,
+                "embedded": embedded,
+                "upserted": upserted,
+                "percent": round(100 * upserted / new, 1) if new else (100.0 if status == "done" else 0.0)
+            },
+            "error": error,
+            "owner": owner,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def payload(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+        return orjson.loads(row[0])
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        with self._lock:
+            self._db.execute(
+                f"UPDATE ingestion_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+            self._db.commit()
+
+    def claim(self, job_id: str, previous_owner: str, owner: str) -> bool:
+        """Take over a job; only one of several workers racing for it wins"""
+        with self._lock:
+            claimed = self._db.execute(
+                "UPDATE ingestion_jobs SET owner = ?, status = 'queued', error = NULL, updated_at = ?"
+                " WHERE id = ? AND owner = ?",
+                (owner, time.time(), job_id, previous_owner)
+            ).rowcount == 1
+            self._db.commit()
+        return claimed
+
+    def unfinished(self) -> List[Tuple[str, str]]:
+        """(job id, owner) of jobs that were queued or running"""
+        with self._lock:
+            return self._db.execute(
+                f"SELECT id, owner FROM ingestion_jobs WHERE status IN ({','.join('?' * len(UNFINISHED))})"
+                " ORDER BY created_at",
+                UNFINISHED
+            ).fetchall()
+
+    def save_batches(self, job_id: str, batches: List[List[Any]], chunks: int, skipped: int):
+        """Checkpoint the chunk stage"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO ingestion_batches (job_id, batch, size, items) VALUES (?, ?, ?, ?)",
+                [(job_id, i, len(items), orjson.dumps(items).decode()) for i, items in enumerate(batches)]
+            )
+            self._db.execute(
+                "UPDATE ingestion_jobs SET stage = 'embed', chunks = ?, skipped = ?, updated_at = ? WHERE id = ?",
+                (chunks, skipped, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def batches(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT batch, items, vectors, upserted FROM ingestion_batches WHERE job_id = ? ORDER BY batch",
+                (job_id,)
+            ).fetchall()
+        return [
+            {"batch": batch, "items": orjson.loads(items), "vectors": vectors, "upserted": bool(upserted)}
+            for batch, items, vectors, upserted in rows
+        ]
+
+    def mark_embedded(self, job_id: str, batch: int, vectors: bytes):
+        """Checkpoint one batch's embeddings; the job moves to "upsert" once all are embedded"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE ingestion_batches SET vectors = ? WHERE job_id = ? AND batch = ?",
+                (vectors, job_id, batch)
+            )
+            self._db.execute(
+                "UPDATE ingestion_jobs SET stage = 'upsert', updated_at = ? WHERE id = ? AND NOT EXISTS ("
+                " SELECT 1 FROM ingestion_batches WHERE job_id = ? AND vectors IS NULL AND NOT upserted)",
+                (time.time(), job_id, job_id)
+            )
+            self._db.commit()
+
+    def mark_upserted(self, job_id: str, batch: int):
+        with self._lock:
+            self._db.execute(
+                "UPDATE ingestion_batches SET vectors = NULL, upserted = 1 WHERE job_id = ? AND batch = ?",
+                (job_id, batch)
+            )
+            self._db.execute("UPDATE ingestion_jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class IngestionQueue:
+    """
+    Background ingestion of listening content: transcribe -> chunk -> embed -> upsert
+
+    Submissions return a job id at once; identical submissions (same video
+    and language, or the same set of texts) share one job. INGEST_MAX_JOBS
+    jobs run at a time. Transcription is async I/O on the event loop; chunk
+    dedup, embedding and upserts run in dedicated, bounded thread pools (not
+    the default executor that request handlers use), batch by batch, so an
+    embedded batch is upserted while later batches are still embedding.
+    Every stage is checkpointed in the JobStore: a failed job resubmitted,
+    or a job interrupted by a restart, resumes where it stopped instead of
+    re-embedding.
+    """
+
+    stats = {
+        "submitted": 0,
+        "deduplicated": 0,
+        "resumed": 0,
+        "completed": 0,
+        "failed": 0,
+        "batches_embedded": 0,
+        "batches_upserted": 0,
+    }
+
+    def __init__(
+        self,
+        youtube_service,
+        vector_store,
+        path: Optional[str] = INGEST_JOB_DB_PATH,
+        max_jobs: int = INGEST_MAX_JOBS,
+        embed_workers: int = INGEST_EMBED_WORKERS,
+        upsert_workers: int = INGEST_UPSERT_WORKERS,
+        batch_size: int = EMBED_BATCH_SIZE
+    ):
+        self.youtube_service = youtube_service
+        self.vector_store = vector_store
+        self.store = JobStore(path)
+        self.max_jobs = max_jobs
+        self.batch_size = batch_size
+        # pid:token, so a restarted worker can tell its predecessors' jobs apart from live ones
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._embed_pool = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="ingest-embed")
+        self._upsert_pool = ThreadPoolExecutor(max_workers=upsert_workers, thread_name_prefix="ingest-upsert")
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the job workers and resume jobs abandoned by stopped workers"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_jobs)]
+        for job_id, owner in await asyncio.to_thread(self.store.unfinished):
+            if owner != self.owner and self._abandoned(owner):
+                if await asyncio.to_thread(self.store.claim, job_id, owner, self.owner):
+                    self.stats["resumed"] += 1
+                    self._queue.put_nowait(job_id)
+
+    async def shutdown(self):
+        """Stop workers; running jobs keep their checkpoints and resume on the next start"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        # Let in-flight requests finish (and checkpoint) without blocking the loop
+        await asyncio.to_thread(self._embed_pool.shutdown, wait=True, cancel_futures=True)
+        await asyncio.to_thread(self._upsert_pool.shutdown, wait=True, cancel_futures=True)
+        self.store.close()
+
+    def _abandoned(self, owner: str) -> bool:
+        """Whether the worker that owned a job is gone"""
+        pid = owner.partition(":")[0]
+        if not pid.isdigit():
+            return True
+        if int(pid) == os.getpid():
+            # An earlier queue in this process (shut down) or this one
+            return owner != self.owner
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    async def submit_video(self, video_url: str, lang: str) -> Dict[str, Any]:
+        video_id = video_id_from_url(video_url)
+        if video_id is None:
+            raise HTTPException(status_code=400, detail="Not a YouTube video URL")
+        check_language(lang)
+        return await self._submit(job_id_for("youtube", video_id, lang), "youtube", {"video_id": video_id, "lang": lang})
+
+    async def submit_texts(self, texts: List[str]) -> Dict[str, Any]:
+        ids = sorted({transcription_id(text) for text in texts if text.strip()})
+        if not ids:
+            raise HTTPException(status_code=400, detail="No transcriptions to ingest")
+        return await self._submit(job_id_for("texts", *ids), "texts", {"count": len(ids), "texts": texts})
+
+    async def _submit(self, job_id: str, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Outside the app lifespan (scripts, tests) the workers start on first use
+        await self.start()
+        job, created = await asyncio.to_thread(self.store.create, job_id, kind, payload, self.owner)
+        self.stats["submitted"] += 1
+        if created:
+            self._queue.put_nowait(job_id)
+            return {**job, "deduplicated": False}
+
+        retry = job["status"] == "failed" or (
+            job["status"] in UNFINISHED and job["owner"] != self.owner and self._abandoned(job["owner"])
+        )
+        if retry and await asyncio.to_thread(self.store.claim, job_id, job["owner"], self.owner):
+            self.stats["resumed"] += 1
+            self._queue.put_nowait(job_id)
+            return {**await self.get(job_id), "deduplicated": False}
+
+        self.stats["deduplicated"] += 1
+        return {**job, "deduplicated": True}
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                print(f"Ingestion job {job_id} failed: {detail}")
+                await asyncio.to_thread(self.store.update, job_id, status="failed", error=detail)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        await asyncio.to_thread(self.store.update, job_id, status="running")
+        batches = await asyncio.to_thread(self.store.batches, job_id)
+
+        if not batches:
+            texts, metadata = await self._transcribe(job_id)
+            await asyncio.to_thread(self.store.update, job_id, stage="chunk")
+            batches = await loop.run_in_executor(self._upsert_pool, self._chunk, job_id, texts, metadata)
+
+        pending = [batch for batch in batches if not batch["upserted"]]
+        # Let every batch finish and checkpoint before reporting the first failure
+        results = await asyncio.gather(*(self._process_batch(job_id, batch) for batch in pending), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        await asyncio.to_thread(self.store.update, job_id, status="done", stage="done")
+
+    async def _transcribe(self, job_id: str) -> Tuple[List[str], Optional[List[Dict[str, Any]]]]:
+        """Texts to ingest, with per-text metadata for videos"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        payload = await asyncio.to_thread(self.store.payload, job_id)
+        if job["kind"] == "texts":
+            return payload["texts"], None
+
+        await asyncio.to_thread(self.store.update, job_id, stage="transcribe")
+        transcription = await self.youtube_service.get_transcription(payload["video_id"], payload["lang"])
+        windows = transcription["windows"]
+        metadata = [
+            {"video_id": transcription["video_id"], "start": window["start"], "end": window["end"]}
+            for window in windows
+        ]
+        return [window["text"] for window in windows], metadata
+
+    def _chunk(self, job_id: str, texts: List[str], metadata: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Drop texts already stored, split the rest into embedding batches and checkpoint them"""
+        metadata_by_id: Dict[str, Dict[str, Any]] = {}
+        if metadata:
+            for text, meta in zip(texts, metadata):
+                metadata_by_id.setdefault(transcription_id(text), meta)
+        new = self.vector_store.new_transcriptions(texts)
+        items = [[vector_id, text, metadata_by_id.get(vector_id, {})] for vector_id, text in new]
+        batches = [items[start:start + self.batch_size] for start in range(0, len(items), self.batch_size)]
+        self.store.save_batches(job_id, batches, chunks=len(texts), skipped=len(texts) - len(new))
+        return [{"batch": i, "items": items, "vectors": None, "upserted": False} for i, items in enumerate(batches)]
+
+    async def _process_batch(self, job_id: str, batch: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        if batch["vectors"] is None:
+            embeddings = await loop.run_in_executor(self._embed_pool, self._embed_batch, job_id, batch)
+        else:
+            embeddings = np.frombuffer(batch["vectors"], dtype=np.float32).reshape(len(batch["items"]), -1)
+        await loop.run_in_executor(self._upsert_pool, self._upsert_batch, job_id, batch, embeddings)
+
+    def _embed_batch(self, job_id: str, batch: Dict[str, Any]) -> np.ndarray:
+        texts = [text for _, text, _ in batch["items"]]
+        embeddings = np.asarray(self.vector_store.embed_texts(texts, use_cache=False), dtype=np.float32)
+        self.store.mark_embedded(job_id, batch["batch"], embeddings.tobytes())
+        self.stats["batches_embedded"] += 1
+        return embeddings
+
+    def _upsert_batch(self, job_id: str, batch: Dict[str, Any], embeddings: np.ndarray):
+        items = [(vector_id, text) for vector_id, text, _ in batch["items"]]
+        metadata = [meta for _, _, meta in batch["items"]]
+        self.vector_store.upsert_vectors(self.vector_store.build_vectors(items, embeddings, metadata))
+        self.store.mark_upserted(job_id, batch["batch"])
+        self.stats["batches_upserted"] += 1
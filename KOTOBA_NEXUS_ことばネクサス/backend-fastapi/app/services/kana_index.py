@@ -0,0 +1,122 @@
+# kana_index.py
+import unicodedata
+from typing import List, Dict, Any, Iterator, Tuple
+
+# Equivalent spellings across Hepburn, Kunrei-shiki and Nihon-shiki
+ROMAJI_EQUIVALENTS = [
+    ("shi", "si"), ("chi", "ti"), ("tsu", "tu"), ("fu", "hu"), ("ji", "zi"),
+    ("sha", "sya"), ("shu", "syu"), ("sho", "syo"),
+    ("cha", "tya", "cya"), ("chu", "tyu", "cyu"), ("cho", "tyo", "cyo"),
+    ("ja", "zya", "jya"), ("ju", "zyu", "jyu"), ("jo", "zyo", "jyo"),
+]
+
+_VARIANTS = {spelling: group for group in ROMAJI_EQUIVALENTS for spelling in group}
+
+def iter_kana(kana_data: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (script, kana_item) from either {script: [...]} or [{script: [...]}, ...]"""
+    groups = kana_data if isinstance(kana_data, list) else [kana_data]
+    for group in groups:
+        for script_type, kana_list in group.items():
+            for kana_item in kana_list:
+                yield script_type, kana_item
+
+def fold_kana(text: str) -> str:
+    """Normalize width (ｶ -> カ, ｋａ -> ka), case, and fold katakana to hiragana"""
+    text = unicodedata.normalize("NFKC", text).casefold().strip()
+    return "".join(
+        chr(ord(char) - 0x60) if "ァ" <= char <= "ヶ" else char
+        for char in text
+    )
+
+def is_kana(text: str) -> bool:
+    return any("ぁ" <= char <= "ヿ" for char in text)
+
+def romaji_variants(romaji: str) -> Tuple[str, ...]:
+    """All spellings of a kana's romanization under the systems in ROMAJI_EQUIVALENTS"""
+    return _VARIANTS.get(romaji, (romaji,))
+
+def query_script(query: str) -> str:
+    """The script a kana query was written in"""
+    text = unicodedata.normalize("NFKC", query)
+    return "katakana" if any("ァ" <= char <= "ヺ" for char in text) else "hiragana"
+
+class KanaIndex:
+    """
+    Precomputed search structure over one version of kana-data.json
+
+    Kana queries are folded (katakana -> hiragana, half/full width) and looked
+    up in a table keyed by every prefix of each folded character, so "カ" and
+    "ｶ" find both か and カ. Romaji queries walk a trie built over every
+    spelling of each romanization (shi/si, tsu/tu, ji/zi, ...); each trie node
+    stores its matches up front, so a lookup costs the length of the query.
+    """
+
+    def __init__(self, kana_data: Any, version: str = ""):
+        self.version = version
+        self._items: List[Dict[str, str]] = [
+            {
+                "character": kana_item["character"],
+                "romaji": kana_item["romaji"],
+                "script": script_type  # "hiragana" or "katakana"
+            }
+            for script_type, kana_item in iter_kana(kana_data)
+        ]
+
+        self._by_kana: Dict[str, List[int]] = {}
+        self._trie: Dict[str, Any] = {"items": set()}
+        self._exact: Dict[str, List[int]] = {}
+
+        for position, item in enumerate(self._items):
+            folded = fold_kana(item["character"])
+            for end in range(1, len(folded) + 1):
+                self._by_kana.setdefault(folded[:end], []).append(position)
+
+            for spelling in romaji_variants(fold_kana(item["romaji"])):
+                self._exact.setdefault(spelling, []).append(position)
+                node = self._trie
+                for char in spelling:
+                    node = node.setdefault(char, {"items": set()})
+                    node["items"].add(position)
+
+        # Pre-rank every bucket once so queries only slice
+        for key, positions in self._by_kana.items():
+            positions.sort(key=lambda p: (len(self._items[p]["character"]), p))
+        self._rank_trie(self._trie)
+
+    def _rank_trie(self, node: Dict[str, Any]):
+        node["items"] = sorted(node["items"], key=lambda p: (len(self._items[p]["romaji"]), p))
+        for key, child in node.items():
+            if key != "items":
+                self._rank_trie(child)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def items(self) -> List[Dict[str, str]]:
+        """Every kana as {"character", "romaji", "script"}"""
+        return [dict(item) for item in self._items]
+
+    def search(self, query: str) -> List[Dict[str, str]]:
+        """Search kana by character (any script/width) or by romaji prefix"""
+        folded = fold_kana(query)
+        if not folded:
+            return []
+
+        if is_kana(folded):
+            # Stable sort keeps the pre-ranked order within each script
+            script = query_script(query)
+            positions = sorted(self._by_kana.get(folded, []), key=lambda p: self._items[p]["script"] != script)
+            return [dict(self._items[p]) for p in positions]
+
+        node = self._trie
+        for char in folded:
+            node = node.get(char)
+            if node is None:
+                return []
+
+        # Exact spellings first, then longer romaji sharing the prefix
+        exact = self._exact.get(folded, [])
+        seen = set(exact)
+        positions = exact + [p for p in node["items"] if p not in seen]
+        return [dict(self._items[p]) for p in positions]
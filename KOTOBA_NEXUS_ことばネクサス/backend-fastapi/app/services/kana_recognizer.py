@@ -0,0 +1,184 @@
+# kana_recognizer.py
+import os
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+from app.services.image_preprocessing import ink_bounding_box
+
+# The font the frontend ships, present in every checkout of this repo
+REPO_FONT_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "frontend-nextjs", "public", "font", "yokomoji.otf"
+))
+
+# Fonts with kana glyphs used to render reference templates (every one found
+# is used). KANA_FONT_PATHS is os.pathsep-separated.
+DEFAULT_FONT_PATHS = [
+    REPO_FONT_PATH,
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
+    "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
+    "C:/Windows/Fonts/msgothic.ttc",
+]
+KANA_FONT_PATHS = [p for p in os.getenv("KANA_FONT_PATHS", "").split(os.pathsep) if p] or DEFAULT_FONT_PATHS
+
+# Below either threshold the recognizer defers to Claude
+KANA_LOCAL_MIN_SCORE = float(os.getenv("KANA_LOCAL_MIN_SCORE", 0.72))
+KANA_LOCAL_MIN_MARGIN = float(os.getenv("KANA_LOCAL_MIN_MARGIN", 0.04))
+
+# Templates whose glyphs correlate above this are treated as one shape (へ/ヘ)
+SAME_GLYPH_SCORE = 0.97
+
+GRID = 32
+RENDER_SIZE = 128
+
+def glyph_vector(image: Image.Image) -> Optional[np.ndarray]:
+    """
+    Normalized feature vector of a glyph image (dark ink on light background)
+
+    Crops to the ink, centres it on a square, scales to GRID x GRID, blurs to
+    tolerate small stroke offsets, then zero-means and unit-normalizes so a
+    dot product is a correlation score in [-1, 1]. None for a blank image.
+    """
+    gray = image.convert("L")
+    box = ink_bounding_box(gray, 160)
+    if not box:
+        return None
+    ink = ImageOps.invert(gray.crop(box))
+    side = max(ink.size)
+    square = Image.new("L", (side, side), 0)
+    square.paste(ink, ((side - ink.width) // 2, (side - ink.height) // 2))
+    small = square.resize((GRID - 4, GRID - 4), Image.LANCZOS)
+    canvas = Image.new("L", (GRID, GRID), 0)
+    canvas.paste(small, (2, 2))
+    canvas = canvas.filter(ImageFilter.GaussianBlur(1.2))
+    vector = np.asarray(canvas, dtype=np.float32).flatten()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+def render_glyph(character: str, font: ImageFont.FreeTypeFont, stroke: int = 0) -> Image.Image:
+    """Render a character in black on white, optionally thickened or thinned"""
+    image = Image.new("L", (RENDER_SIZE * len(character), RENDER_SIZE), 255)
+    ImageDraw.Draw(image).text((RENDER_SIZE // 8, RENDER_SIZE // 8), character, font=font, fill=0)
+    if stroke > 0:
+        image = image.filter(ImageFilter.MinFilter(2 * stroke + 1))
+    elif stroke < 0:
+        image = image.filter(ImageFilter.MaxFilter(-2 * stroke + 1))
+    return image
+
+def load_fonts(paths: Sequence[str] = KANA_FONT_PATHS) -> List[ImageFont.FreeTypeFont]:
+    fonts = []
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                fonts.append(ImageFont.truetype(path, RENDER_SIZE * 3 // 4))
+            except OSError as e:
+                print(f"Could not load kana font {path}: {str(e)}")
+    return fonts
+
+class KanaRecognizer:
+    """
+    Nearest-template recognizer for single handwritten kana
+
+    Every kana in the table is rendered in each available font at three
+    stroke weights; a drawing is matched against all templates with one
+    matrix-vector product. Scores are correlations of blurred glyph images,
+    so results are only trusted (`confident`) above KANA_LOCAL_MIN_SCORE and
+    with KANA_LOCAL_MIN_MARGIN over the best different-looking kana.
+    """
+
+    def __init__(self, kana_items: Sequence[Dict[str, str]], fonts: Sequence[ImageFont.FreeTypeFont], version: str = ""):
+        self.version = version
+        self.kana: List[Dict[str, str]] = []
+        vectors, owners = [], []
+        for item in kana_items:
+            glyphs = []
+            for font in fonts:
+                for stroke in (-1, 0, 2):
+                    vector = glyph_vector(render_glyph(item["character"], font, stroke))
+                    if vector is not None:
+                        glyphs.append(vector)
+            if not glyphs:
+                continue
+            owners.extend([len(self.kana)] * len(glyphs))
+            vectors.extend(glyphs)
+            self.kana.append(item)
+
+        if not vectors:
+            raise ValueError("No kana templates could be rendered; check KANA_FONT_PATHS")
+
+        self._templates = np.stack(vectors)
+        self._owners = np.asarray(owners)
+        self._by_character = {item["character"]: i for i, item in enumerate(self.kana)}
+
+        # Group kana whose rendered shapes are effectively identical (へ/ヘ, ぺ/ペ)
+        centroids = np.stack([self._templates[self._owners == i].mean(axis=0) for i in range(len(self.kana))])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        similarity = centroids @ centroids.T
+        self._shape_group = np.arange(len(self.kana))
+        for i in range(len(self.kana)):
+            same = np.nonzero(similarity[i] >= SAME_GLYPH_SCORE)[0]
+            self._shape_group[same] = min(self._shape_group[i], same.min())
+
+    def __len__(self) -> int:
+        return len(self.kana)
+
+    def scores(self, image: Image.Image) -> Optional[np.ndarray]:
+        """Best template score per kana, or None if the image has no ink"""
+        vector = glyph_vector(image)
+        if vector is None:
+            return None
+        template_scores = self._templates @ vector
+        per_kana = np.full(len(self.kana), -1.0, dtype=np.float32)
+        np.maximum.at(per_kana, self._owners, template_scores)
+        return per_kana
+
+    def evaluate(self, image: Image.Image, expected_kana: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Recognize a drawing and, if given, score it against expected_kana
+
+        Returns the same fields as the Claude evaluation (character, script,
+        romanization, quality_score, feedback, match) plus confidence details.
+        """
+        per_kana = self.scores(image)
+        if per_kana is None:
+            return {"confident": False, "reason": "blank image"}
+
+        order = np.argsort(-per_kana)
+        best = int(order[0])
+        expected = self._by_character.get(expected_kana) if expected_kana else None
+        # Identical shapes cannot be told apart; prefer the expected one
+        if expected is not None and self._shape_group[expected] == self._shape_group[best]:
+            best = expected
+
+        runner_up = next((int(i) for i in order if self._shape_group[i] != self._shape_group[best]), best)
+        score = float(per_kana[best])
+        margin = score - float(per_kana[runner_up]) if runner_up != best else score
+        item = self.kana[best]
+
+        result = {
+            "character": item["character"],
+            "script": item.get("script"),
+            "romanization": item.get("romaji"),
+            "confidence": round(score, 4),
+            "margin": round(margin, 4),
+            "alternatives": [self.kana[int(i)]["character"] for i in order[1:4]],
+            "confident": score >= KANA_LOCAL_MIN_SCORE and margin >= KANA_LOCAL_MIN_MARGIN,
+        }
+
+        reference = expected if expected is not None else best
+        match_score = float(per_kana[reference])
+        result["match_score"] = round(match_score, 4)
+        result["quality_score"] = int(np.clip(round((match_score - 0.4) / 0.5 * 9 + 1), 1, 10))
+        if expected_kana:
+            result["match"] = expected is not None and self._shape_group[expected] == self._shape_group[best]
+        result["feedback"] = (
+            "Well formed and clearly legible." if result["quality_score"] >= 8 else
+            "Recognizable; check stroke proportions and placement." if result["quality_score"] >= 5 else
+            "Hard to recognize; review the stroke order and shape."
+        )
+        return result
@@ -1,15 +1,103 @@
 # kana_service.py
 import os
-from typing import List, Dict, Any, Optional
+import json
+import asyncio
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union, AsyncIterator
+from fastapi import HTTPException
 from app.services.vision_service import VisionService
 from app.services.cloudfront_service import CloudFrontService
+from app.services.kana_index import KanaIndex
+from app.services.image_preprocessing import PreprocessedImage, perceptual_hash, DEFAULT_CONFIG as PREPROCESS_DEFAULTS
+from app.services.s3_service import S3Service
+from app.services.evaluation_cache import EvaluationCache
+from app.services.kana_recognizer import KanaRecognizer, load_fonts, KANA_FONT_PATHS
+from app.utils.single_flight import SingleFlight
+
+# Part of the evaluation cache key: bump whenever the evaluation prompt changes
+KANA_PROMPT_VERSION = "1"
+# Results graded by the packed multi-image prompt; only batch requests reuse them
+KANA_BATCH_PROMPT_VERSION = f"{KANA_PROMPT_VERSION}-batch"
+
+# Try the in-process template recognizer before calling Claude
+KANA_LOCAL_RECOGNIZER = os.getenv("KANA_LOCAL_RECOGNIZER", "true").lower() == "true"
+
+# Batch evaluation: images per packed Claude request, and items per batch
+KANA_BATCH_PACK_SIZE = int(os.getenv("KANA_BATCH_PACK_SIZE", 6))
+KANA_BATCH_MAX_ITEMS = int(os.getenv("KANA_BATCH_MAX_ITEMS", 100))
+
+KANA_PROMPT = """
+        Please analyze this image containing a handwritten Japanese kana character.
+        
+        1. Identify the kana character visible in the image
+        2. Indicate whether it's hiragana or katakana
+        3. Provide the romanization of the character
+        4. Rate the character formation on a scale of 1-10
+        
+        Format your response as a JSON object with the fields:
+        - character: The identified kana character
+        - script: Either "hiragana" or "katakana"
+        - romanization: The romanization of the character
+        - quality_score: A number 1-10 rating how well-formed the character is
+        - feedback: Brief feedback on the character formation
+        
+        Return only the JSON object, no other text.
+        """
+
+KANA_BATCH_PROMPT = """
+        Each of the {count} images below (Image 1 to Image {count}) contains one handwritten Japanese kana character.
+        
+        For every image:
+        1. Identify the kana character visible in the image
+        2. Indicate whether it's hiragana or katakana
+        3. Provide the romanization of the character
+        4. Rate the character formation on a scale of 1-10
+        
+        Format your response as a JSON array of exactly {count} objects, one per image in order, with the fields:
+        - character: The identified kana character
+        - script: Either "hiragana" or "katakana"
+        - romanization: The romanization of the character
+        - quality_score: A number 1-10 rating how well-formed the character is
+        - feedback: Brief feedback on the character formation
+        - match: Only when an expected kana is listed for the image; true if the written character matches it
+        
+        Return only the JSON array, no other text.
+        """
+
+def parse_json_response(text: str) -> Any:
+    """Extract the JSON value from a Claude reply, bare or inside a markdown code block"""
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    return json.loads(text)
+
+def error_result(error: HTTPException) -> Dict[str, Any]:
+    """Per-item failure inside a batch"""
+    return {"success": False, "error": error.detail, "status_code": error.status_code}
 
 class KanaService:
     """Service for Kana character operations"""
+
+    # Index over the most recently seen kana-data.json version
+    _index: Optional[KanaIndex] = None
+
+    # Results for near-identical resubmissions, shared by all instances
+    evaluation_cache = EvaluationCache()
+
+    # Local recognizer for the current kana-data.json version (None if no font is available)
+    _recognizer: Optional[KanaRecognizer] = None
+    _fonts: Optional[list] = None
+    _recognizer_flight = SingleFlight()
+    recognizer_stats = {"local": 0, "escalated": 0}
+    batch_stats = {"batches": 0, "items": 0, "vision_requests": 0, "unpacked": 0}
+
+    # One evaluation per S3 object version at a time (client call racing an S3 event)
+    _object_flight = SingleFlight()
+    s3_stats = {"evaluated": 0, "already_evaluated": 0, "bytes_read": 0}
     
-    def __init__(self):
-        """Initialize with vision service for image processing"""
-        self.vision_service = VisionService()
+    def __init__(self, vision_service: Optional[VisionService] = None):
+        """Initialize with vision service for image processing (the app passes its shared one)"""
+        self.vision_service = vision_service or VisionService()
     
     @staticmethod
     async def get_kana() -> Dict[str, List[Dict[str, str]]]:
@@ -20,28 +108,54 @@ class KanaService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to fetch kana: {str(e)}")
     
+    @staticmethod
+    async def get_index() -> KanaIndex:
+        """Return the search index for the current kana-data.json version, rebuilding it when it changes"""
+        entry = await CloudFrontService.fetch_entry("kana-data.json")
+        index = KanaService._index
+        if index is None or index.version != entry.version:
+            index = KanaIndex(entry.data, entry.version)
+            KanaService._index = index
+        return index
+    
+    @staticmethod
+    async def get_recognizer() -> Optional[KanaRecognizer]:
+        """Return the template recognizer for the current kana table, building it off the event loop"""
+        if not KANA_LOCAL_RECOGNIZER:
+            return None
+        if KanaService._fonts is None:
+            KanaService._fonts = load_fonts()
+            if not KanaService._fonts:
+                print(f"Kana recognizer disabled: no font found in {os.pathsep.join(KANA_FONT_PATHS)}")
+        if not KanaService._fonts:
+            return None
+
+        index = await KanaService.get_index()
+        recognizer = KanaService._recognizer
+        if recognizer is None or recognizer.version != index.version:
+            recognizer = await KanaService._recognizer_flight.do(
+                index.version,
+                lambda: asyncio.to_thread(KanaRecognizer, index.items, KanaService._fonts, index.version)
+            )
+            KanaService._recognizer = recognizer
+        return recognizer
+    
     @staticmethod
     async def search_kana(query: str) -> List[Dict[str, Any]]:
         """Search for kana characters by Romaji or Japanese character"""
-        results = []
-        kana_data = await KanaService.get_kana()
-        
-        # Iterate through hiragana and katakana
-        for script_type, kana_list in kana_data.items():
-            for kana_item in kana_list:
-                if (query.lower() in kana_item["character"] or 
-                    query.lower() in kana_item["romaji"].lower()):
-                    results.append({
-                        "character": kana_item["character"],
-                        "romaji": kana_item["romaji"],
-                        "script": script_type  # "hiragana" or "katakana"
-                    })
-        return results
+        index = await KanaService.get_index()
+        return index.search(query)
     
     async def evaluate_kana_image(self, image_data: bytes, expected_kana: Optional[str] = None) -> Dict[str, Any]:
         """
         Evaluate kana writing from image data
         
+        The upload is preprocessed first; if a perceptually near-identical
+        image was already evaluated for the same expected kana and prompt
+        version, that result is returned with "cached": true. Otherwise the
+        local template recognizer answers when it is confident, and only
+        low-confidence drawings are sent to Claude ("recognizer" says which).
+        
         Args:
             image_data: Raw image bytes
             expected_kana: Expected kana character (if checking against known value)
@@ -49,61 +163,221 @@ class KanaService:
         Returns:
             Evaluation results including recognition and scoring
         """
-        # Build a specific prompt for kana recognition
-        prompt = """
-        Please analyze this image containing a handwritten Japanese kana character.
+        prepared = await self.vision_service.prepare_image(image_data)
+        phash, result = await self._evaluate_without_vision(prepared, expected_kana)
+        if result is not None:
+            return result
+        return await self._evaluate_with_vision(prepared, phash, expected_kana)
+    
+    async def evaluate_s3_object(
+        self,
+        file_key: str,
+        expected_kana: Optional[str] = None,
+        s3_service: Optional[S3Service] = None
+    ) -> Dict[str, Any]:
+        """
+        Evaluate an image the client already uploaded to S3 via /upload-url
         
-        1. Identify the kana character visible in the image
-        2. Indicate whether it's hiragana or katakana
-        3. Provide the romanization of the character
-        4. Rate the character formation on a scale of 1-10
+        The object is HEAD-ed first; if this exact version (ETag) was already
+        evaluated for the same expected kana, the stored result comes back
+        with "already_evaluated": true and nothing is downloaded. Otherwise
+        the object is streamed from S3 under the upload size cap and evaluated
+        like a direct upload. Concurrent calls for one object share the work.
         
-        Format your response as a JSON object with the fields:
-        - character: The identified kana character
-        - script: Either "hiragana" or "katakana"
-        - romanization: The romanization of the character
-        - quality_score: A number 1-10 rating how well-formed the character is
-        - feedback: Brief feedback on the character formation
+        Args:
+            file_key: Object key under S3_UPLOAD_PREFIX
+            expected_kana: Expected kana; defaults to the object's upload metadata
+            s3_service: S3 access (defaults to the shared client)
+        """
+        s3_service = s3_service or S3Service()
+        obj = await asyncio.to_thread(s3_service.head_object, file_key)
+        if expected_kana is None:
+            expected_kana = obj.expected_kana
         
-        Return only the JSON object, no other text.
+        object_key = f"{s3_service.bucket_name}/{file_key}@{obj.etag}"
+        stored = await KanaService.evaluation_cache.get_object_result(object_key, expected_kana, KANA_PROMPT_VERSION)
+        if stored is not None:
+            KanaService.s3_stats["already_evaluated"] += 1
+            return {**stored, "file_key": file_key, "already_evaluated": True}
+        
+        async def evaluate():
+            image_data = await asyncio.to_thread(s3_service.read_object, obj, PREPROCESS_DEFAULTS.max_upload_bytes)
+            KanaService.s3_stats["bytes_read"] += len(image_data)
+            result = await self.evaluate_kana_image(image_data, expected_kana)
+            if result.get("success", False) and "error_parsing" not in result:
+                await KanaService.evaluation_cache.put_object_result(object_key, expected_kana, KANA_PROMPT_VERSION, result)
+            KanaService.s3_stats["evaluated"] += 1
+            return result
+        
+        result = await KanaService._object_flight.do((object_key, expected_kana), evaluate)
+        return {**result, "file_key": file_key, "already_evaluated": False}
+    
+    async def evaluate_batch(
+        self,
+        images: Sequence[Union[bytes, PreprocessedImage]],
+        expected_kana: Sequence[Optional[str]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Evaluate many kana drawings, yielding each result as soon as it is ready
+        
+        All items go through preprocessing, the evaluation cache and the local
+        recognizer concurrently. The rest are packed KANA_BATCH_PACK_SIZE at a
+        time into one Claude request each, and those requests run concurrently
+        under the shared vision limiter. Every result carries the item's
+        "index"; results arrive in completion order. A failing item yields
+        {"success": false, "error", "status_code"} instead of ending the batch.
+        
+        Args:
+            images: Raw uploads or images already run through prepare_image
+            expected_kana: Expected kana per image (None where unknown)
         """
+        KanaService.batch_stats["batches"] += 1
+        KanaService.batch_stats["items"] += len(images)
+        
+        async def first_pass(index: int, image: Union[bytes, PreprocessedImage]):
+            try:
+                if not isinstance(image, PreprocessedImage):
+                    image = await self.vision_service.prepare_image(image)
+                phash, result = await self._evaluate_without_vision(
+                    image, expected_kana[index], (KANA_PROMPT_VERSION, KANA_BATCH_PROMPT_VERSION)
+                )
+            except HTTPException as e:
+                return index, None, None, error_result(e)
+            return index, image, phash, result
+        
+        tasks = [asyncio.create_task(first_pass(index, image)) for index, image in enumerate(images)]
+        try:
+            escalated = []
+            for next_done in asyncio.as_completed(tasks):
+                index, prepared, phash, result = await next_done
+                if result is not None:
+                    yield {"index": index, **result}
+                else:
+                    escalated.append((index, prepared, phash, expected_kana[index]))
+            
+            escalated.sort(key=lambda item: item[0])
+            tasks = [
+                asyncio.create_task(self._evaluate_group(escalated[i:i + KANA_BATCH_PACK_SIZE]))
+                for i in range(0, len(escalated), KANA_BATCH_PACK_SIZE)
+            ]
+            for next_done in asyncio.as_completed(tasks):
+                for index, result in await next_done:
+                    yield {"index": index, **result}
+        finally:
+            # The client went away or the consumer stopped early
+            for task in tasks:
+                task.cancel()
+    
+    async def _evaluate_without_vision(
+        self,
+        prepared: PreprocessedImage,
+        expected_kana: Optional[str],
+        prompt_versions: Tuple[str, ...] = (KANA_PROMPT_VERSION,)
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Return the image's phash and, when possible, a cached (from any of `prompt_versions`) or confident local result"""
+        phash = perceptual_hash(prepared.image)
+        for prompt_version in prompt_versions:
+            cached = await KanaService.evaluation_cache.get(phash, expected_kana, prompt_version)
+            if cached is not None:
+                return phash, {**cached, "cached": True, "preprocessing": prepared.report()}
+        
+        recognizer = await KanaService.get_recognizer()
+        if recognizer is not None:
+            local = recognizer.evaluate(prepared.image, expected_kana)
+            if local.pop("confident", False):
+                KanaService.recognizer_stats["local"] += 1
+                return phash, {
+                    **local,
+                    "success": True,
+                    "recognizer": "local",
+                    "cached": False,
+                    "preprocessing": prepared.report()
+                }
+            KanaService.recognizer_stats["escalated"] += 1
+        return phash, None
+    
+    async def _evaluate_with_vision(self, prepared: PreprocessedImage, phash: int, expected_kana: Optional[str]) -> Dict[str, Any]:
+        """Evaluate one image with Claude and cache the parsed result"""
+        prompt = KANA_PROMPT
         
         # If expected_kana is provided, enhance the prompt
         if expected_kana:
             prompt += f"\n\nThe expected kana character is '{expected_kana}'. Please include a 'match' field in your response that is true if the written character matches the expected one, false otherwise."
         
         # Use the vision service for image processing
-        response = self.vision_service.process_image(image_data, prompt)
+        KanaService.batch_stats["vision_requests"] += 1
+        response = await self.vision_service.process_image(prepared, prompt)
         
         if not response.get("success", False):
             return response
         
         # Try to extract JSON from response
         try:
-            import json
-            from json.decoder import JSONDecodeError
-            
-            # Extract JSON from the text response 
-            text = response.get("text", "")
-            
-            # Look for JSON block in markdown
-            if "```json" in text:
-                json_text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                json_text = text.split("```")[1].split("```")[0].strip()
-            else:
-                json_text = text
-                
-            result = json.loads(json_text)
-            result["success"] = True
-            
-            # Add any additional kana-specific logic here
-            
-            return result
-            
+            result = parse_json_response(response.get("text", ""))
+            return await self._store_vision_result(result, prepared, phash, expected_kana)
         except Exception as e:
             return {
                 "success": True,
                 "raw_response": response.get("text", ""),
-                "error_parsing": str(e)
-            }
\ No newline at end of file
+                "error_parsing": str(e),
+                "cached": False,
+                "preprocessing": prepared.report()
+            }
+    
+    async def _evaluate_group(self, group: List[Tuple[int, PreprocessedImage, int, Optional[str]]]) -> List[Tuple[int, Dict[str, Any]]]:
+        """Evaluate several escalated images with one Claude request"""
+        if len(group) == 1:
+            index, prepared, phash, kana = group[0]
+            return [(index, await self._vision_or_error(prepared, phash, kana))]
+        
+        prompt = KANA_BATCH_PROMPT.format(count=len(group))
+        prompt += "\nExpected kana:\n" + "\n".join(
+            f"Image {number}: '{kana}'" if kana else f"Image {number}: (none)"
+            for number, (_, _, _, kana) in enumerate(group, 1)
+        )
+        
+        KanaService.batch_stats["vision_requests"] += 1
+        try:
+            response = await self.vision_service.process_images(
+                [prepared for _, prepared, _, _ in group], prompt, max_tokens=300 * len(group)
+            )
+        except HTTPException as e:
+            return [(index, error_result(e)) for index, _, _, _ in group]
+        
+        parsed = None
+        if response.get("success", False):
+            try:
+                parsed = parse_json_response(response.get("text", ""))
+            except ValueError:
+                pass
+        if not (isinstance(parsed, list) and len(parsed) == len(group) and all(isinstance(item, dict) for item in parsed)):
+            # Unusable packed answer: grade these images one request each instead
+            KanaService.batch_stats["unpacked"] += 1
+            results = await asyncio.gather(*(self._vision_or_error(prepared, phash, kana) for _, prepared, phash, kana in group))
+            return [(item[0], result) for item, result in zip(group, results)]
+        
+        results = []
+        for (index, prepared, phash, kana), result in zip(group, parsed):
+            results.append((index, await self._store_vision_result(result, prepared, phash, kana, KANA_BATCH_PROMPT_VERSION)))
+        return results
+    
+    async def _vision_or_error(self, prepared: PreprocessedImage, phash: int, expected_kana: Optional[str]) -> Dict[str, Any]:
+        try:
+            return await self._evaluate_with_vision(prepared, phash, expected_kana)
+        except HTTPException as e:
+            return error_result(e)
+    
+    @staticmethod
+    async def _store_vision_result(
+        result: Dict[str, Any],
+        prepared: PreprocessedImage,
+        phash: int,
+        expected_kana: Optional[str],
+        prompt_version: str = KANA_PROMPT_VERSION
+    ) -> Dict[str, Any]:
+        result["success"] = True
+        result["recognizer"] = "claude"
+        await KanaService.evaluation_cache.put(phash, expected_kana, prompt_version, dict(result))
+        result["cached"] = False
+        result["preprocessing"] = prepared.report()
+        return result
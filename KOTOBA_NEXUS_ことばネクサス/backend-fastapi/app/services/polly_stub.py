@@ -0,0 +1,46 @@
+# polly_stub.py
+import io
+import time
+import hashlib
+from typing import Any, Dict, List
+
+# MPEG-1 Layer III frame header (128 kbps, 22.05 kHz, mono)
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC4])
+
+CONTENT_TYPES = {"mp3": "audio/mpeg", "ogg_vorbis": "audio/ogg", "pcm": "audio/pcm"}
+
+class StubPollyClient:
+    """
+    In-process stand-in for the Polly client (tests, offline development)
+
+    synthesize_speech takes boto3's arguments and answers after `delay`
+    seconds plus `delay_per_char` per character (Polly's latency grows with
+    the text) with deterministic audio: the same text, voice, format and
+    engine always give the same bytes, about `bytes_per_char` per
+    character. Texts over `max_chars` are refused like Polly's
+    TextLengthExceededException. Requests are recorded in `calls`.
+    Enabled in the app with POLLY_STUB=true.
+    """
+
+    def __init__(self, delay: float = 0.0, delay_per_char: float = 0.0, bytes_per_char: int = 400, max_chars: int = 3000):
+        self.delay = delay
+        self.delay_per_char = delay_per_char
+        self.bytes_per_char = bytes_per_char
+        self.max_chars = max_chars
+        self.calls: List[Dict[str, Any]] = []
+
+    def synthesize_speech(self, Text: str, OutputFormat: str, VoiceId: str, Engine: str = "standard", **kwargs) -> Dict[str, Any]:
+        self.calls.append({"Text": Text, "OutputFormat": OutputFormat, "VoiceId": VoiceId, "Engine": Engine, **kwargs})
+        if len(Text) > self.max_chars:
+            raise ValueError(f"TextLengthExceededException: {len(Text)} characters, maximum {self.max_chars}")
+        if self.delay or self.delay_per_char:
+            time.sleep(self.delay + self.delay_per_char * len(Text))
+        seed = hashlib.sha256(f"{Text}\0{VoiceId}\0{OutputFormat}\0{Engine}".encode("utf-8")).digest()
+        size = max(len(Text), 1) * self.bytes_per_char
+        payload = (seed * (size // len(seed) + 1))[:size]
+        audio = (MP3_FRAME_HEADER if OutputFormat == "mp3" else b"") + payload
+        return {
+            "AudioStream": io.BytesIO(audio),
+            "ContentType": CONTENT_TYPES.get(OutputFormat, "application/octet-stream"),
+            "RequestCharacters": len(Text),
+        }
@@ -0,0 +1,401 @@
+# question_bank.py
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+import orjson
+from app.services.embedding_cache import normalize_text
+from app.utils.single_flight import SingleFlight
+
+# Pool sizing: refill to the target once a pool falls below the low watermark
+QUESTION_POOL_TARGET = int(os.getenv("QUESTION_POOL_TARGET", 20))
+QUESTION_POOL_LOW_WATERMARK = int(os.getenv("QUESTION_POOL_LOW_WATERMARK", 8))
+# A question is retired after this many serves, so pools keep turning over
+QUESTION_MAX_SERVES = int(os.getenv("QUESTION_MAX_SERVES", 25))
+# Questions generated at once for refills, across all pools (interactive calls have priority)
+QUESTION_REFILL_CONCURRENCY = int(os.getenv("QUESTION_REFILL_CONCURRENCY", 2))
+# Per-user memory of recently served questions
+QUESTION_RECENT_PER_USER = int(os.getenv("QUESTION_RECENT_PER_USER", 50))
+QUESTION_RECENT_USERS = int(os.getenv("QUESTION_RECENT_USERS", 10000))
+# Pools kept per worker; the least recently used unpinned pool is dropped beyond this
+QUESTION_BANK_MAX_POOLS = int(os.getenv("QUESTION_BANK_MAX_POOLS", 1000))
+# Pools are refilled automatically only when pinned (QUESTION_BANK_TOPICS or an
+# explicit prefill) or after this many requests, so one-off topics cost one live generation
+QUESTION_REFILL_MIN_REQUESTS = int(os.getenv("QUESTION_REFILL_MIN_REQUESTS", 3))
+# Optional disk tier (SQLite file; unset = memory only)
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH")
+# Pools filled at startup, e.g. "天気,旅行,買い物" (every difficulty)
+QUESTION_BANK_TOPICS = [topic.strip() for topic in os.getenv("QUESTION_BANK_TOPICS", "").split(",") if topic.strip()]
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# Retrieved transcript snippets per generated question
+CONTEXT_SNIPPETS = 3
+
+PoolKey = Tuple[str, ...]
+GenerateQuestion = Callable[[], Awaitable[Dict[str, Any]]]
+
+def topic_pool(topic: str, difficulty: str) -> PoolKey:
+    # "|" separates the parts of stored pool names
+    return ("topic", normalize_text(topic).casefold().replace("|", " "), difficulty)
+
+def word_pool(word_id: str) -> PoolKey:
+    return ("word", str(word_id))
+
+def pool_name(key: PoolKey) -> str:
+    return "|".join(key)
+
+def question_id(key: PoolKey, question: Dict[str, Any]) -> str:
+    text = f"{pool_name(key)}\0{question.get('question', '')}\0{question.get('audio_text', '')}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+@dataclass
+class Pool:
+    """One pool's questions; `positions` makes retiring a question O(1)"""
+    questions: List[Dict[str, Any]] = field(default_factory=list)
+    positions: Dict[str, int] = field(default_factory=dict)
+    serves: Dict[str, int] = field(default_factory=dict)
+    cursor: int = 0
+
+    def add(self, question: Dict[str, Any]) -> bool:
+        if question["id"] in self.positions:
+            return False
+        self.positions[question["id"]] = len(self.questions)
+        self.questions.append(question)
+        return True
+
+    def remove(self, question_id: str):
+        position = self.positions.pop(question_id)
+        last = self.questions.pop()
+        if last["id"] != question_id:
+            self.questions[position] = last
+            self.positions[last["id"]] = position
+        self.serves.pop(question_id, None)
+
+class QuestionBank:
+    """
+    Pre-generated questions per (topic, difficulty) and per vocabulary word
+
+    take_topic()/take_word() answer from memory: a round-robin cursor walks
+    the pool and skips questions the user was served recently, so a serve
+    costs O(1) unless the user has seen most of the pool. A question is
+    retired after QUESTION_MAX_SERVES serves. When a pool falls below
+    QUESTION_POOL_LOW_WATERMARK (or the user has seen all of it), a
+    background refill generates questions up to QUESTION_POOL_TARGET,
+    at most QUESTION_REFILL_CONCURRENCY at a time across all pools. A miss
+    returns None and the caller generates live, then add()s the result.
+    With QUESTION_BANK_PATH set, pools survive restarts.
+
+    Refills cost many generations, so take_*() only starts them for pinned
+    pools (refilled explicitly: QUESTION_BANK_TOPICS and prefills) and for
+    pools requested at least QUESTION_REFILL_MIN_REQUESTS times. At most
+    QUESTION_BANK_MAX_POOLS pools are kept; beyond that the least recently
+    used unpinned pool is dropped (from disk too).
+    """
+
+    stats = {
+        "hits": 0,
+        "misses": 0,
+        "exhausted": 0,
+        "refills": 0,
+        "generated": 0,
+        "refill_errors": 0,
+        "generation_errors": 0,
+        "retired": 0,
+        "cold_skips": 0,
+        "evicted_pools": 0,
+        "pools": 0,
+    }
+
+    def __init__(
+        self,
+        question_generator,
+        search_context: Callable[[str, int], List[Dict[str, Any]]],
+        path: Optional[str] = QUESTION_BANK_PATH,
+        target: int = QUESTION_POOL_TARGET,
+        low_watermark: int = QUESTION_POOL_LOW_WATERMARK,
+        max_serves: int = QUESTION_MAX_SERVES,
+        max_pools: int = QUESTION_BANK_MAX_POOLS,
+        refill_min_requests: int = QUESTION_REFILL_MIN_REQUESTS
+    ):
+        self.question_generator = question_generator
+        # Blocking vector search (topic, top_k) -> [{"text", "score"}]; run in a thread
+        self.search_context = search_context
+        self.target = target
+        self.low_watermark = low_watermark
+        self.max_serves = max_serves
+        self.max_pools = max_pools
+        self.refill_min_requests = refill_min_requests
+        # In LRU order
+        self._pools: "OrderedDict[PoolKey, Pool]" = OrderedDict()
+        # Pools refilled explicitly: refilled automatically and never evicted
+        self._pinned: Set[PoolKey] = {
+            topic_pool(topic, difficulty) for topic in QUESTION_BANK_TOPICS for difficulty in DIFFICULTIES
+        }
+        # Requests per pool, in LRU order (bounded like the pools, with room for cold keys)
+        self._requests: "OrderedDict[PoolKey, int]" = OrderedDict()
+        # user id -> (recent question ids in serve order, same ids as a set), in LRU order
+        self._recent: "OrderedDict[str, Tuple[Deque[str], Set[str]]]" = OrderedDict()
+        self._refills = SingleFlight()
+        self._refill_slots: Optional[asyncio.Semaphore] = None
+
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS question_bank ("
+                " pool TEXT NOT NULL, id TEXT NOT NULL, question TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (pool, id))"
+            )
+            self._db.commit()
+            self._load()
+
+    def _load(self):
+        with self._db_lock:
+            rows = self._db.execute("SELECT pool, question FROM question_bank ORDER BY created_at").fetchall()
+        for name, question in rows:
+            self._pools.setdefault(tuple(name.split("|")), Pool()).add(orjson.loads(question))
+        self._db_write("DELETE FROM question_bank WHERE pool = ?", self._evict())
+
+    def _pool(self, key: PoolKey) -> Pool:
+        """The pool for key, created if needed (which may evict others)"""
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = Pool()
+        self._pools.move_to_end(key)
+        return pool
+
+    def _evict(self) -> List[tuple]:
+        """Drop least recently used unpinned, idle pools beyond max_pools; returns their names as rows"""
+        evicted = []
+        if len(self._pools) > self.max_pools:
+            for key in list(self._pools):
+                if len(self._pools) <= self.max_pools:
+                    break
+                if key in self._pinned or self._refills.in_flight(key):
+                    continue
+                del self._pools[key]
+                evicted.append((pool_name(key),))
+            self.stats["evicted_pools"] += len(evicted)
+        self.stats["pools"] = len(self._pools)
+        return evicted
+
+    def _note_request(self, key: PoolKey) -> bool:
+        """Count a request for the pool; True when it has earned automatic refills"""
+        count = self._requests.get(key, 0) + 1
+        self._requests[key] = count
+        self._requests.move_to_end(key)
+        while len(self._requests) > self.max_pools * 10:
+            self._requests.popitem(last=False)
+        return key in self._pinned or count >= self.refill_min_requests
+
+    def _db_write(self, sql: str, rows: List[tuple]):
+        with self._db_lock:
+            # Closed at shutdown while a write was queued
+            if self._db is None or not rows:
+                return
+            self._db.executemany(sql, rows)
+            self._db.commit()
+
+    async def start(self):
+        """Fill the QUESTION_BANK_TOPICS pools in the background"""
+        for topic in QUESTION_BANK_TOPICS:
+            for difficulty in DIFFICULTIES:
+                self.refill_topic(topic, difficulty)
+
+    async def close(self):
+        self._refills.cancel_all()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+    def size(self, key: PoolKey) -> int:
+        pool = self._pools.get(key)
+        return len(pool.questions) if pool else 0
+
+    def _recent_for(self, user_id: Optional[str]) -> Optional[Tuple[Deque[str], Set[str]]]:
+        if user_id is None:
+            return None
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = (deque(), set())
+            self._recent[user_id] = recent
+            while len(self._recent) > QUESTION_RECENT_USERS:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(user_id)
+        return recent
+
+    @staticmethod
+    def _remember(recent: Optional[Tuple[Deque[str], Set[str]]], question_id: str):
+        if recent is None or question_id in recent[1]:
+            return
+        order, ids = recent
+        order.append(question_id)
+        ids.add(question_id)
+        if len(order) > QUESTION_RECENT_PER_USER:
+            ids.discard(order.popleft())
+
+    def recently_served(self, user_id: Optional[str]) -> Set[str]:
+        """Ids of the questions this user was served recently"""
+        recent = self._recent.get(user_id) if user_id is not None else None
+        return set(recent[1]) if recent else set()
+
+    def mark_served(self, user_id: Optional[str], question_id: str):
+        """Record a question served from elsewhere (the semantic cache) for this user"""
+        self._remember(self._recent_for(user_id), question_id)
+
+    def take(self, key: PoolKey, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Next question from the pool that this user was not served recently, or None"""
+        pool = self._pools.get(key)
+        if not pool or not pool.questions:
+            self.stats["misses"] += 1
+            return None
+        self._pools.move_to_end(key)
+
+        recent = self._recent_for(user_id)
+        seen = recent[1] if recent else ()
+        chosen = None
+        # At most len(seen) questions can be skipped before an unseen one turns up
+        for _ in range(min(len(pool.questions), len(seen) + 1)):
+            candidate = pool.questions[pool.cursor % len(pool.questions)]
+            pool.cursor += 1
+            if candidate["id"] not in seen:
+                chosen = candidate
+                break
+        if chosen is None:
+            self.stats["exhausted"] += 1
+            return None
+
+        self._remember(recent, chosen["id"])
+
+        pool.serves[chosen["id"]] = pool.serves.get(chosen["id"], 0) + 1
+        if pool.serves[chosen["id"]] >= self.max_serves:
+            pool.remove(chosen["id"])
+            self.stats["retired"] += 1
+            asyncio.get_running_loop().run_in_executor(
+                None, self._db_write, "DELETE FROM question_bank WHERE pool = ? AND id = ?",
+                [(pool_name(key), chosen["id"])]
+            )
+        self.stats["hits"] += 1
+        return {**chosen, "source": "bank"}
+
+    async def add(self, key: PoolKey, questions: List[Dict[str, Any]], user_id: Optional[str] = None) -> int:
+        """
+        Store generated questions (duplicates are ignored); returns how many were new
+
+        user_id is the user the questions were generated live for: they
+        count as served to that user, so take() does not repeat them.
+        """
+        pool = self._pool(key)
+        evicted = self._evict()
+        recent = self._recent_for(user_id)
+        rows = []
+        for question in questions:
+            question = {name: value for name, value in question.items() if name not in ("source", "first_token_ms", "total_ms")}
+            question["id"] = question_id(key, question)
+            self._remember(recent, question["id"])
+            if pool.add(question):
+                rows.append((pool_name(key), question["id"], orjson.dumps(question).decode(), time.time()))
+        await asyncio.to_thread(self._db_write, "INSERT OR IGNORE INTO question_bank VALUES (?, ?, ?, ?)", rows)
+        await asyncio.to_thread(self._db_write, "DELETE FROM question_bank WHERE pool = ?", evicted)
+        return len(rows)
+
+    def needs_refill(self, key: PoolKey) -> bool:
+        return self.size(key) < self.low_watermark
+
+    async def take_topic(self, topic: str, difficulty: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        key = topic_pool(topic, difficulty)
+        question = self.take(key, user_id)
+        if question is None or self.needs_refill(key):
+            if self._note_request(key):
+                self._start_topic_refill(topic, difficulty)
+            else:
+                self.stats["cold_skips"] += 1
+        return question
+
+    async def take_word(self, word: Dict[str, Any], user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        key = word_pool(word["id"])
+        question = self.take(key, user_id)
+        if question is None or self.needs_refill(key):
+            if self._note_request(key):
+                self._start_word_refill(word)
+            else:
+                self.stats["cold_skips"] += 1
+        return question
+
+    def refill_topic(self, topic: str, difficulty: str) -> asyncio.Task:
+        """Pin the pool (kept and refilled automatically from now on) and fill it"""
+        self._pinned.add(topic_pool(topic, difficulty))
+        return self._start_topic_refill(topic, difficulty)
+
+    def refill_word(self, word: Dict[str, Any]) -> asyncio.Task:
+        """Pin the word's pool and fill it"""
+        self._pinned.add(word_pool(word["id"]))
+        return self._start_word_refill(word)
+
+    def _start_topic_refill(self, topic: str, difficulty: str) -> asyncio.Task:
+        key = topic_pool(topic, difficulty)
+
+        async def factories(count: int) -> List[GenerateQuestion]:
+            matches = await asyncio.to_thread(self.search_context, topic, count * CONTEXT_SNIPPETS)
+            texts = [match["text"] for match in matches]
+            # A different slice of the retrieved transcripts for each question
+            contexts = [
+                " ".join(texts[i * CONTEXT_SNIPPETS:(i + 1) * CONTEXT_SNIPPETS] or texts[:CONTEXT_SNIPPETS])
+                for i in range(count)
+            ]
+            return [
+                lambda context=context: self.question_generator.generate_question(context, topic, difficulty)
+                for context in contexts
+            ]
+
+        return self._refills.start(key, lambda: self._refill(key, factories))
+
+    def _start_word_refill(self, word: Dict[str, Any]) -> asyncio.Task:
+        key = word_pool(word["id"])
+
+        async def factories(count: int) -> List[GenerateQuestion]:
+            return [lambda: self.question_generator.generate_from_vocabulary(word) for _ in range(count)]
+
+        return self._refills.start(key, lambda: self._refill(key, factories))
+
+    async def _refill(self, key: PoolKey, factories: Callable[[int], Awaitable[List[GenerateQuestion]]]) -> int:
+        needed = self.target - self.size(key)
+        if needed <= 0:
+            return 0
+        self.stats["refills"] += 1
+        if self._refill_slots is None:
+            self._refill_slots = asyncio.Semaphore(QUESTION_REFILL_CONCURRENCY)
+
+        async def one(factory: GenerateQuestion) -> int:
+            async with self._refill_slots:
+                question = await factory()
+            # Servable as soon as it exists, not when the whole refill is done
+            return await self.add(key, [question])
+
+        try:
+            pending = await factories(needed)
+        except Exception as e:
+            # No context to ground questions in (vector store down); the next take retries
+            self.stats["refill_errors"] += 1
+            print(f"Question bank refill for {pool_name(key)} failed: {str(e)}")
+            return 0
+
+        results = await asyncio.gather(*(one(factory) for factory in pending), return_exceptions=True)
+        added = 0
+        for result in results:
+            if isinstance(result, Exception):
+                self.stats["generation_errors"] += 1
+                print(f"Question generation for the bank failed: {str(result)}")
+            else:
+                added += result
+        self.stats["generated"] += added
+        return added
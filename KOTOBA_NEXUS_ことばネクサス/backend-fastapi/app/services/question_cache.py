@@ -0,0 +1,217 @@
+# question_cache.py
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.embedding_cache import normalize_text
+from app.services.vector_index import normalize_rows
+
+# Set QUESTION_CACHE_ENABLED=false to always generate
+QUESTION_CACHE_ENABLED = os.getenv("QUESTION_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity between topic embeddings needed to reuse a question
+QUESTION_CACHE_THRESHOLD = float(os.getenv("QUESTION_CACHE_THRESHOLD", 0.92))
+QUESTION_CACHE_TTL = float(os.getenv("QUESTION_CACHE_TTL", 3600))
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", 1024))
+
+BucketKey = Tuple[str, str]
+
+def request_text(topic: str) -> str:
+    """The embedded part of a request: its topic, normalized"""
+    return normalize_text(topic).casefold()
+
+class VectorBucket:
+    """Unit vectors of one (difficulty, model) bucket in a growable matrix; removal swaps in the last row"""
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: str, vector: np.ndarray):
+        if len(self.ids) == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.vectors[len(self.ids)] = vector
+        self.rows[entry_id] = len(self.ids)
+        self.ids.append(entry_id)
+
+    def remove(self, entry_id: str):
+        row = self.rows.pop(entry_id)
+        last = len(self.ids) - 1
+        last_id = self.ids.pop()
+        if last_id != entry_id:
+            self.vectors[row] = self.vectors[last]
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+
+    def matches(self, vector: np.ndarray, threshold: float) -> List[Tuple[str, float]]:
+        """Entries scoring at least threshold, best first"""
+        scores = self.vectors[:len(self.ids)] @ vector
+        rows = np.nonzero(scores >= threshold)[0]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in rows]
+
+class SemanticQuestionCache:
+    """
+    Generated topic questions, reused for requests with a similar topic
+
+    A request is keyed by its difficulty and model (matched exactly) and
+    the embedding of its normalized topic; get() returns the stored
+    question whose topic embedding has the highest cosine similarity to the
+    request's, if that reaches `threshold` ("food" answers "eating"). The
+    embeddings come from `embed` (blocking, run in a thread), so repeated
+    topics are served by the embedding cache. Entries expire after `ttl`
+    seconds and the least recently used one is evicted beyond
+    `max_entries`. Hits carry provenance: the entry's original topic,
+    similarity, age and hit count. Lookups fail open: when embedding
+    fails, the request is generated as if it missed. get() skips entries
+    whose question id is in `exclude` (the questions the user was served
+    recently) in favour of the next most similar one.
+    """
+
+    stats = {
+        "hits": 0,
+        "misses": 0,
+        "bypassed": 0,
+        "stores": 0,
+        "evictions": 0,
+        "expirations": 0,
+        "errors": 0,
+        "excluded": 0,
+        "entries": 0,
+        "saved_ms_total": 0.0,
+    }
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], np.ndarray],
+        threshold: float = QUESTION_CACHE_THRESHOLD,
+        ttl: float = QUESTION_CACHE_TTL,
+        max_entries: int = QUESTION_CACHE_SIZE,
+        enabled: bool = QUESTION_CACHE_ENABLED
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        # entry id -> entry, in LRU order
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[BucketKey, VectorBucket] = {}
+
+    async def _embed(self, topic: str) -> Optional[np.ndarray]:
+        try:
+            vectors = await asyncio.to_thread(self.embed, [request_text(topic)])
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Question cache embedding failed: {str(e)}")
+            return None
+        return normalize_rows(vectors)[0]
+
+    def _remove(self, entry_id: str):
+        entry = self._entries.pop(entry_id)
+        self._buckets[entry["bucket"]].remove(entry_id)
+        self.stats["entries"] = len(self._entries)
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.ttl
+
+    async def get(
+        self,
+        topic: str,
+        difficulty: str,
+        model: str,
+        bypass: bool = False,
+        exclude: Collection[str] = ()
+    ) -> Optional[Dict[str, Any]]:
+        """A cached question for a similar topic (with "source": "cache" and its provenance), or None"""
+        if bypass or not self.enabled:
+            self.stats["bypassed"] += 1
+            return None
+        start = time.perf_counter()
+        bucket = self._buckets.get((difficulty, model))
+        if not bucket:
+            self.stats["misses"] += 1
+            return None
+        vector = await self._embed(topic)
+        if vector is None:
+            self.stats["misses"] += 1
+            return None
+
+        for entry_id, similarity in bucket.matches(vector, self.threshold):
+            entry = self._entries[entry_id]
+            if self._expired(entry):
+                # Expired entries are dropped when they would have matched
+                self._remove(entry_id)
+                self.stats["expirations"] += 1
+            elif entry["question"].get("id") in exclude:
+                self.stats["excluded"] += 1
+            else:
+                break
+        else:
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(entry_id)
+        entry["hits"] += 1
+        lookup_ms = (time.perf_counter() - start) * 1000
+        self.stats["hits"] += 1
+        self.stats["saved_ms_total"] += max(entry["generation_ms"] - lookup_ms, 0.0)
+        return {
+            **entry["question"],
+            "source": "cache",
+            "cache": {
+                "entry_id": entry_id,
+                "topic": entry["topic"],
+                "similarity": round(similarity, 4),
+                "age_s": round(time.time() - entry["created_at"], 1),
+                "hits": entry["hits"],
+                "generation_ms": entry["generation_ms"],
+            }
+        }
+
+    async def put(self, topic: str, difficulty: str, model: str, question: Dict[str, Any], generation_ms: float):
+        """Store a live question and what it cost to produce (retrieval plus generation)"""
+        if not self.enabled:
+            return
+        vector = await self._embed(topic)
+        if vector is None:
+            return
+
+        bucket_key = (difficulty, model)
+        entry_id = hashlib.sha256(f"{difficulty}\0{model}\0{request_text(topic)}".encode("utf-8")).hexdigest()[:16]
+        # A fresh answer to the same request replaces the old one
+        if entry_id in self._entries:
+            self._remove(entry_id)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = VectorBucket(len(vector))
+        bucket.add(entry_id, vector)
+        self._entries[entry_id] = {
+            "bucket": bucket_key,
+            "topic": topic,
+            "question": {name: value for name, value in question.items() if name not in ("source", "first_token_ms", "total_ms")},
+            "created_at": time.time(),
+            "generation_ms": round(generation_ms, 1),
+            "hits": 0,
+        }
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+        self.stats["entries"] = len(self._entries)
+
+    @classmethod
+    def cache_stats(cls) -> Dict[str, Any]:
+        lookups = cls.stats["hits"] + cls.stats["misses"]
+        return {
+            **cls.stats,
+            "saved_ms_total": round(cls.stats["saved_ms_total"], 1),
+            "hit_rate": round(cls.stats["hits"] / lookups, 4) if lookups else None,
+            "saved_ms_avg": round(cls.stats["saved_ms_total"] / cls.stats["hits"], 1) if cls.stats["hits"] else None
+        }
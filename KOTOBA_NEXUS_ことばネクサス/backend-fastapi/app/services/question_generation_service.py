@@ -1,27 +1,216 @@
 import boto3
 import os
-from typing import Dict, Any
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional
+from botocore.config import Config
+from fastapi import HTTPException
+from app.utils.concurrency import iterate_in_thread
+from app.utils.partial_json import PartialJSONFields
 
-# AWS Bedrock settings
-bedrock = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
+# AWS Bedrock settings (a Claude model speaking the Messages API)
+BEDROCK_QUESTION_MODEL = os.getenv("BEDROCK_QUESTION_MODEL", "anthropic.claude-3-haiku-20240307-v1:0")
+BEDROCK_MAX_TOKENS = int(os.getenv("BEDROCK_MAX_TOKENS", 600))
+BEDROCK_TEMPERATURE = float(os.getenv("BEDROCK_TEMPERATURE", 0.7))
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", 5))
+BEDROCK_READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", 60))
+# Streams read at once per worker; each holds a thread while the model writes
+BEDROCK_MAX_STREAMS = int(os.getenv("BEDROCK_MAX_STREAMS", 16))
+# Answer from the in-process stub instead of AWS (offline development)
+BEDROCK_STUB = os.getenv("BEDROCK_STUB", "false").lower() == "true"
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# Fields are requested in display order, so the question streams in first
+QUESTION_PROMPT = """You write Japanese listening comprehension questions for learners.
+
+Transcript excerpt:
+{context}
+
+Topic: {topic}
+Difficulty: {difficulty}
+
+Write one multiple-choice question, in Japanese, that can be answered from the excerpt.
+Respond with only a JSON object with these keys, in this order:
+{{"question": "...", "options": ["...", "...", "...", "..."], "correct_answer": "<one of the options>", "explanation": "..."}}"""
+
+VOCABULARY_PROMPT = """You write Japanese listening questions for learners.
+
+Vocabulary word: {japanese} ({romaji}), meaning "{english}"
+
+Write a short natural Japanese sentence that uses the word (it will be read aloud),
+and one multiple-choice question about the word's meaning in that sentence.
+Respond with only a JSON object with these keys, in this order:
+{{"audio_text": "<the sentence>", "question": "...", "options": ["...", "...", "...", "..."], "correct_answer": "<one of the options>"}}"""
 
 class QuestionGenerationService:
-    """Generate language learning questions using Amazon Bedrock"""
+    """
+    Generate language learning questions using Amazon Bedrock
 
-    @staticmethod
-    def generate_question(transcript_snippet: str, use_mistral: bool = False) -> Dict[str, Any]:
-        """Generate a question from a transcript snippet using Claude or Mistral 7B"""
-        model_id = "anthropic.claude-v2" if not use_mistral else "mistral.mistral-7b-instruct"
+    Questions are produced through Bedrock's response streaming API. The
+    blocking event stream is read in a dedicated thread pool and handed to
+    the event loop chunk by chunk; stream_question() yields the text deltas
+    as they arrive plus each JSON field of the question (question, every
+    option, correct_answer) as soon as it is complete, so clients render
+    the question long before the model finishes. generate_question()
+    consumes the same stream and returns the finished question.
+    """
+
+    # Shared by every instance in this worker; boto3 clients are thread-safe
+    _client = None
+    _executor = ThreadPoolExecutor(max_workers=BEDROCK_MAX_STREAMS, thread_name_prefix="bedrock-stream")
+    stats = {
+        "streams": 0,
+        "completed": 0,
+        "errors": 0,
+        "invalid": 0,
+        "first_tokens": 0,
+        "first_token_ms_total": 0.0,
+    }
+
+    def __init__(self, model_id: str = BEDROCK_QUESTION_MODEL):
+        self.model_id = model_id
+        self.bedrock = QuestionGenerationService.get_client()
+
+    @classmethod
+    def get_client(cls):
+        """Return the shared bedrock-runtime client (or the stub with BEDROCK_STUB=true)"""
+        if cls._client is None:
+            if BEDROCK_STUB:
+                from app.services.bedrock_stub import StubBedrockClient
+                cls._client = StubBedrockClient()
+            else:
+                cls._client = boto3.client(
+                    "bedrock-runtime",
+                    region_name=os.getenv("AWS_REGION", "us-east-1"),
+                    config=Config(
+                        max_pool_connections=BEDROCK_MAX_STREAMS,
+                        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+                        read_timeout=BEDROCK_READ_TIMEOUT,
+                        retries={"max_attempts": 3, "mode": "standard"}
+                    )
+                )
+        return cls._client
 
-        payload = {
-            "prompt": f"Generate a language quiz question based on: {transcript_snippet}",
-            "max_tokens": 100
+    @classmethod
+    def reset_client(cls):
+        """Drop the shared client (tests, credential changes)"""
+        cls._client = None
+
+    def request_body(self, prompt: str) -> str:
+        return json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": BEDROCK_MAX_TOKENS,
+            "temperature": BEDROCK_TEMPERATURE,
+            "messages": [{"role": "user", "content": prompt}],
+        })
+
+    def _open_stream(self, prompt: str):
+        response = self.bedrock.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            body=self.request_body(prompt),
+            contentType="application/json",
+            accept="application/json"
+        )
+        return response["body"]
+
+    async def _stream(self, prompt: str, required: tuple) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream one completion: {"event": "token"} per text delta, {"event": "field"}
+        per completed JSON field or array item, then {"event": "done"} with
+        every field. A malformed answer is a 502.
+        """
+        self.stats["streams"] += 1
+        parser = PartialJSONFields()
+        start = time.perf_counter()
+        first_token_ms = None
+        try:
+            async for event in iterate_in_thread(lambda: self._open_stream(prompt), self._executor):
+                if "chunk" not in event:
+                    # Modeled stream errors (throttlingException, modelStreamErrorException, ...)
+                    name = next(iter(event), "unknown")
+                    raise HTTPException(status_code=502, detail=f"Bedrock stream error: {name}")
+                payload = json.loads(event["chunk"]["bytes"])
+                if payload.get("type") != "content_block_delta":
+                    continue
+                text = payload.get("delta", {}).get("text", "")
+                if not text:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+                    self.stats["first_tokens"] += 1
+                    self.stats["first_token_ms_total"] += first_token_ms
+                yield {"event": "token", "text": text}
+                for field in parser.feed(text):
+                    yield {"event": "field", **field}
+        except HTTPException:
+            self.stats["errors"] += 1
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            raise HTTPException(status_code=502, detail=f"Question generation failed: {str(e)}")
+
+        fields = parser.fields
+        options = fields.get("options")
+        if (
+            any(not fields.get(name) for name in required)
+            or not isinstance(options, list) or len(options) < 2
+            or fields["correct_answer"] not in options
+        ):
+            self.stats["invalid"] += 1
+            raise HTTPException(status_code=502, detail="Model returned an incomplete question")
+
+        self.stats["completed"] += 1
+        yield {
+            "event": "done",
+            "question": {
+                **fields,
+                "model": self.model_id,
+                "first_token_ms": first_token_ms,
+                "total_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
         }
 
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            body=payload
+    async def stream_question(self, context: str, topic: str, difficulty: str = "medium") -> AsyncIterator[Dict[str, Any]]:
+        """Stream a listening question grounded in `context` (see _stream for the events)"""
+        if difficulty not in DIFFICULTIES:
+            raise HTTPException(status_code=400, detail=f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+        prompt = QUESTION_PROMPT.format(context=context or "(no transcript found)", topic=topic, difficulty=difficulty)
+        async for event in self._stream(prompt, ("question", "options", "correct_answer")):
+            yield event
+
+    async def stream_from_vocabulary(self, word: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a question (with a sentence to read aloud) about one vocabulary word"""
+        prompt = VOCABULARY_PROMPT.format(
+            japanese=word.get("japanese", ""),
+            romaji=word.get("romaji", ""),
+            english=word.get("english", "")
         )
+        async for event in self._stream(prompt, ("audio_text", "question", "options", "correct_answer")):
+            yield event
+
+    @staticmethod
+    async def _final(events: AsyncIterator[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        question = None
+        async for event in events:
+            if event["event"] == "done":
+                question = event["question"]
+        return question
 
-        output = response["body"].read().decode("utf-8")
-        return {"question": output, "model_used": model_id}
+    async def generate_question(self, context: str, topic: str, difficulty: str = "medium") -> Dict[str, Any]:
+        """Generate a listening question from transcript context"""
+        question = await self._final(self.stream_question(context, topic, difficulty))
+        return {**question, "context": context}
+
+    async def generate_from_vocabulary(self, word: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate a question and the sentence to synthesize for a vocabulary word"""
+        return await self._final(self.stream_from_vocabulary(word))
+
+    @classmethod
+    def stream_stats(cls) -> Dict[str, Any]:
+        count = cls.stats["first_tokens"]
+        return {
+            **cls.stats,
+            "first_token_ms_avg": round(cls.stats["first_token_ms_total"] / count, 1) if count else None
+        }
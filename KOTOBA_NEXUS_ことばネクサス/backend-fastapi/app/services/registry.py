@@ -0,0 +1,122 @@
+# registry.py
+import os
+import asyncio
+import inspect
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+
+# A service that failed to build is retried by get() after this many seconds
+SERVICE_RETRY_INTERVAL = float(os.getenv("SERVICE_RETRY_INTERVAL", 30))
+
+@dataclass
+class ServiceEntry:
+    """One app-scoped service: how to build, warm and close it, and how that went"""
+    name: str
+    factory: Callable[[], Any]
+    warmup: Optional[Callable[[Any], Awaitable[Any]]] = None
+    close: Optional[Callable[[Any], Any]] = None
+    instance: Any = None
+    status: str = "pending"
+    error: Optional[str] = None
+    startup_ms: Optional[float] = None
+    failed_at: float = 0.0
+
+class ServiceRegistry:
+    """
+    Services and their pooled clients, built once per worker
+
+    startup() (called from the app lifespan) constructs every registered
+    service in registration order, off the event loop since constructors
+    may do blocking network setup, then runs the warmups concurrently.
+    shutdown() closes them in reverse order. A service whose constructor
+    fails is reported by readiness() and answers 503 from get() until a
+    retry (at most every SERVICE_RETRY_INTERVAL seconds) succeeds; a failed
+    warmup only leaves a note, the service still works (cold). Outside the
+    lifespan (scripts, tests) get() builds services on first use.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, ServiceEntry] = {}
+        # Sync dependencies run in FastAPI's threadpool; build each service once
+        self._lock = threading.RLock()
+        self.started = False
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        warmup: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        close: Optional[Callable[[Any], Any]] = None
+    ):
+        """Register a service; factories may get() services registered before them"""
+        self._entries[name] = ServiceEntry(name=name, factory=factory, warmup=warmup, close=close)
+
+    def _build(self, entry: ServiceEntry):
+        with self._lock:
+            if entry.status == "ready":
+                return
+            start = time.perf_counter()
+            try:
+                entry.instance = entry.factory()
+                entry.status = "ready"
+                entry.error = None
+            except Exception as e:
+                entry.status = "failed"
+                entry.error = str(e)
+                entry.failed_at = time.monotonic()
+                print(f"Service {entry.name} failed to start: {str(e)}")
+            entry.startup_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _warm(self, entry: ServiceEntry):
+        try:
+            await entry.warmup(entry.instance)
+        except Exception as e:
+            entry.error = f"warmup failed: {str(e)}"
+            print(f"Service {entry.name} warmup failed: {str(e)}")
+
+    async def startup(self):
+        for entry in self._entries.values():
+            if entry.status == "pending":
+                await asyncio.to_thread(self._build, entry)
+        await asyncio.gather(*(
+            self._warm(entry) for entry in self._entries.values()
+            if entry.status == "ready" and entry.warmup is not None
+        ))
+        self.started = True
+
+    async def shutdown(self):
+        for entry in reversed(list(self._entries.values())):
+            if entry.instance is not None and entry.close is not None:
+                try:
+                    result = entry.close(entry.instance)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    print(f"Error closing service {entry.name}: {str(e)}")
+            entry.instance = None
+            entry.status = "pending"
+            entry.error = None
+        self.started = False
+
+    def get(self, name: str) -> Any:
+        """The service instance (FastAPI dependencies call this)"""
+        entry = self._entries[name]
+        if entry.status == "pending" or (
+            entry.status == "failed" and time.monotonic() - entry.failed_at >= SERVICE_RETRY_INTERVAL
+        ):
+            self._build(entry)
+        if entry.status == "failed":
+            raise HTTPException(status_code=503, detail=f"{name} is unavailable: {entry.error}")
+        return entry.instance
+
+    def readiness(self) -> Dict[str, Any]:
+        return {
+            "ready": self.started and all(entry.status == "ready" for entry in self._entries.values()),
+            "services": {
+                entry.name: {"status": entry.status, "error": entry.error, "startup_ms": entry.startup_ms}
+                for entry in self._entries.values()
+            }
+        }
@@ -0,0 +1,129 @@
+# review_buffer.py
+import os
+import asyncio
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+from app.models.study_progress import ReviewBatch, StudyProgressRepository, review_item
+
+# A review is written at most this many seconds after it is accepted (plus the write itself)
+REVIEW_FLUSH_INTERVAL = float(os.getenv("REVIEW_FLUSH_INTERVAL", 1.0))
+# Flush early once this many reviews are waiting
+REVIEW_FLUSH_SIZE = int(os.getenv("REVIEW_FLUSH_SIZE", 500))
+# Unwritten reviews held per worker (DynamoDB down); beyond this, reviews are refused with 503
+REVIEW_BUFFER_LIMIT = int(os.getenv("REVIEW_BUFFER_LIMIT", 20000))
+# Attempts at the final flush during shutdown
+REVIEW_SHUTDOWN_ATTEMPTS = 3
+
+class ReviewWriteBuffer:
+    """
+    Write-behind buffer for answered cards
+
+    add() records a review in memory and returns at once. A background task
+    flushes every REVIEW_FLUSH_INTERVAL seconds, or as soon as
+    REVIEW_FLUSH_SIZE reviews are waiting: everything accepted since the
+    last flush becomes one ReviewBatch, so a burst of answers costs one
+    BatchWriteItem per 25 reviews plus one update per session and per word.
+    A batch that fails is retried at the next flush (only its unwritten
+    parts). shutdown() flushes what is left.
+    """
+
+    stats = {"accepted": 0, "rejected": 0, "flushes": 0, "written": 0, "failed_flushes": 0, "pending": 0}
+
+    def __init__(
+        self,
+        repository: StudyProgressRepository,
+        flush_interval: float = REVIEW_FLUSH_INTERVAL,
+        flush_size: int = REVIEW_FLUSH_SIZE,
+        limit: int = REVIEW_BUFFER_LIMIT
+    ):
+        self.repository = repository
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.limit = limit
+        self._reviews: List[Dict[str, Any]] = []
+        # Batches that failed part-way, retried before new reviews
+        self._retry: List[ReviewBatch] = []
+        self._full: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._reviews) + sum(len(batch.logs) for batch in self._retry)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        """Stop the flush loop and write every buffered review"""
+        if self._task is None:
+            return
+        # Not cancelled: a flush in progress keeps running in its thread and must finish first
+        self._stopping = True
+        self._full.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        for _ in range(REVIEW_SHUTDOWN_ATTEMPTS):
+            if await self.flush():
+                return
+        print(f"Review buffer shut down with {self.pending} reviews unwritten")
+
+    async def add(self, user_id: str, session_id: str, word_id: str, correct: bool) -> Dict[str, Any]:
+        """Accept a review for writing within the flush interval; returns its log item"""
+        # Outside the app lifespan (scripts, tests) the flush loop starts on first use
+        await self.start()
+        if self.pending >= self.limit:
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Too many reviews waiting to be written; retry shortly")
+        review = review_item(user_id, session_id, word_id, correct)
+        self._reviews.append(review)
+        self.stats["accepted"] += 1
+        self.stats["pending"] = self.pending
+        if len(self._reviews) >= self.flush_size:
+            self._full.set()
+        return review
+
+    async def flush(self) -> bool:
+        """Write every buffered review; True when nothing is left unwritten"""
+        if self._flush_lock is None:
+            await self.start()
+        async with self._flush_lock:
+            if self._reviews:
+                batch = ReviewBatch()
+                for review in self._reviews:
+                    batch.add(review)
+                self._reviews = []
+                self._retry.append(batch)
+
+            while self._retry:
+                batch = self._retry[0]
+                before = len(batch.logs)
+                try:
+                    await asyncio.to_thread(self.repository.apply_reviews, batch)
+                except Exception as e:
+                    self.stats["written"] += before - len(batch.logs)
+                    self.stats["failed_flushes"] += 1
+                    self.stats["pending"] = self.pending
+                    print(f"Review flush failed ({len(batch.logs)} reviews left): {str(e)}")
+                    return False
+                self.stats["written"] += before
+                self._retry.pop(0)
+            self.stats["flushes"] += 1
+            self.stats["pending"] = self.pending
+            return True
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            if self.pending and not self._stopping:
+                await self.flush()
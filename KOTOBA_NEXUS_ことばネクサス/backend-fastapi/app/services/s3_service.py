@@ -1,41 +1,152 @@
 import boto3
 import os
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from typing import Dict, Optional
+from urllib.parse import quote, unquote
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+# One pooled client per worker; boto3 clients are thread-safe
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", 5))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", 30))
+S3_READ_CHUNK_BYTES = 64 * 1024
+
+# Only objects under this prefix (written through /upload-url) may be evaluated
+S3_UPLOAD_PREFIX = "user-uploads/"
+
+@dataclass
+class S3Object:
+    """What a HEAD request tells us about an uploaded object"""
+    key: str
+    etag: str
+    size: int
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def expected_kana(self) -> Optional[str]:
+        """Expected kana recorded at upload time (x-amz-meta-expected-kana), if any"""
+        value = self.metadata.get("expected-kana")
+        return unquote(value) if value else None
 
 class S3Service:
     """Service to handle S3 operations"""
-    
+
+    # Shared by every S3Service instance in this worker
+    _client = None
+
     def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
-        )
+        self.s3_client = S3Service.get_client()
         self.bucket_name = os.getenv('S3_BUCKET_NAME')
-    
-    def generate_presigned_url(self, file_key, expiration=3600):
+
+    @classmethod
+    def get_client(cls):
+        """Return the shared client, creating it with a connection pool on first use"""
+        if cls._client is None:
+            cls._client = boto3.client(
+                's3',
+                aws_access_key_id=os.getenv('AWS_ACCESS_KEY'),
+                aws_secret_access_key=os.getenv('AWS_SECRET_KEY'),
+                region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                endpoint_url=os.getenv('S3_ENDPOINT_URL') or None,
+                config=Config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    connect_timeout=S3_CONNECT_TIMEOUT,
+                    read_timeout=S3_READ_TIMEOUT,
+                    retries={"max_attempts": 3, "mode": "standard"}
+                )
+            )
+        return cls._client
+
+    @classmethod
+    def reset_client(cls):
+        """Drop the shared client (tests, credential changes)"""
+        cls._client = None
+
+    def generate_presigned_url(self, file_key, expiration=3600, metadata: Optional[Dict[str, str]] = None):
         """
         Generate a presigned URL for uploading to S3
-        
+
         Args:
             file_key: The S3 object key for the file
             expiration: URL expiration time in seconds
-            
+            metadata: Object metadata the upload must carry (sent by the
+                      client as x-amz-meta-* headers)
+
         Returns:
             Presigned URL for PUT operation
         """
         try:
+            params = {
+                'Bucket': self.bucket_name,
+                'Key': file_key,
+                'ContentType': 'image/jpeg'
+            }
+            if metadata:
+                params['Metadata'] = metadata
             response = self.s3_client.generate_presigned_url(
                 'put_object',
-                Params={
-                    'Bucket': self.bucket_name,
-                    'Key': file_key,
-                    'ContentType': 'image/jpeg'
-                },
+                Params=params,
                 ExpiresIn=expiration
             )
             return response
         except Exception as e:
             print(f"Error generating presigned URL: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def upload_metadata(expected_kana: Optional[str]) -> Dict[str, str]:
+        """Object metadata recording the expected kana (percent-encoded: headers are ASCII)"""
+        return {"expected-kana": quote(expected_kana)} if expected_kana else {}
+
+    def head_object(self, file_key: str) -> S3Object:
+        """Size, ETag and metadata of an object, without downloading it (blocking)"""
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_key)
+        except ClientError as e:
+            raise self._http_error(e, file_key)
+        return S3Object(
+            key=file_key,
+            etag=response["ETag"].strip('"'),
+            size=response["ContentLength"],
+            metadata=response.get("Metadata", {})
+        )
+
+    def read_object(self, obj: S3Object, max_bytes: int) -> bytes:
+        """
+        Download an object in chunks, refusing anything over max_bytes (blocking)
+
+        The GET is conditional on the ETag from head_object, so the bytes are
+        the version that was checked; an object replaced in between is a 409.
+        """
+        if obj.size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Image exceeds {max_bytes} bytes")
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=obj.key, IfMatch=f'"{obj.etag}"')
+        except ClientError as e:
+            raise self._http_error(e, obj.key)
+
+        body = response["Body"]
+        chunks, total = [], 0
+        try:
+            for chunk in body.iter_chunks(S3_READ_CHUNK_BYTES):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Image exceeds {max_bytes} bytes")
+                chunks.append(chunk)
+        finally:
+            body.close()
+        return b"".join(chunks)
+
+    @staticmethod
+    def _http_error(error: ClientError, file_key: str) -> HTTPException:
+        code = error.response.get("Error", {}).get("Code", "")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return HTTPException(status_code=404, detail=f"No uploaded object {file_key}")
+        if code in ("403", "AccessDenied"):
+            return HTTPException(status_code=403, detail=f"Access denied to {file_key}")
+        if code in ("412", "PreconditionFailed"):
+            return HTTPException(status_code=409, detail=f"{file_key} changed while it was being read")
+        return HTTPException(status_code=502, detail=f"S3 error {code}: {str(error)}")
@@ -0,0 +1,145 @@
+# subtitles.py
+import re
+import html
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional
+
+TAG = re.compile(r"<[^>]*>")
+# Word timing tags such as <00:00:01.520>, only found in rolling automatic captions
+INLINE_TIMESTAMP = re.compile(r"<\d{2}:\d{2}[:.]")
+
+@dataclass
+class Segment:
+    """One caption: start/end in seconds and its text"""
+    start: float
+    end: float
+    text: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def parse_timestamp(value: str) -> float:
+    """SRT "01:02:03,456" or VTT "01:02:03.456" / "02:03.456" to seconds"""
+    parts = value.strip().replace(",", ".").split(":")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def clean_line(line: str) -> str:
+    """Drop markup (<c>, <b>, VTT inline timestamps) and entities"""
+    return html.unescape(TAG.sub("", line)).strip()
+
+class SubtitleParser:
+    """
+    Incremental SRT/WebVTT parser
+
+    feed() accepts text in arbitrary chunks (as it arrives over the network)
+    and returns the segments completed so far; close() flushes the last cue.
+    Cue numbers, WEBVTT headers, NOTE/STYLE/REGION blocks and cue settings
+    are skipped. YouTube's automatic captions (recognisable by their word
+    timing tags) repeat the previous line at the top of each rolling cue;
+    for those, lines already shown by the previous cue are dropped so every
+    spoken line appears once.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._block: List[str] = []
+        self._previous_lines: List[str] = []
+        self.rolling = False
+
+    def feed(self, chunk: str) -> List[Segment]:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        segments = []
+        for line in lines:
+            line = line.rstrip("\r").lstrip("\ufeff")
+            # Only a truly empty line ends a cue; automatic captions contain " " lines
+            if line:
+                self._block.append(line)
+            elif self._block:
+                segment = self._finish_block()
+                if segment is not None:
+                    segments.append(segment)
+        return segments
+
+    def close(self) -> List[Segment]:
+        segments = self.feed("\n\n") if self._buffer or self._block else []
+        self._buffer = ""
+        return segments
+
+    def _finish_block(self) -> Optional[Segment]:
+        block, self._block = self._block, []
+        timing = next((i for i, line in enumerate(block) if "-->" in line), None)
+        if timing is None:
+            # WEBVTT header, NOTE, STYLE, REGION
+            return None
+
+        start, _, rest = block[timing].partition("-->")
+        try:
+            start_seconds = parse_timestamp(start)
+            end_seconds = parse_timestamp(rest.split()[0])
+        except (ValueError, IndexError):
+            return None
+
+        text_lines = block[timing + 1:]
+        if not self.rolling and any(INLINE_TIMESTAMP.search(line) for line in text_lines):
+            self.rolling = True
+        lines = [line for line in (clean_line(line) for line in text_lines) if line]
+        if self.rolling:
+            new_lines = [line for line in lines if line not in self._previous_lines]
+        else:
+            new_lines = lines
+        self._previous_lines = lines
+        if not new_lines:
+            return None
+        return Segment(start=start_seconds, end=end_seconds, text=" ".join(new_lines))
+
+def parse_subtitles(chunks: Iterable[str]) -> List[Segment]:
+    """Parse a whole SRT/VTT document given as text chunks"""
+    parser = SubtitleParser()
+    segments = []
+    for chunk in chunks:
+        segments.extend(parser.feed(chunk))
+    segments.extend(parser.close())
+    return segments
+
+def window_segments(
+    segments: List[Segment],
+    window_seconds: float = 30.0,
+    overlap_seconds: float = 10.0,
+    separator: str = " "
+) -> List[Dict[str, Any]]:
+    """
+    Merge segments into overlapping windows for embedding
+
+    Each window collects the segments that end within `window_seconds` of
+    its first one. The next window starts at the first segment inside the
+    last `overlap_seconds` of the previous window, so a sentence cut at one
+    boundary appears whole in the neighbouring window. A window that would
+    add nothing new (segments longer than the overlap) is skipped.
+    """
+    windows = []
+    first = 0
+    previous_last = -1
+    while first < len(segments):
+        window_start = segments[first].start
+        last = first
+        while last + 1 < len(segments) and segments[last + 1].end <= window_start + window_seconds:
+            last += 1
+        if last > previous_last:
+            windows.append({
+                "start": window_start,
+                "end": segments[last].end,
+                "text": separator.join(segment.text for segment in segments[first:last + 1])
+            })
+            previous_last = last
+        if last == len(segments) - 1:
+            break
+        overlap_from = segments[last].end - overlap_seconds
+        following = first + 1
+        while following <= last and segments[following].start < overlap_from:
+            following += 1
+        first = following
+    return windows
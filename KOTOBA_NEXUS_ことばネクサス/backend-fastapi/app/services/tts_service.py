@@ -1,18 +1,206 @@
 import boto3
 import os
+import re
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Deque, List, Optional
+from botocore.config import Config
+from fastapi import HTTPException
+from app.services.audio_cache import AUDIO_FORMATS, AudioStore, audio_name
+from app.services.embedding_cache import normalize_text
+from app.utils.single_flight import SingleFlight
 
-# Initialize Polly client
-polly = boto3.client("polly", region_name=os.getenv("AWS_REGION", "us-east-1"))
+# Polly voice and engine (Mizuki and Takumi speak Japanese with the standard engine)
+TTS_VOICE = os.getenv("TTS_VOICE", "Mizuki")
+TTS_ENGINE = os.getenv("TTS_ENGINE", "standard")
+TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "mp3")
+# Polly calls at once per worker (one thread each)
+POLLY_MAX_CONCURRENCY = int(os.getenv("POLLY_MAX_CONCURRENCY", 8))
+# Long texts are synthesized in sentence chunks: sentences are merged up to
+# TTS_CHUNK_MIN_CHARS, and no chunk exceeds TTS_CHUNK_MAX_CHARS (Polly refuses 3000+)
+TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", 40))
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", 1500))
+# Chunks synthesized ahead of the one being streamed (bounds per-stream memory)
+TTS_STREAM_READ_AHEAD = int(os.getenv("TTS_STREAM_READ_AHEAD", 4))
+# Synthesize with the in-process stub instead of AWS (offline development)
+POLLY_STUB = os.getenv("POLLY_STUB", "false").lower() == "true"
+
+# A sentence runs to 。！？ (or !? after NFKC) and any closing brackets
+SENTENCE = re.compile(r".+?(?:[。！？!?]+[」』）)\]]*|$)", re.S)
+
+def split_long(sentence: str, max_chars: int) -> List[str]:
+    """Pieces of at most max_chars, cut after the last 、 or space that fits when there is one"""
+    pieces = []
+    while len(sentence) > max_chars:
+        cut = max(sentence.rfind("、", 0, max_chars), sentence.rfind(" ", 0, max_chars)) + 1
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    return pieces + [sentence] if sentence else pieces
+
+def split_sentences(text: str, min_chars: int = TTS_CHUNK_MIN_CHARS, max_chars: int = TTS_CHUNK_MAX_CHARS) -> List[str]:
+    """Synthesis chunks of `text` on Japanese sentence boundaries, short sentences merged"""
+    chunks: List[str] = []
+    for match in SENTENCE.finditer(text):
+        for sentence in split_long(match.group().strip(), max_chars):
+            if chunks and len(chunks[-1]) < min_chars and len(chunks[-1]) + len(sentence) <= max_chars:
+                chunks[-1] += sentence
+            else:
+                chunks.append(sentence)
+    return chunks
 
 class TTSService:
-    """Convert AI-generated text to speech using Amazon Polly"""
+    """
+    Convert AI-generated text to speech using Amazon Polly
+
+    generate_audio() returns a stable URL for the audio of a text. Audio is
+    content-addressed by (normalized text, voice, format, engine) in the
+    AudioStore: a text already synthesized by any request (on this disk,
+    or in the S3 tier by any worker) is answered without calling Polly,
+    and concurrent requests for the same new audio share one synthesis.
+
+    Long texts are split on sentence boundaries (split_sentences) and the
+    chunks synthesized in parallel, each cached under its own address.
+    stream_audio() sends the MP3 chunk by chunk, in order, as soon as each
+    is ready, so playback starts after the first sentence is synthesized
+    and at most TTS_STREAM_READ_AHEAD chunks are held in memory.
+    """
+
+    # Shared by every instance in this worker; boto3 clients are thread-safe
+    _client = None
+    _executor = ThreadPoolExecutor(max_workers=POLLY_MAX_CONCURRENCY, thread_name_prefix="polly")
+    stats = {
+        "requests": 0,
+        "disk_hits": 0,
+        "s3_hits": 0,
+        "syntheses": 0,
+        "synthesized_chars": 0,
+        "shared": 0,
+        "streams": 0,
+        "stream_chunks": 0,
+        "chunk_hits": 0,
+    }
+
+    def __init__(self, store: Optional[AudioStore] = None):
+        self.store = store or AudioStore()
+        self._flight = SingleFlight()
+
+    @classmethod
+    def get_client(cls):
+        """Return the shared Polly client (or the stub with POLLY_STUB=true)"""
+        if cls._client is None:
+            if POLLY_STUB:
+                from app.services.polly_stub import StubPollyClient
+                cls._client = StubPollyClient()
+            else:
+                cls._client = boto3.client(
+                    "polly",
+                    region_name=os.getenv("AWS_REGION", "us-east-1"),
+                    config=Config(max_pool_connections=POLLY_MAX_CONCURRENCY, retries={"max_attempts": 3, "mode": "standard"})
+                )
+        return cls._client
+
+    @classmethod
+    def reset_client(cls):
+        """Drop the shared client (tests, credential changes)"""
+        cls._client = None
 
     @staticmethod
-    def text_to_speech(text: str, voice: str = "Mizuki") -> str:
-        """Convert text to MP3 audio using Amazon Polly"""
-        response = polly.synthesize_speech(
+    def text_to_speech(text: str, voice: str = TTS_VOICE, output_format: str = "mp3", engine: str = TTS_ENGINE) -> bytes:
+        """Convert text to audio using Amazon Polly (blocking, always synthesizes)"""
+        response = TTSService.get_client().synthesize_speech(
             Text=text,
-            OutputFormat="mp3",
-            VoiceId=voice
+            OutputFormat=output_format,
+            VoiceId=voice,
+            Engine=engine
         )
         return response["AudioStream"].read()
+
+    async def generate_audio(
+        self,
+        text: str,
+        voice: str = TTS_VOICE,
+        output_format: str = TTS_OUTPUT_FORMAT,
+        engine: str = TTS_ENGINE
+    ) -> str:
+        """URL of the audio for `text`, synthesized only if no tier has it yet"""
+        text = normalize_text(text)
+        if not text:
+            raise HTTPException(status_code=400, detail="text must not be empty")
+        if output_format not in AUDIO_FORMATS:
+            raise HTTPException(status_code=400, detail=f"output_format must be one of {', '.join(AUDIO_FORMATS)}")
+
+        self.stats["requests"] += 1
+        name = audio_name(text, voice, output_format, engine)
+        if await asyncio.to_thread(self.store.local_path, name) is not None:
+            self.stats["disk_hits"] += 1
+        elif await asyncio.to_thread(self.store.has_remote, name):
+            self.stats["s3_hits"] += 1
+        else:
+            if self._flight.in_flight(name):
+                self.stats["shared"] += 1
+            await self._flight.do(name, lambda: self._synthesize(name, text, voice, output_format, engine))
+        return self.store.url(name)
+
+    async def _synthesize(self, name: str, text: str, voice: str, output_format: str, engine: str) -> bytes:
+        if len(text) > TTS_CHUNK_MAX_CHARS and output_format == "mp3":
+            # MP3 frames concatenate into one playable file
+            audio = b"".join([piece async for piece in self._chunks(split_sentences(text), voice, engine)])
+        else:
+            loop = asyncio.get_running_loop()
+            audio = await loop.run_in_executor(self._executor, self.text_to_speech, text, voice, output_format, engine)
+            self.stats["syntheses"] += 1
+            self.stats["synthesized_chars"] += len(text)
+        await asyncio.to_thread(self.store.save, name, audio)
+        return audio
+
+    async def _chunk_audio(self, chunk: str, voice: str, engine: str) -> bytes:
+        """MP3 for one chunk, from the disk tier or synthesized (and stored)"""
+        name = audio_name(chunk, voice, "mp3", engine)
+        path = await asyncio.to_thread(self.store.local_path, name)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    audio = await asyncio.to_thread(f.read)
+                self.stats["chunk_hits"] += 1
+                return audio
+            except FileNotFoundError:
+                # Evicted since the lookup
+                pass
+        return await self._flight.do(name, lambda: self._synthesize(name, chunk, voice, "mp3", engine))
+
+    async def _chunks(self, chunks: List[str], voice: str, engine: str) -> AsyncIterator[bytes]:
+        """Each chunk's MP3 in order, synthesizing up to TTS_STREAM_READ_AHEAD chunks at once"""
+        pending: Deque[asyncio.Task] = deque()
+        position = 0
+        try:
+            while pending or position < len(chunks):
+                while position < len(chunks) and len(pending) < TTS_STREAM_READ_AHEAD:
+                    pending.append(asyncio.ensure_future(self._chunk_audio(chunks[position], voice, engine)))
+                    position += 1
+                audio = await pending.popleft()
+                self.stats["stream_chunks"] += 1
+                yield audio
+        finally:
+            # Client gone or a chunk failed: stop the chunks not sent yet
+            for task in pending:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()
+                else:
+                    task.cancel()
+
+    async def stream_audio(self, text: str, voice: str = TTS_VOICE, engine: str = TTS_ENGINE) -> AsyncIterator[bytes]:
+        """MP3 for `text` of any length, streamed sentence chunk by sentence chunk"""
+        chunks = split_sentences(normalize_text(text))
+        if not chunks:
+            raise HTTPException(status_code=400, detail="text must not be empty")
+        self.stats["streams"] += 1
+        async for audio in self._chunks(chunks, voice, engine):
+            yield audio
+
+    async def audio_path(self, name: str) -> Optional[str]:
+        """Local path of stored audio (fetched from the S3 tier if needed), or None"""
+        return await asyncio.to_thread(self.store.fetch, name)
@@ -0,0 +1,71 @@
+# vector_backends.py
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+import numpy as np
+
+try:
+    import pinecone
+except ImportError:  # only needed for VECTOR_BACKEND=pinecone
+    pinecone = None
+
+class VectorBackend(ABC):
+    """
+    Storage and similarity search behind VectorStoreService
+
+    Vectors are dicts {"id", "values", "metadata"} (the Pinecone upsert
+    shape); query results are dicts {"id", "score", "metadata"}, best first,
+    scored by cosine similarity. Methods are blocking.
+    """
+
+    @abstractmethod
+    def fetch_ids(self, ids: List[str]) -> set:
+        """Which of these ids are stored"""
+
+    @abstractmethod
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Insert or replace vectors by id"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Remove vectors by id (missing ids are ignored)"""
+
+    @abstractmethod
+    def query(self, vector: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """The top_k most similar vectors, best first"""
+
+class PineconeBackend(VectorBackend):
+    """Hosted Pinecone index (every call is a network round trip)"""
+
+    def __init__(self, index_name: str, vector_dim: int):
+        if pinecone is None:
+            raise RuntimeError("pinecone-client is not installed; install it or set VECTOR_BACKEND=local")
+
+        # Pinecone API key & setup
+        pinecone.init(api_key=os.getenv("PINECONE_API_KEY"), environment="us-west1-gcp")
+
+        # Check if index exists, else create
+        if index_name not in pinecone.list_indexes():
+            pinecone.create_index(index_name, dimension=vector_dim, metric="cosine")
+
+        self.index = pinecone.Index(index_name)
+
+    def fetch_ids(self, ids: List[str]) -> set:
+        return set(self.index.fetch(ids=ids)["vectors"].keys())
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        self.index.upsert(vectors=vectors)
+
+    def delete(self, ids: List[str]):
+        self.index.delete(ids=ids)
+
+    def query(self, vector: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        results = self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            top_k=top_k,
+            include_metadata=True
+        )
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": match["metadata"]}
+            for match in results["matches"]
+        ]
@@ -0,0 +1,289 @@
+# vector_index.py
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.services.vector_backends import VectorBackend
+
+# "exact" scans every vector, "ivf" probes the nearest clusters, "auto" switches
+# to IVF once the index holds IVF_MIN_VECTORS live vectors
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "auto")
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", 20000))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+
+# Rows scored per matrix product while training, to bound temporary memory
+SCORE_CHUNK_ROWS = 65536
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Unit-length float32 rows, so a dot product is a cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every row"""
+    assignment = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), SCORE_CHUNK_ROWS):
+        assignment[start:start + SCORE_CHUNK_ROWS] = np.argmax(data[start:start + SCORE_CHUNK_ROWS] @ centroids.T, axis=1)
+    return assignment
+
+def spherical_kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """k unit-length centroids for unit-length rows (cosine k-means)"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroids(data, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        order = np.argsort(assignment, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        # Segment sums of the rows sorted by cluster
+        sums = np.zeros_like(centroids)
+        empty = counts == 0
+        sums[~empty] = np.add.reduceat(data[order], starts[~empty])
+        # Re-seed empty clusters from random rows
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+class LocalVectorIndex(VectorBackend):
+    """
+    In-process cosine index over a float32 matrix
+
+    Vectors are stored normalized in one contiguous matrix, so exact top-k
+    is a single matrix-vector product plus argpartition. For large corpora
+    an IVF index (spherical k-means, sqrt(n) clusters) restricts scoring to
+    the `nprobe` clusters nearest the query. Deletes are tombstones that
+    compaction removes. snapshot() writes the matrix as .npy; load() maps it
+    copy-on-write, so startup does not read the corpus into memory.
+    Thread-safe.
+    """
+
+    def __init__(self, dim: int, mode: str = LOCAL_INDEX_MODE, nprobe: int = IVF_NPROBE, ivf_min_vectors: int = IVF_MIN_VECTORS):
+        if mode not in ("auto", "exact", "ivf"):
+            raise ValueError(f"Unknown index mode {mode}")
+        self.dim = dim
+        self.mode = mode
+        self.nprobe = nprobe
+        self.ivf_min_vectors = ivf_min_vectors
+        self._lock = threading.RLock()
+
+        # Rows [0, _size) are in use; deleted rows stay until compaction
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._ids: List[str] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self.dirty = False
+
+        # IVF: centroids, cluster per row, and rows per cluster (arrays plus rows added since)
+        self._centroids: Optional[np.ndarray] = None
+        self._cluster = np.zeros(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+        self._pending: List[List[int]] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # VectorBackend
+
+    def fetch_ids(self, ids: List[str]) -> set:
+        with self._lock:
+            return {vector_id for vector_id in ids if vector_id in self._rows}
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Add vectors; an existing id is replaced"""
+        if not vectors:
+            return
+        matrix = normalize_rows([vector["values"] for vector in vectors])
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {matrix.shape[1]}")
+
+        with self._lock:
+            self._delete_rows([vector["id"] for vector in vectors])
+            self._reserve(len(vectors))
+            start, end = self._size, self._size + len(vectors)
+            self._vectors[start:end] = matrix
+            self._alive[start:end] = True
+            for row, vector in enumerate(vectors, start):
+                self._rows[vector["id"]] = row
+                self._ids.append(vector["id"])
+                self._metadata.append(vector.get("metadata"))
+            self._size = end
+            self.dirty = True
+
+            if self._centroids is not None:
+                assignment = nearest_centroids(matrix, self._centroids)
+                self._cluster[start:end] = assignment
+                for row, cluster in enumerate(assignment, start):
+                    self._pending[cluster].append(row)
+            if self._wants_ivf() and (self._centroids is None or len(self._rows) >= 2 * self._trained_size):
+                self.build_ivf()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._delete_rows(ids)
+            # Tombstones still cost scan time; drop them once they are a quarter of the matrix
+            if self._size and (self._size - len(self._rows)) * 4 > self._size:
+                self.compact()
+
+    def query(self, vector: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        query = normalize_rows(vector)
+        with self._lock:
+            if not self._rows or top_k <= 0:
+                return []
+            rows = None
+            if self._centroids is not None and self._wants_ivf():
+                rows = self._candidates(query)
+                rows = rows[self._alive[rows]]
+                if len(rows) < top_k:
+                    # Too few vectors near the query: fall back to a full scan
+                    rows = None
+            if rows is not None:
+                scores = self._vectors[rows] @ query
+            else:
+                scores = np.where(self._alive[:self._size], self._vectors[:self._size] @ query, -np.inf)
+
+            k = min(top_k, len(scores))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for position in top:
+                if not np.isfinite(scores[position]):
+                    break
+                row = int(rows[position]) if rows is not None else int(position)
+                results.append({"id": self._ids[row], "score": float(scores[position]), "metadata": self._metadata[row]})
+            return results
+
+    # IVF
+
+    def _wants_ivf(self) -> bool:
+        return self.mode == "ivf" or (self.mode == "auto" and len(self._rows) >= self.ivf_min_vectors)
+
+    def build_ivf(self, clusters: Optional[int] = None):
+        """(Re)train cluster centroids on a sample and assign every live vector"""
+        with self._lock:
+            self.compact()
+            if self._size == 0:
+                return
+            data = self._vectors[:self._size]
+            k = clusters or max(1, int(np.sqrt(self._size)))
+            # ~40 training points per centroid is plenty for k-means
+            sample_size = max(40 * k, 10000)
+            rng = np.random.default_rng(0)
+            sample = data if self._size <= sample_size else data[np.sort(rng.choice(self._size, sample_size, replace=False))]
+            self._centroids = spherical_kmeans(sample, min(k, len(sample)))
+            self._set_clusters(nearest_centroids(data, self._centroids))
+            self._trained_size = self._size
+
+    def _set_clusters(self, assignment: np.ndarray):
+        self._cluster = np.zeros(len(self._vectors), dtype=np.int32)
+        self._cluster[:self._size] = assignment
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+        self._pending = [[] for _ in self._lists]
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        nprobe = min(self.nprobe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        for cluster in probes:
+            if self._pending[cluster]:
+                self._lists[cluster] = np.concatenate([self._lists[cluster], np.asarray(self._pending[cluster], dtype=np.int64)])
+                self._pending[cluster] = []
+        return np.concatenate([self._lists[cluster] for cluster in probes])
+
+    # Storage
+
+    def _reserve(self, count: int):
+        needed = self._size + count
+        if needed <= len(self._vectors) and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self._vectors), 1024)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        cluster = np.zeros(capacity, dtype=np.int32)
+        cluster[:self._size] = self._cluster[:self._size]
+        self._vectors, self._alive, self._cluster = vectors, alive, cluster
+
+    def _delete_rows(self, ids: List[str]):
+        for vector_id in ids:
+            row = self._rows.pop(vector_id, None)
+            if row is not None:
+                self._alive[row] = False
+                self._metadata[row] = None
+                self.dirty = True
+
+    def compact(self):
+        """Drop deleted rows (row numbers change; IVF lists are rebuilt)"""
+        with self._lock:
+            if len(self._rows) == self._size:
+                return
+            keep = np.nonzero(self._alive[:self._size])[0]
+            self._vectors = np.ascontiguousarray(self._vectors[keep])
+            self._alive = np.ones(len(keep), dtype=bool)
+            self._ids = [self._ids[row] for row in keep]
+            self._metadata = [self._metadata[row] for row in keep]
+            self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            assignment = self._cluster[keep]
+            self._size = len(keep)
+            if self._centroids is not None:
+                self._set_clusters(assignment)
+            else:
+                self._cluster = np.zeros(self._size, dtype=np.int32)
+
+    # Snapshots
+
+    def snapshot(self, directory: str):
+        """Write the compacted index to `directory` (each file replaced atomically)"""
+        with self._lock:
+            self.compact()
+            os.makedirs(directory, exist_ok=True)
+
+            def replace(name: str, write):
+                path = os.path.join(directory, name)
+                temporary = path + ".tmp"
+                with open(temporary, "wb") as handle:
+                    write(handle)
+                os.replace(temporary, path)
+
+            replace("vectors.npy", lambda handle: np.save(handle, self._vectors[:self._size]))
+            replace("clusters.npz", lambda handle: np.savez(
+                handle,
+                centroids=self._centroids if self._centroids is not None else np.zeros((0, self.dim), dtype=np.float32),
+                cluster=self._cluster[:self._size]
+            ))
+            meta = {"dim": self.dim, "ids": self._ids, "metadata": self._metadata, "trained_size": self._trained_size}
+            replace("meta.json", lambda handle: handle.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+            self.dirty = False
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def load(cls, directory: str, **options) -> "LocalVectorIndex":
+        """Open a snapshot; vectors are memory-mapped copy-on-write"""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        index = cls(meta["dim"], **options)
+        index._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="c")
+        index._size = len(index._vectors)
+        index._alive = np.ones(index._size, dtype=bool)
+        index._ids = meta["ids"]
+        index._metadata = meta["metadata"]
+        index._rows = {vector_id: row for row, vector_id in enumerate(index._ids)}
+        with np.load(os.path.join(directory, "clusters.npz")) as clusters:
+            if len(clusters["centroids"]):
+                index._centroids = clusters["centroids"]
+                index._set_clusters(clusters["cluster"])
+                index._trained_size = meta.get("trained_size", index._size)
+            else:
+                index._cluster = np.zeros(len(index._vectors), dtype=np.int32)
+        return index
@@ -1,65 +1,197 @@
-import pinecone
 import json
+import hashlib
 import numpy as np
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Iterator, Optional, Sequence, Tuple
 import os
 from anthropic import Anthropic
+from app.utils.retry import retry_call
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+from app.services.vector_backends import VectorBackend, PineconeBackend
+from app.services.vector_index import LocalVectorIndex
+
+# "pinecone" (hosted) or "local" (in-process index, snapshotted to LOCAL_VECTOR_INDEX_PATH)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_VECTOR_INDEX_PATH = os.getenv("LOCAL_VECTOR_INDEX_PATH")
+
+# Ingestion batching: texts per embedding request and how many run at once
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_MAX_PARALLEL = int(os.getenv("EMBED_MAX_PARALLEL", 4))
+# Pinecone caps a request at 2MB / 1000 vectors; 100 x 1536-dim floats plus text stays well under
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 100))
+FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", 200))
+UPSERT_MAX_PARALLEL = int(os.getenv("UPSERT_MAX_PARALLEL", 4))
+VECTOR_STORE_MAX_RETRIES = int(os.getenv("VECTOR_STORE_MAX_RETRIES", 3))
+
+def transcription_id(text: str) -> str:
+    """Content-derived vector id: the same text always maps to the same vector"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+def chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 class VectorStoreService:
-    """Vector store using Pinecone and Claude for embeddings"""
+    """Vector store over a pluggable backend (Pinecone or in-process), with Claude for embeddings"""
 
-    def __init__(self, index_name="kotoba-nexus", vector_dim=1536):
+    # Query embeddings shared by every instance in this worker
+    embedding_cache = EmbeddingCache()
+
+    # The worker's in-process index when VECTOR_BACKEND=local
+    _local_index: Optional[LocalVectorIndex] = None
+
+    def __init__(self, index_name="kotoba-nexus", vector_dim=1536, backend: Optional[str] = None):
         self.index_name = index_name
         self.vector_dim = vector_dim
-        
-        # Pinecone API key & setup
-        pinecone.init(api_key=os.getenv("PINECONE_API_KEY"), environment="us-west1-gcp")
-        
-        # Check if index exists, else create
-        if self.index_name not in pinecone.list_indexes():
-            pinecone.create_index(self.index_name, dimension=self.vector_dim, metric="cosine")
-        
-        self.index = pinecone.Index(self.index_name)
+        self.embedding_model = "claude-3-opus-20240229"
+
+        backend = backend or VECTOR_BACKEND
+        if backend == "local":
+            self.backend: VectorBackend = VectorStoreService.local_index(vector_dim)
+        elif backend == "pinecone":
+            self.backend = PineconeBackend(index_name, vector_dim)
+        else:
+            raise ValueError(f"Unknown VECTOR_BACKEND {backend}")
 
         # Claude API setup (Anthropic)
         self.claude = Anthropic(api_key=os.getenv("CLAUDE_API_KEY"))
 
+    @classmethod
+    def local_index(cls, vector_dim: int) -> LocalVectorIndex:
+        """The in-process index, loaded from LOCAL_VECTOR_INDEX_PATH when a snapshot exists"""
+        if cls._local_index is None:
+            if LOCAL_VECTOR_INDEX_PATH and LocalVectorIndex.exists(LOCAL_VECTOR_INDEX_PATH):
+                cls._local_index = LocalVectorIndex.load(LOCAL_VECTOR_INDEX_PATH)
+            else:
+                cls._local_index = LocalVectorIndex(vector_dim)
+        return cls._local_index
+
+    @classmethod
+    def shutdown(cls):
+        """Close the embedding cache and snapshot the local index if it changed"""
+        cls.embedding_cache.close()
+        if cls._local_index is not None and cls._local_index.dirty and LOCAL_VECTOR_INDEX_PATH:
+            cls._local_index.snapshot(LOCAL_VECTOR_INDEX_PATH)
+
     def embed_text(self, text: str) -> np.array:
         """Use Claude to generate embeddings"""
+        return self.embed_texts([text])[0]
+
+    def embed_texts(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """
+        Embed several texts; returns a (len(texts), dim) float32 matrix
+
+        With use_cache, vectors come from the embedding cache where possible
+        and only the misses are sent, in one request. Ingestion passes
+        use_cache=False so one-off transcript lines do not evict query vectors.
+        """
+        if not use_cache:
+            return self._request_embeddings(texts)
+
+        vectors = self.embedding_cache.get_many(self.embedding_model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Identical texts in one call are embedded once
+            unique = list(dict.fromkeys(normalize_text(texts[i]) for i in missing))
+            embedded = self._request_embeddings(unique)
+            self.embedding_cache.put_many(self.embedding_model, unique, embedded)
+            by_text = dict(zip(unique, embedded))
+            for i in missing:
+                vectors[i] = by_text[normalize_text(texts[i])]
+        return np.stack(vectors)
+
+    def _request_embeddings(self, texts: List[str]) -> np.ndarray:
         # Use the embeddings API, not completions
-        response = self.claude.embeddings.create(
-            model="claude-3-opus-20240229",
-            input=text
+        response = retry_call(
+            lambda: self.claude.embeddings.create(model=self.embedding_model, input=texts),
+            attempts=VECTOR_STORE_MAX_RETRIES
         )
-        # Extract the embedding from the response
-        embedding = response.embedding
-        return np.array(embedding, dtype=np.float32)
-
-    def add_transcriptions(self, transcriptions: List[str]):
-        """Convert transcriptions to embeddings and store in Pinecone"""
-        vectors = []
-        for i, text in enumerate(transcriptions):
-            embedding = self.embed_text(text).tolist()
-            # Include the text as metadata for retrieval later
-            vectors.append({
-                "id": str(i),
-                "values": embedding,
-                "metadata": {"text": text}
-            })
-        
-        # Updated upsert to handle the correct format
-        self.index.upsert(vectors=vectors)
+        # One embedding per input, in input order
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+    def existing_ids(self, ids: List[str]) -> set:
+        """Which of these vector ids are already stored"""
+        found = set()
+        for batch in chunked(ids, FETCH_BATCH_SIZE):
+            found |= retry_call(lambda: self.backend.fetch_ids(list(batch)), attempts=VECTOR_STORE_MAX_RETRIES)
+        return found
+
+    def new_transcriptions(self, transcriptions: List[str]) -> List[Tuple[str, str]]:
+        """(vector id, text) for the texts not stored yet, repeats and blanks dropped"""
+        texts: Dict[str, str] = {}
+        for text in transcriptions:
+            if text.strip():
+                texts.setdefault(transcription_id(text), text)
+        existing = self.existing_ids(list(texts))
+        return [(vector_id, text) for vector_id, text in texts.items() if vector_id not in existing]
+
+    def build_vectors(
+        self,
+        items: Sequence[Tuple[str, str]],
+        embeddings: np.ndarray,
+        metadata: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Backend vectors; the text is kept as metadata for retrieval later"""
+        return [
+            {"id": vector_id, "values": embedding.tolist(), "metadata": {**(metadata[i] if metadata else {}), "text": text}}
+            for i, ((vector_id, text), embedding) in enumerate(zip(items, embeddings))
+        ]
+
+    def upsert_vectors(self, vectors: List[Dict[str, Any]]):
+        """Upsert in UPSERT_BATCH_SIZE chunks, UPSERT_MAX_PARALLEL at a time, with retries"""
+        if len(vectors) <= UPSERT_BATCH_SIZE:
+            retry_call(lambda: self.backend.upsert(vectors), attempts=VECTOR_STORE_MAX_RETRIES)
+            return
+        with ThreadPoolExecutor(max_workers=UPSERT_MAX_PARALLEL) as pool:
+            list(pool.map(
+                lambda batch: retry_call(lambda: self.backend.upsert(list(batch)), attempts=VECTOR_STORE_MAX_RETRIES),
+                chunked(vectors, UPSERT_BATCH_SIZE)
+            ))
+
+    def add_transcriptions(self, transcriptions: List[str]) -> Dict[str, int]:
+        """
+        Convert transcriptions to embeddings and store them in the backend
+
+        Ids are content hashes, so adding the same text again is a no-op:
+        texts already in the index (or repeated within the call) are skipped
+        before embedding. New texts are embedded EMBED_BATCH_SIZE per request
+        with EMBED_MAX_PARALLEL requests in flight, then upserted in
+        UPSERT_BATCH_SIZE chunks; every request is retried with backoff.
+        Blocking; from async code run it via asyncio.to_thread. Long inputs
+        belong in the ingestion queue (app/services/ingestion.py).
+
+        Returns:
+            Counts of texts received, skipped as already stored, and added
+        """
+        new = self.new_transcriptions(transcriptions)
+
+        if new:
+            new_texts = [text for _, text in new]
+            with ThreadPoolExecutor(max_workers=EMBED_MAX_PARALLEL) as pool:
+                embeddings = np.concatenate(list(pool.map(
+                    lambda batch: self.embed_texts(batch, use_cache=False),
+                    chunked(new_texts, EMBED_BATCH_SIZE)
+                )))
+            self.upsert_vectors(self.build_vectors(new, embeddings))
+
+        return {
+            "received": len(transcriptions),
+            "skipped": len(transcriptions) - len(new),
+            "added": len(new)
+        }
+
+    def delete_transcriptions(self, transcriptions: List[str]):
+        """Remove transcriptions (matched by content id) from the backend"""
+        ids = list({transcription_id(text) for text in transcriptions})
+        for batch in chunked(ids, UPSERT_BATCH_SIZE):
+            retry_call(lambda: self.backend.delete(list(batch)), attempts=VECTOR_STORE_MAX_RETRIES)
 
     def search_similar(self, query: str, top_k: int = 5) -> List[Dict[str, any]]:
-        """Find top-k similar embeddings in Pinecone"""
-        query_embedding = self.embed_text(query).tolist()
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
+        """Find top-k similar embeddings in the backend"""
+        query_embedding = self.embed_text(query)
+        matches = self.backend.query(query_embedding, top_k)
 
         return [
             {"text": match["metadata"]["text"], "score": match["score"]}
-            for match in results["matches"]
-        ]
\ No newline at end of file
+            for match in matches
+        ]
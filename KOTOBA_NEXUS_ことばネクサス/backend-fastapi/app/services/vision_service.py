@@ -1,66 +1,123 @@
 # vision_service.py
 import os
+import asyncio
 import base64
-from typing import List, Dict, Any, Optional
-import requests
-from io import BytesIO
-from PIL import Image
-import numpy as np
-from anthropic import Anthropic
+from typing import List, Dict, Any, Optional, Union
+import anthropic
+from anthropic import AsyncAnthropic
+from fastapi import HTTPException
+from app.utils.concurrency import BoundedLimiter, QueueFullError
+from app.services.image_preprocessing import PreprocessConfig, PreprocessedImage, preprocess_image, preprocess_worksheet, DEFAULT_CONFIG
+
+# Global (per worker) limits for Claude Vision calls
+VISION_MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", 8))
+VISION_MAX_QUEUE = int(os.getenv("VISION_MAX_QUEUE", 32))
+VISION_QUEUE_TIMEOUT = float(os.getenv("VISION_QUEUE_TIMEOUT", 10))
+VISION_CALL_TIMEOUT = float(os.getenv("VISION_CALL_TIMEOUT", 30))
+# The SDK's own timeout only backs up the wait_for bound above, so it never wins the race
+VISION_SDK_TIMEOUT = VISION_CALL_TIMEOUT + 5
 
 class VisionService:
     """Service for processing images with Claude Vision API for OCR and character recognition"""
 
+    # Shared by every VisionService instance in this worker
+    limiter = BoundedLimiter(VISION_MAX_CONCURRENCY, VISION_MAX_QUEUE)
+    preprocess_stats = {"images": 0, "original_bytes": 0, "processed_bytes": 0}
+
     def __init__(self):
         """Initialize the vision service with Claude client"""
-        self.claude = Anthropic(api_key=os.getenv("CLAUDE_API_KEY"))
+        # No SDK retries: they would run inside the VISION_CALL_TIMEOUT budget and hold the slot
+        self.claude = AsyncAnthropic(
+            api_key=os.getenv("CLAUDE_API_KEY"),
+            timeout=VISION_SDK_TIMEOUT,
+            max_retries=0
+        )
         self.model = "claude-3-opus-20240229"  
     
-    def process_image(self, image_data: bytes, prompt: str) -> Dict[str, Any]:
+    @classmethod
+    async def prepare_image(cls, image_data: bytes, config: PreprocessConfig = DEFAULT_CONFIG) -> PreprocessedImage:
+        """Validate, normalize and re-encode an upload off the event loop"""
+        prepared = await asyncio.to_thread(preprocess_image, image_data, config)
+        cls.preprocess_stats["images"] += 1
+        cls.preprocess_stats["original_bytes"] += prepared.original_bytes
+        cls.preprocess_stats["processed_bytes"] += len(prepared.data)
+        return prepared
+
+    @classmethod
+    async def prepare_worksheet(cls, image_data: bytes, rows: int, cols: int, config: PreprocessConfig = DEFAULT_CONFIG) -> List[PreprocessedImage]:
+        """Split a worksheet photo into grid cells and prepare each one, off the event loop"""
+        cells = await asyncio.to_thread(preprocess_worksheet, image_data, rows, cols, config)
+        cls.preprocess_stats["images"] += len(cells)
+        cls.preprocess_stats["original_bytes"] += len(image_data)
+        cls.preprocess_stats["processed_bytes"] += sum(len(cell.data) for cell in cells)
+        return cells
+
+    async def process_image(self, image_data: Union[bytes, PreprocessedImage], prompt: str) -> Dict[str, Any]:
         """
         Process an image using Claude Vision API
         
+        Raw bytes are run through prepare_image first; invalid uploads are
+        rejected with 413/415 before decoding. The call then waits for a
+        slot in the shared limiter. A full wait queue is rejected
+        immediately with 503, a slot wait longer than
+        VISION_QUEUE_TIMEOUT with 503, and a call longer than
+        VISION_CALL_TIMEOUT with 504. Upstream failures are not the
+        client's fault: a rate limit or overload is a 503, any other
+        Claude 5xx or connection error a 502.
+        
         Args:
-            image_data: Raw image bytes
+            image_data: Raw image bytes, or an image already run through prepare_image
             prompt: Instruction for Claude about how to process the image
             
         Returns:
-            Dict containing the response from Claude
+            Dict containing the response from Claude and a preprocessing report
+        """
+        if not isinstance(image_data, PreprocessedImage):
+            image_data = await self.prepare_image(image_data)
+
+        response = await self.process_images([image_data], prompt)
+        if response.get("success"):
+            response["preprocessing"] = image_data.report()
+        return response
+
+    async def process_images(self, images: List[PreprocessedImage], prompt: str, max_tokens: int = 1000) -> Dict[str, Any]:
+        """
+        Send several prepared images to Claude in one request
+
+        The images follow the prompt, each preceded by an "Image N:" label
+        when there is more than one. Takes one limiter slot for the whole
+        request, with the same 502/503/504 behaviour as process_image.
         """
-        # Convert image to base64 for API
         try:
-            # Ensure the image is properly formatted
-            image = Image.open(BytesIO(image_data))
-            
-            # Convert to JPEG if it's not already
-            if image.format != 'JPEG':
-                buffer = BytesIO()
-                image.convert('RGB').save(buffer, format='JPEG')
-                image_data = buffer.getvalue()
-            
-            # Create the message with the image
-            response = self.claude.messages.create(
+            async with self.limiter.slot(timeout=VISION_QUEUE_TIMEOUT):
+                try:
+                    return await asyncio.wait_for(self._call_claude(images, prompt, max_tokens), VISION_CALL_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raise HTTPException(status_code=504, detail="Vision request timed out")
+        except (QueueFullError, asyncio.TimeoutError):
+            raise HTTPException(status_code=503, detail="Vision service is busy, try again shortly", headers={"Retry-After": "2"})
+
+    async def _call_claude(self, images: List[PreprocessedImage], prompt: str, max_tokens: int = 1000) -> Dict[str, Any]:
+        """Send preprocessed images + prompt to Claude"""
+        content = [{"type": "text", "text": prompt}]
+        for number, image in enumerate(images, 1):
+            if len(images) > 1:
+                content.append({"type": "text", "text": f"Image {number}:"})
+            content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": image.media_type,
+                    "data": base64.b64encode(image.data).decode('utf-8')
+                }
+            })
+
+        try:
+            # Create the message with the image(s)
+            response = await self.claude.messages.create(
                 model=self.model,
-                max_tokens=1000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": base64.b64encode(image_data).decode('utf-8')
-                                }
-                            }
-                        ]
-                    }
-                ]
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": content}]
             )
             
             return {
@@ -69,6 +126,20 @@ class VisionService:
                 "model": response.model
             }
             
+        except anthropic.APITimeoutError:
+            raise HTTPException(status_code=504, detail="Vision request timed out")
+        except anthropic.APIStatusError as e:
+            if e.status_code == 429 or e.status_code == 529:
+                raise HTTPException(status_code=503, detail="Vision service is busy, try again shortly", headers={"Retry-After": "2"})
+            if e.status_code >= 500:
+                raise HTTPException(status_code=502, detail=f"Vision upstream error ({e.status_code})")
+            print(f"Error processing image: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        except anthropic.APIConnectionError as e:
+            raise HTTPException(status_code=502, detail=f"Vision upstream unreachable: {str(e)}")
         except Exception as e:
             print(f"Error processing image: {str(e)}")
             return {
@@ -76,7 +147,7 @@ class VisionService:
                 "error": str(e)
             }
     
-    def recognize_characters(self, image_data: bytes, language: str = "japanese") -> Dict[str, Any]:
+    async def recognize_characters(self, image_data: bytes, language: str = "japanese") -> Dict[str, Any]:
         """
         Recognize characters in an image for a specific language
         
@@ -104,7 +175,7 @@ class VisionService:
         Return only the JSON object, no other text.
         """
         
-        response = self.process_image(image_data, prompt)
+        response = await self.process_image(image_data, prompt)
         
         if not response["success"]:
             return response
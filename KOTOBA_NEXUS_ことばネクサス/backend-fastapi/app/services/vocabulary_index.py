@@ -0,0 +1,135 @@
+# app/services/vocabulary_index.py
+import heapq
+import unicodedata
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+# Fields searched, in tie-break priority order
+SEARCH_FIELDS = ("japanese", "romaji", "english")
+
+def normalize(text: Any) -> str:
+    """Fold width variants and case so that ｋａｋｕ, KAKU and kaku compare equal"""
+    if isinstance(text, (list, tuple)):
+        text = " ".join(str(part) for part in text)
+    return unicodedata.normalize("NFKC", str(text or "")).casefold()
+
+def bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+class VocabularyIndex:
+    """
+    Read-only lookup and search structure over one version of the vocabulary
+
+    Built once per (verbs, adjectives) dataset version. Holds an id -> word map,
+    the normalized search fields of each word, and inverted indexes from single
+    characters and character bigrams to word positions, so a substring query
+    only verifies the words that contain every bigram of the query.
+    """
+
+    def __init__(self, verbs: List[Dict[str, Any]], adjectives: List[Dict[str, Any]], version: str = ""):
+        self.version = version
+
+        # Copy each word so the shared CloudFront payload is never mutated
+        words = []
+        for word_type, items in (("verb", verbs), ("adjective", adjectives)):
+            for item in items:
+                words.append({**item, "word_type": word_type})
+        self._words: Tuple[Dict[str, Any], ...] = tuple(words)
+        # Every field any word has (what a projection may ask for)
+        self.field_names = frozenset(key for word in words for key in word)
+        # Verbs come first, then adjectives
+        verb_count = len(verbs)
+        self._ranges = {
+            None: (0, len(words)),
+            "verb": (0, verb_count),
+            "adjective": (verb_count, len(words)),
+        }
+
+        self._by_id: Dict[str, int] = {}
+        for position, word in enumerate(self._words):
+            if word.get("id") is not None:
+                self._by_id.setdefault(str(word["id"]), position)
+
+        self._fields: Tuple[Tuple[str, ...], ...] = tuple(
+            tuple(normalize(word.get(field, "")) for field in SEARCH_FIELDS)
+            for word in self._words
+        )
+
+        unigram_index: Dict[str, set] = {}
+        bigram_index: Dict[str, set] = {}
+        for position, fields in enumerate(self._fields):
+            for value in fields:
+                for char in value:
+                    unigram_index.setdefault(char, set()).add(position)
+                for gram in bigrams(value):
+                    bigram_index.setdefault(gram, set()).add(position)
+        self._unigrams = {key: frozenset(value) for key, value in unigram_index.items()}
+        self._bigrams = {key: frozenset(value) for key, value in bigram_index.items()}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def count(self, word_type: Optional[str] = None) -> int:
+        """Number of words of a type (all types when None)"""
+        start, stop = self._ranges[word_type]
+        return stop - start
+
+    def iter_words(self, word_type: Optional[str] = None, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily yield copies of words of a type in dataset order"""
+        start, stop = self._ranges[word_type]
+        start = min(start + offset, stop)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        for position in range(start, stop):
+            yield dict(self._words[position])
+
+    def get(self, word_id: str) -> Optional[Dict[str, Any]]:
+        """O(1) lookup by word id"""
+        position = self._by_id.get(str(word_id))
+        if position is None:
+            return None
+        return dict(self._words[position])
+
+    def _candidates(self, query: str) -> frozenset:
+        """Positions whose fields contain every character bigram of the query"""
+        if len(query) == 1:
+            return self._unigrams.get(query, frozenset())
+
+        postings = []
+        for gram in bigrams(query):
+            posting = self._bigrams.get(gram)
+            if not posting:
+                return frozenset()
+            postings.append(posting)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Ranked substring search over japanese/romaji/english
+
+        Exact field matches rank first, then prefix matches, then other
+        substring matches; ties go to the shorter field, then dataset order.
+
+        Returns:
+            (total number of matches, requested page of words)
+        """
+        query = normalize(query).strip()
+        if not query:
+            return 0, []
+
+        ranked = []
+        for position in self._candidates(query):
+            best = None
+            for field_rank, value in enumerate(self._fields[position]):
+                index = value.find(query)
+                if index < 0:
+                    continue
+                match_rank = 0 if value == query else 1 if index == 0 else 2
+                key = (match_rank, len(value), field_rank)
+                if best is None or key < best:
+                    best = key
+            if best is not None:
+                ranked.append((best, position))
+
+        page = heapq.nsmallest(offset + limit, ranked)[offset:]
+        return len(ranked), [dict(self._words[position]) for _, position in page]
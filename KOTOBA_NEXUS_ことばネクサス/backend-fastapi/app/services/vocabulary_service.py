@@ -1,14 +1,19 @@
 # app/services/vocabulary_service.py
+import asyncio
 import requests
 import json
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from fastapi import HTTPException
 from app.services.cloudfront_service import CloudFrontService
+from app.services.vocabulary_index import VocabularyIndex
 
 class VocabularyService:
     """Service to fetch Verbs & Adjectives"""
 
+    # Index over the most recently seen dataset versions
+    _index: Optional[VocabularyIndex] = None
+
     @staticmethod
     async def get_verbs():
         """Fetch verbs"""
@@ -23,8 +28,10 @@ class VocabularyService:
     @staticmethod
     async def get_all_words() -> Dict[str, List[Dict[str, Any]]]:
         """Fetch all vocabulary words from both files"""
-        verbs = await VocabularyService.get_verbs()
-        adjectives = await VocabularyService.get_adjectives()
+        verbs, adjectives = await asyncio.gather(
+            VocabularyService.get_verbs(),
+            VocabularyService.get_adjectives()
+        )
         
         return {
             "verbs": verbs,
@@ -32,49 +39,29 @@ class VocabularyService:
             "total_count": len(verbs) + len(adjectives)
         }
     
+    @staticmethod
+    async def get_index() -> VocabularyIndex:
+        """Return the search index for the current verbs/adjectives versions, rebuilding it when either changes"""
+        verbs, adjectives = await asyncio.gather(
+            CloudFrontService.fetch_entry("data_verb.json"),
+            CloudFrontService.fetch_entry("data_adjectives.json")
+        )
+        version = f"{verbs.version}-{adjectives.version}"
+
+        index = VocabularyService._index
+        if index is None or index.version != version:
+            index = VocabularyIndex(verbs.data, adjectives.data, version)
+            VocabularyService._index = index
+        return index
+
     @staticmethod
     async def get_word_by_id(word_id: str) -> Optional[Dict[str, Any]]:
         """Find a word by ID across all vocabulary types"""
-        # First check verbs
-        verbs = await VocabularyService.get_verbs()
-        for verb in verbs:
-            if verb.get('id') == word_id:
-                verb['word_type'] = 'verb'
-                return verb
-        
-        # Then check adjectives
-        adjectives = await VocabularyService.get_adjectives()
-        for adj in adjectives:
-            if adj.get('id') == word_id:
-                adj['word_type'] = 'adjective'
-                return adj
-        
-        # Word not found
-        return None
+        index = await VocabularyService.get_index()
+        return index.get(word_id)
     
     @staticmethod
-    async def search_words(query: str) -> List[Dict[str, Any]]:
-        """Search for words across all vocabulary types"""
-        results = []
-        
-        # Get all words
-        verbs = await VocabularyService.get_verbs()
-        adjectives = await VocabularyService.get_adjectives()
-        
-        # Search in verbs
-        for verb in verbs:
-            if (query.lower() in verb.get('japanese', '').lower() or
-                query.lower() in verb.get('english', '').lower() or
-                query.lower() in verb.get('romaji', '').lower()):
-                verb['word_type'] = 'verb'
-                results.append(verb)
-        
-        # Search in adjectives
-        for adj in adjectives:
-            if (query.lower() in adj.get('japanese', '').lower() or
-                query.lower() in adj.get('english', '').lower() or
-                query.lower() in adj.get('romaji', '').lower()):
-                adj['word_type'] = 'adjective'
-                results.append(adj)
-        
-        return results
\ No newline at end of file
+    async def search_words(query: str, limit: int = 50, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """Search for words across all vocabulary types, returning (total matches, ranked page)"""
+        index = await VocabularyService.get_index()
+        return index.search(query, limit=limit, offset=offset)
@@ -1,32 +1,254 @@
+import os
+import re
+import time
+import asyncio
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import httpx
+import orjson
 import yt_dlp
-from typing import Dict, Any
 from fastapi import HTTPException
+from app.services.subtitles import SubtitleParser, window_segments
+from app.utils.single_flight import SingleFlight
+
+# Default subtitle language and preferred track formats (first available wins)
+YOUTUBE_SUBTITLE_LANG = os.getenv("YOUTUBE_SUBTITLE_LANG", "ja")
+YOUTUBE_SUBTITLE_FORMATS = ("vtt", "srt")
+
+# Parsed transcriptions are cached on disk per (video id, language)
+YOUTUBE_CACHE_DIR = os.getenv("YOUTUBE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "kotoba-transcriptions"))
+YOUTUBE_CACHE_TTL = float(os.getenv("YOUTUBE_CACHE_TTL", 30 * 24 * 3600))
+YOUTUBE_MEMORY_CACHE_SIZE = int(os.getenv("YOUTUBE_MEMORY_CACHE_SIZE", 32))
+
+# Embedding windows (seconds of speech per window, shared with the next one)
+YOUTUBE_WINDOW_SECONDS = float(os.getenv("YOUTUBE_WINDOW_SECONDS", 30))
+YOUTUBE_WINDOW_OVERLAP = float(os.getenv("YOUTUBE_WINDOW_OVERLAP", 10))
+
+# Subtitle download limits
+YOUTUBE_FETCH_TIMEOUT = float(os.getenv("YOUTUBE_FETCH_TIMEOUT", 20))
+YOUTUBE_SUBTITLE_MAX_BYTES = int(os.getenv("YOUTUBE_SUBTITLE_MAX_BYTES", 5 * 1024 * 1024))
+
+VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# BCP 47-style subtitle language ("ja", "en-US", "ja-orig"); also part of cache file names
+LANGUAGE_TAG = re.compile(r"^[A-Za-z]{2,3}(-[A-Za-z0-9]+)*$")
+
+# Languages written without spaces between words
+UNSPACED_LANGUAGES = ("ja", "zh")
+
+def video_id_from_url(video_url: str) -> Optional[str]:
+    """The 11-character video id of a watch, youtu.be, shorts, embed or live URL (or a bare id)"""
+    value = video_url.strip()
+    if VIDEO_ID.match(value):
+        return value
+    parsed = urlparse(value if "//" in value else f"https://{value}")
+    host = (parsed.hostname or "").lower()
+    candidate = None
+    if host == "youtu.be":
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host.endswith("youtube.com") or host.endswith("youtube-nocookie.com"):
+        if parsed.path == "/watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        else:
+            parts = parsed.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                candidate = parts[1]
+    return candidate if candidate and VIDEO_ID.match(candidate) else None
+
+def check_language(lang: str) -> str:
+    """The language tag, or 400 if it is not one"""
+    if not LANGUAGE_TAG.match(lang or ""):
+        raise HTTPException(status_code=400, detail="lang must be a language tag such as ja or en-US")
+    return lang
+
+def select_track(info: Dict[str, Any], lang: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Pick the subtitle track for `lang` from yt-dlp metadata
+
+    Uploaded subtitles win over automatic captions. For automatic captions
+    the original-language track ("ja-orig") beats machine translations.
+    Returns ("manual" | "automatic", track) or None.
+    """
+    sources = (
+        ("manual", info.get("subtitles") or {}, (lang,)),
+        ("automatic", info.get("automatic_captions") or {}, (f"{lang}-orig", lang)),
+    )
+    for source, tracks, keys in sources:
+        candidates = [key for key in keys if key in tracks]
+        # Regional variants such as "ja-JP" or "en-US"
+        candidates += [key for key in tracks if key.split("-")[0] == lang and key not in candidates]
+        for key in candidates:
+            by_format = {track.get("ext"): track for track in tracks[key] if track.get("url")}
+            for ext in YOUTUBE_SUBTITLE_FORMATS:
+                if ext in by_format:
+                    return source, by_format[ext]
+    return None
 
 class YouTubeTranscriptionService:
-    """Fetch transcriptions from YouTube videos using yt-dlp"""
+    """
+    Fetch transcriptions from YouTube videos using yt-dlp
+
+    get_transcription() resolves the subtitle track with yt-dlp (in a worker
+    thread, it blocks on network I/O), streams the track once and parses it
+    as it arrives into timestamped segments, then merges the segments into
+    overlapping windows ready for embedding. The result is cached per
+    (video id, language) on disk and in a small memory LRU, so repeat
+    requests never touch YouTube; concurrent requests for the same video
+    share one fetch.
+    """
+
+    stats = {
+        "memory_hits": 0,
+        "disk_hits": 0,
+        "fetches": 0,
+        "errors": 0,
+    }
+
+    def __init__(self, cache_dir: Optional[str] = YOUTUBE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._memory: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._flight = SingleFlight()
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=YOUTUBE_FETCH_TIMEOUT, follow_redirects=True)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     @staticmethod
-    def get_video_transcription(video_url: str, lang: str = "en") -> Dict[str, Any]:
-        """Fetch transcription text from a YouTube video using yt-dlp."""
+    def extract_info(video_url: str) -> Dict[str, Any]:
+        """yt-dlp metadata (subtitle track URLs included); blocking"""
         ydl_opts = {
             "quiet": True,
+            "no_warnings": True,
             "skip_download": True,
-            "writesubtitles": True,
-            "writeautomaticsub": True,
-            "subtitleslangs": [lang],  
-            "subtitlesformat": "srt",  
+            "noplaylist": True,
         }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(video_url, download=False)
 
+    @classmethod
+    def get_video_transcription(cls, video_url: str, lang: str = YOUTUBE_SUBTITLE_LANG) -> Dict[str, Any]:
+        """Resolve the subtitle track URL of a YouTube video (blocking)"""
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=False)
-                subtitles = info.get("subtitles", {}) or info.get("automatic_captions", {})
+            info = cls.extract_info(video_url)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to fetch transcription: {str(e)}")
+        selected = select_track(info, lang)
+        if selected is None:
+            raise HTTPException(status_code=404, detail=f"No subtitles found for language: {lang}")
+        source, track = selected
+        return {"video_url": video_url, "subtitle_url": track["url"], "format": track.get("ext"), "source": source}
+
+    async def get_transcription(self, video_url: str, lang: str = YOUTUBE_SUBTITLE_LANG) -> Dict[str, Any]:
+        """Timestamped segments and embedding windows for a video's subtitles"""
+        video_id = video_id_from_url(video_url)
+        if video_id is None:
+            raise HTTPException(status_code=400, detail="Not a YouTube video URL")
+        key = (video_id, check_language(lang))
 
-                if lang not in subtitles:
-                    raise HTTPException(status_code=404, detail=f"No subtitles found for language: {lang}")
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return {**cached, "cached": True}
 
-                subtitle_url = subtitles[lang][0]["url"]
-                return {"video_url": video_url, "subtitle_url": subtitle_url}
+        cached = await asyncio.to_thread(self._read_cache, key)
+        if cached is not None:
+            self.stats["disk_hits"] += 1
+            self._remember(key, cached)
+            return {**cached, "cached": True}
 
+        transcription = await self._flight.do(key, lambda: self._fetch(video_id, lang))
+        return {**transcription, "cached": False}
+
+    async def _fetch(self, video_id: str, lang: str) -> Dict[str, Any]:
+        self.stats["fetches"] += 1
+        try:
+            info = await asyncio.to_thread(self.extract_info, f"https://www.youtube.com/watch?v={video_id}")
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to fetch transcription: {str(e)}")
+            self.stats["errors"] += 1
+            raise HTTPException(status_code=502, detail=f"Failed to fetch video info: {str(e)}")
+
+        selected = select_track(info, lang)
+        if selected is None:
+            raise HTTPException(status_code=404, detail=f"No subtitles found for language: {lang}")
+        source, track = selected
+
+        segments = await self._fetch_segments(track["url"])
+        separator = "" if lang.split("-")[0] in UNSPACED_LANGUAGES else " "
+        transcription = {
+            "video_id": video_id,
+            "title": info.get("title"),
+            "duration": info.get("duration"),
+            "language": lang,
+            "source": source,
+            "format": track.get("ext"),
+            "segments": [segment.to_dict() for segment in segments],
+            "windows": window_segments(segments, YOUTUBE_WINDOW_SECONDS, YOUTUBE_WINDOW_OVERLAP, separator),
+            "text": separator.join(segment.text for segment in segments),
+            "fetched_at": time.time(),
+        }
+        self._remember((video_id, lang), transcription)
+        await asyncio.to_thread(self._write_cache, (video_id, lang), transcription)
+        return transcription
+
+    async def _fetch_segments(self, subtitle_url: str) -> List[Any]:
+        """Download the track once, parsing cues as the chunks arrive"""
+        parser = SubtitleParser()
+        segments = []
+        received = 0
+        try:
+            async with self.get_client().stream("GET", subtitle_url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_text():
+                    received += len(chunk)
+                    if received > YOUTUBE_SUBTITLE_MAX_BYTES:
+                        raise HTTPException(status_code=502, detail="Subtitle track is too large")
+                    segments.extend(parser.feed(chunk))
+        except httpx.HTTPError as e:
+            self.stats["errors"] += 1
+            raise HTTPException(status_code=502, detail=f"Failed to download subtitles: {str(e)}")
+        segments.extend(parser.close())
+        return segments
+
+    def _remember(self, key: Tuple[str, str], transcription: Dict[str, Any]):
+        self._memory[key] = transcription
+        self._memory.move_to_end(key)
+        while len(self._memory) > YOUTUBE_MEMORY_CACHE_SIZE:
+            self._memory.popitem(last=False)
+
+    def _cache_path(self, key: Tuple[str, str]) -> str:
+        video_id, lang = key
+        return os.path.join(self.cache_dir, f"{video_id}.{lang}.json")
+
+    def _read_cache(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        path = self._cache_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > YOUTUBE_CACHE_TTL:
+                return None
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def _write_cache(self, key: Tuple[str, str], transcription: Dict[str, Any]):
+        """Write atomically so a concurrent reader never sees a partial file"""
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(transcription))
+            os.replace(tmp_path, self._cache_path(key))
+        except OSError as e:
+            print(f"Error caching transcription {key}: {str(e)}")
@@ -0,0 +1,6 @@
+from .single_flight import SingleFlight
+from .pagination import encode_cursor, decode_cursor, parse_fields, project, ndjson_stream
+from .responses import ORJSONResponse, SSE_HEADERS, sse_event
+from .concurrency import BoundedLimiter, QueueFullError, cancel_on_disconnect, iterate_in_thread
+from .retry import retry_call
+from .partial_json import PartialJSONFields
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+from fastapi import HTTPException, Request
+
+class QueueFullError(Exception):
+    """Raised when a BoundedLimiter's wait queue is already full"""
+
+class BoundedLimiter:
+    """
+    Concurrency limit with a bounded wait queue
+
+    At most `max_concurrency` callers hold a slot at once and at most
+    `max_queue` more may wait for one. Further callers are rejected at once
+    with QueueFullError instead of piling up behind slow upstream calls.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "rejected": 0, "timeouts": 0}
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Hold one slot for the duration of the block, waiting at most `timeout` seconds"""
+        if not self._semaphore.locked():
+            # Free slot: acquire() returns without suspending
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"{self.waiting} requests already waiting")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def limiter_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any], poll_interval: float = 0.25) -> Any:
+    """
+    Await `awaitable`, cancelling it if the client disconnects first
+
+    Cancellation propagates into the awaited upstream call, freeing its
+    connection and any limiter slot it holds.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def iterate_in_thread(
+    open_iterable: Callable[[], Iterable[Any]],
+    executor: Optional[Executor] = None
+) -> AsyncIterator[Any]:
+    """
+    Run a blocking iterator (e.g. a botocore event stream) in a worker thread, yielding its items here
+
+    open_iterable() is called in the thread too, since opening the stream
+    is a blocking request. Items are handed to the event loop as soon as
+    they arrive. When the consumer stops early (client disconnect), the
+    thread stops after the item it is waiting for and closes the iterable.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def hand_over(item: Any, error: Optional[BaseException] = None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            # Event loop already closed
+            stop.set()
+
+    def pump():
+        iterable = None
+        try:
+            iterable = open_iterable()
+            for item in iterable:
+                if stop.is_set():
+                    break
+                hand_over(item)
+            hand_over(finished)
+        except BaseException as e:
+            hand_over(finished, e)
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    loop.run_in_executor(executor, pump)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
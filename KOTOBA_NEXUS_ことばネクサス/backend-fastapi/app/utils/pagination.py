@@ -0,0 +1,57 @@
+import base64
+import json
+from typing import AbstractSet, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import orjson
+from fastapi import HTTPException
+
+# Rows serialized per chunk when streaming NDJSON
+NDJSON_CHUNK_ROWS = 256
+
+def encode_cursor(offset: int, version: str) -> str:
+    """Opaque cursor pointing at a position in one dataset version"""
+    raw = json.dumps({"o": offset, "v": version}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str], version: str, total: Optional[int] = None) -> int:
+    """Return the offset a cursor points at; 400 if malformed, out of range or from another dataset version"""
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        offset, cursor_version = int(data["o"]), data["v"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0 or (total is not None and offset > total):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_version != version:
+        raise HTTPException(status_code=400, detail="Dataset changed since this cursor was issued; restart pagination")
+    return offset
+
+def parse_fields(fields: Optional[str], known: Optional[AbstractSet[str]] = None) -> Optional[Tuple[str, ...]]:
+    """Parse a projection such as "id,japanese,english"; 400 for names not in `known`"""
+    if not fields:
+        return None
+    names = tuple(name.strip() for name in fields.split(",") if name.strip())
+    if known is not None:
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names or None
+
+def project(row: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """Keep only the requested fields of a row"""
+    if fields is None:
+        return row
+    return {name: row[name] for name in fields if name in row}
+
+def ndjson_stream(rows: Iterable[Dict[str, Any]], fields: Optional[Tuple[str, ...]] = None) -> Iterator[bytes]:
+    """Serialize rows as newline-delimited JSON, yielding a chunk every NDJSON_CHUNK_ROWS rows"""
+    chunk: List[bytes] = []
+    for row in rows:
+        chunk.append(orjson.dumps(project(row, fields)))
+        if len(chunk) >= NDJSON_CHUNK_ROWS:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
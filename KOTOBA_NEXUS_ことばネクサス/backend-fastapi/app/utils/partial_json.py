@@ -0,0 +1,134 @@
+import json
+from typing import Any, Dict, List, Optional
+
+class PartialJSONFields:
+    """
+    Report the top-level fields of a streamed JSON object as each one completes
+
+    feed() takes the next piece of model output and returns the values that
+    completed within it: {"field": name, "value": value} for a top-level
+    field, and {"field": name, "index": i, "value": value} for each item of
+    a top-level array, before the array itself closes. Text before the
+    opening brace (a preamble or a ```json fence) and after the closing
+    brace is ignored. Each character is scanned once.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect = "key"
+        self._key: Optional[str] = None
+        # Start index and kind ("string", "container", "primitive") of the open field / array item
+        self._field: Optional[tuple] = None
+        self._item: Optional[tuple] = None
+        self._item_index = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        events: List[Dict[str, Any]] = []
+        self._text += text
+        while self._pos < len(self._text) and not self.done:
+            i = self._pos
+            c = self._text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_closed(i, events)
+                continue
+
+            if not self._stack:
+                if c == "{":
+                    self._stack.append(c)
+                continue
+
+            if c == '"':
+                self._begin(i, "string")
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._begin(i, "container")
+                self._stack.append(c)
+            elif c in "}]":
+                self._end_primitive(i, events)
+                self._stack.pop()
+                self._container_closed(i, events)
+                if not self._stack:
+                    self.done = True
+            elif c == ":":
+                if len(self._stack) == 1:
+                    self._expect = "value"
+            elif c == ",":
+                self._end_primitive(i, events)
+                if len(self._stack) == 1:
+                    self._expect = "key"
+            elif not c.isspace():
+                self._begin(i, "primitive")
+        return events
+
+    def _in_top_array(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == "["
+
+    def _begin(self, i: int, kind: str):
+        if len(self._stack) == 1 and self._expect == "value" and self._field is None:
+            self._field = (i, kind)
+            self._item_index = 0
+        elif self._in_top_array() and self._item is None:
+            self._item = (i, kind)
+
+    def _emit_field(self, end: int, events: List[Dict[str, Any]]):
+        start, _ = self._field
+        self._field = None
+        value = self._load(self._text[start:end])
+        if value is not _INVALID and self._key is not None:
+            self.fields[self._key] = value
+            events.append({"field": self._key, "value": value})
+
+    def _emit_item(self, end: int, events: List[Dict[str, Any]]):
+        start, _ = self._item
+        self._item = None
+        value = self._load(self._text[start:end])
+        if value is not _INVALID and self._key is not None:
+            events.append({"field": self._key, "index": self._item_index, "value": value})
+        self._item_index += 1
+
+    def _string_closed(self, i: int, events: List[Dict[str, Any]]):
+        if len(self._stack) == 1:
+            if self._expect == "key":
+                self._key = self._load(self._text[self._string_start:i + 1])
+            elif self._field is not None and self._field[1] == "string":
+                self._emit_field(i + 1, events)
+        elif self._in_top_array() and self._item is not None and self._item[1] == "string":
+            self._emit_item(i + 1, events)
+
+    def _container_closed(self, i: int, events: List[Dict[str, Any]]):
+        if len(self._stack) == 1 and self._field is not None and self._field[1] == "container":
+            self._emit_field(i + 1, events)
+        elif self._in_top_array() and self._item is not None and self._item[1] == "container":
+            self._emit_item(i + 1, events)
+
+    def _end_primitive(self, i: int, events: List[Dict[str, Any]]):
+        """A number, true, false or null ends at the next comma or closing bracket"""
+        if len(self._stack) == 1 and self._field is not None and self._field[1] == "primitive":
+            self._emit_field(i, events)
+        elif self._in_top_array() and self._item is not None and self._item[1] == "primitive":
+            self._emit_item(i, events)
+
+    @staticmethod
+    def _load(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return _INVALID
+
+_INVALID = object()
@@ -0,0 +1,167 @@
+import os
+import gzip
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from app.utils.single_flight import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Compression is done once per dataset version, so favour ratio over speed
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 9))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 9))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (several times faster than the stdlib encoder)"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+# Server-Sent Events: no caching, and no buffering by nginx or other proxies
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One Server-Sent Event with a JSON payload (orjson never emits raw newlines)"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@dataclass
+class EncodedBody:
+    """One serialized response body with its precompressed variants"""
+    version: str
+    etag: str
+    identity: bytes
+    gzip: bytes
+    br: Optional[bytes]
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of If-None-Match against our ETag, ignoring encoding suffixes"""
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"')
+        if candidate.split("-", 1)[0] == base:
+            return True
+    return False
+
+class VersionedResponseCache:
+    """
+    Serialized, precompressed JSON bodies for read-only catalog endpoints
+
+    Bodies are keyed by request path + query string and tagged with the version
+    of the dataset they were built from. A body is serialized, hashed into a
+    strong ETag and compressed (gzip, and brotli when installed) once per
+    version; requests then cost a dictionary lookup, and clients sending a
+    matching If-None-Match get an empty 304.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[str, EncodedBody]" = OrderedDict()
+        self._flight = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    @staticmethod
+    def _encode(version: str, content: Any) -> EncodedBody:
+        identity = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return EncodedBody(
+            version=version,
+            etag=f'"{hashlib.sha256(identity).hexdigest()[:32]}"',
+            identity=identity,
+            gzip=gzip.compress(identity, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0),
+            br=brotli.compress(identity, quality=RESPONSE_BROTLI_QUALITY) if brotli else None,
+        )
+
+    async def _get_body(self, key: str, version: str, build: Callable[[], Any]) -> EncodedBody:
+        body = self._bodies.get(key)
+        if body is not None and body.version == version:
+            self.stats["hits"] += 1
+            self._bodies.move_to_end(key)
+            return body
+
+        self.stats["misses"] += 1
+
+        async def encode():
+            # Serialization and compression run off the event loop
+            encoded = await asyncio.to_thread(lambda: self._encode(version, build()))
+            self._bodies[key] = encoded
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+            return encoded
+
+        return await self._flight.do((key, version), encode)
+
+    async def respond(self, request: Request, version: str, build: Callable[[], Any]) -> Response:
+        """
+        Return the response for this request and dataset version
+
+        Args:
+            request: Incoming request (path, query, If-None-Match, Accept-Encoding)
+            version: Version of the data the body is built from
+            build: Callable returning the JSON-serializable content; only
+                   invoked when no body is cached for this version
+        """
+        key = request.url.path + "?" + str(request.url.query)
+        body = await self._get_body(key, version, build)
+
+        headers = {"ETag": body.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        if body.br is not None and accepted.get("br", 0) > 0:
+            headers["Content-Encoding"] = "br"
+            headers["ETag"] = body.etag[:-1] + '-br"'
+            content = body.br
+        elif accepted.get("gzip", 0) > 0:
+            headers["Content-Encoding"] = "gzip"
+            headers["ETag"] = body.etag[:-1] + '-gzip"'
+            content = body.gzip
+        else:
+            content = body.identity
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, body.etag):
+            self.stats["not_modified"] += 1
+            # Same ETag the 200 would carry for this encoding; no body or Content-Encoding
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=content, media_type="application/json", headers=headers)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self._bodies),
+            "bytes": sum(len(b.identity) + len(b.gzip) + len(b.br or b"") for b in self._bodies.values()),
+        }
+
+# Shared by the vocabulary and kana_practice routers
+catalog_responses = VersionedResponseCache()
@@ -0,0 +1,24 @@
+import time
+import random
+from typing import Any, Callable, Tuple, Type
+
+def retry_call(
+    fn: Callable[[], Any],
+    attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+) -> Any:
+    """
+    Call fn(), retrying failures with exponential backoff and full jitter
+
+    Blocking; from async code run it via asyncio.to_thread. The last
+    exception is re-raised once `attempts` calls have failed.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
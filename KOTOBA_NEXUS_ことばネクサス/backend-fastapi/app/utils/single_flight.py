@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task
+
+    The first caller for a key starts the work; every caller that arrives while
+    it is running awaits the same task and gets the same result or exception.
+    The work runs as its own task, so a cancelled waiter does not cancel it for
+    the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.shared = 0
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Return the in-flight task for key, starting fn() if there is none"""
+        task = self._tasks.get(key)
+        if task is not None:
+            self.shared += 1
+            return task
+
+        task = asyncio.ensure_future(fn())
+        self._tasks[key] = task
+        self.started += 1
+
+        def done(finished: asyncio.Task):
+            if self._tasks.get(key) is finished:
+                del self._tasks[key]
+            # Mark the exception as retrieved when nobody is awaiting (background work)
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(done)
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() once per key at a time and share its outcome with all callers"""
+        return await asyncio.shield(self.start(key, fn))
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def cancel_all(self):
+        """Cancel every in-flight task (used at shutdown)"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
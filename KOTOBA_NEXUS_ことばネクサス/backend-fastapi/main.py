@@ -1,11 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
 # Import routers
 from app.routers import vocabulary_router, kana_practice_router, study_progress_router, listening_router
+from app.services.cloudfront_service import CloudFrontService
+from app.services.vision_service import VisionService
+from app.services.kana_service import KanaService
+from app.services.vector_store_service import VectorStoreService
+from app.services.youtube_transcription_service import YouTubeTranscriptionService
+from app.services.ingestion import IngestionQueue
+from app.services.question_generation_service import QuestionGenerationService
+from app.services.question_bank import QuestionBank
+from app.services.question_cache import SemanticQuestionCache
+from app.services.tts_service import TTSService
+from app.services.audio_cache import AudioStore
+from app.services.review_buffer import ReviewWriteBuffer
+from app.utils.responses import catalog_responses
+from app.dependencies import registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients and build services at startup; close them at shutdown"""
+    await CloudFrontService.startup()
+    await registry.startup()
+    yield
+    await registry.shutdown()
+    await CloudFrontService.shutdown()
+
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -17,10 +43,10 @@ app.add_middleware(
 )
 
 # Include routers
-app.include_router(vocabulary_router.router)
-app.include_router(kana_practice.router)
-app.include_router(study_progress.router)
-app.include_router(listening.router)
+app.include_router(vocabulary_router)
+app.include_router(kana_practice_router)
+app.include_router(study_progress_router)
+app.include_router(listening_router)
 
 # Root endpoint
 @app.get("/")
@@ -30,6 +56,35 @@ async def root():
         "status": "online"
     }
 
+# Readiness: every service built (a failed warmup is reported but not fatal)
+@app.get("/ready")
+async def ready():
+    readiness = registry.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+# Cache and pool metrics
+@app.get("/metrics")
+async def metrics():
+    return {
+        "cloudfront_cache": CloudFrontService.cache_stats(),
+        "response_cache": catalog_responses.cache_stats(),
+        "vision": VisionService.limiter.limiter_stats(),
+        "image_preprocessing": VisionService.preprocess_stats,
+        "kana_evaluation_cache": KanaService.evaluation_cache.cache_stats(),
+        "kana_recognizer": KanaService.recognizer_stats,
+        "kana_evaluation": KanaService.batch_stats,
+        "kana_s3_evaluation": KanaService.s3_stats,
+        "embedding_cache": VectorStoreService.embedding_cache.cache_stats(),
+        "youtube_transcription": YouTubeTranscriptionService.stats,
+        "ingestion": IngestionQueue.stats,
+        "question_generation": QuestionGenerationService.stream_stats(),
+        "question_bank": QuestionBank.stats,
+        "question_cache": SemanticQuestionCache.cache_stats(),
+        "tts": TTSService.stats,
+        "audio_store": AudioStore.stats,
+        "review_buffer": ReviewWriteBuffer.stats
+    }
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
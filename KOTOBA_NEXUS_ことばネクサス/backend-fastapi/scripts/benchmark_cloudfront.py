@@ -0,0 +1,97 @@
+"""
+Benchmark: concurrent CloudFrontService.fetch_json calls against a slow local origin.
+
+Starts a threaded HTTP server that answers /seed/*.json after a fixed delay, then
+compares the previous blocking `requests.get` implementation with the pooled
+async client. With the blocking client the event loop serializes every request
+(total ~= N * latency); with the async client total ~= latency.
+
+Usage:
+    python scripts/benchmark_cloudfront.py [--requests 50] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAYLOAD = json.dumps([{"id": str(i), "japanese": "食べる", "english": "to eat"} for i in range(200)]).encode()
+
+
+def start_origin(latency: float) -> ThreadingHTTPServer:
+    """Serve PAYLOAD for any path after `latency` seconds"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def max_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Measure the worst delay the event loop adds to a periodic tick"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(label: str, fetch, n: int):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(max_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(fetch("data_verb.json") for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await ticker
+    print(f"{label:<22} {n} requests in {elapsed:6.2f}s   max event-loop lag {lag * 1000:8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = start_origin(args.latency)
+    os.environ["CLOUDFRONT_URL"] = f"http://127.0.0.1:{server.server_port}"
+
+    import requests
+    from app.services.cloudfront_service import CloudFrontService
+
+    async def blocking_fetch(filename: str):
+        # Previous implementation: synchronous requests.get inside an async def
+        response = requests.get(f"{os.environ['CLOUDFRONT_URL']}/seed/{filename}")
+        response.raise_for_status()
+        return response.json()
+
+    await CloudFrontService.startup()
+    try:
+        await run("blocking requests.get", blocking_fetch, args.requests)
+        await run("pooled httpx client", CloudFrontService.fetch_json, args.requests)
+    finally:
+        await CloudFrontService.shutdown()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Throughput/latency benchmark for the background ingestion queue.
+
+Simulates the embedding API and the vector backend with fixed per-request
+latencies (blocking sleeps, like the real SDK calls) and ingests several
+text jobs at once for a range of embed pool sizes. While ingestion runs, an
+event-loop probe measures how late a 10 ms timer fires: that lateness is
+what every concurrent HTTP request would pay.
+
+Usage:
+    python scripts/benchmark_ingestion.py [--jobs 4] [--texts 640] [--embed-ms 80] [--upsert-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CLOUDFRONT_URL", "http://localhost")
+
+from app.services.ingestion import IngestionQueue
+from app.services.vector_index import LocalVectorIndex
+from app.services.vector_store_service import VectorStoreService
+
+
+class SlowEmbeddings:
+    def __init__(self, seconds: float, dim: int):
+        self.seconds = seconds
+        self.dim = dim
+
+    def create(self, model, input):
+        time.sleep(self.seconds)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=np.random.rand(self.dim).tolist()) for _ in input])
+
+
+class SlowIndex(LocalVectorIndex):
+    def __init__(self, dim: int, seconds: float):
+        super().__init__(dim, mode="exact")
+        self.seconds = seconds
+
+    def upsert(self, vectors):
+        time.sleep(self.seconds)
+        super().upsert(vectors)
+
+
+def make_store(args) -> VectorStoreService:
+    store = VectorStoreService.__new__(VectorStoreService)
+    store.embedding_model = "benchmark"
+    store.backend = SlowIndex(args.dim, args.upsert_ms / 1000)
+    store.claude = SimpleNamespace(embeddings=SlowEmbeddings(args.embed_ms / 1000, args.dim))
+    return store
+
+
+async def probe(lateness: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lateness.append((time.perf_counter() - start - 0.01) * 1000)
+
+
+async def run(args, embed_workers: int):
+    queue = IngestionQueue(
+        None, make_store(args),
+        max_jobs=args.jobs, embed_workers=embed_workers, upsert_workers=max(1, embed_workers // 2),
+        batch_size=args.batch
+    )
+    stop, lateness = asyncio.Event(), []
+    probe_task = asyncio.create_task(probe(lateness, stop))
+
+    start = time.perf_counter()
+    jobs = [
+        await queue.submit_texts([f"job {job} line {i}" for i in range(args.texts)])
+        for job in range(args.jobs)
+    ]
+    for job in jobs:
+        while (await queue.get(job["job_id"]))["status"] in ("queued", "running"):
+            await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    await queue.shutdown()
+    return args.jobs * args.texts / elapsed, np.percentile(lateness, 50), np.percentile(lateness, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--texts", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embed-ms", type=float, default=80)
+    parser.add_argument("--upsert-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.jobs} jobs x {args.texts} texts, {args.embed_ms:.0f} ms per embedding request, {args.upsert_ms:.0f} ms per upsert")
+    print(f"{'embed workers':<16}{'texts/s':>10}{'loop lag p50 ms':>18}{'p99 ms':>10}")
+    for workers in (1, 2, 4, 8):
+        throughput, p50, p99 = asyncio.run(run(args, workers))
+        print(f"{workers:<16}{throughput:>10.0f}{p50:>18.2f}{p99:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
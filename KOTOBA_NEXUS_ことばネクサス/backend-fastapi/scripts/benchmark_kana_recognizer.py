@@ -0,0 +1,116 @@
+"""
+Accuracy/latency benchmark for the local KanaRecognizer.
+
+Samples come from a labelled directory (--samples DIR, files named
+"<kana>_<anything>.png|jpg", e.g. "あ_012.png") or, by default, are
+synthesized: every kana is rendered and then distorted (rotation, shear,
+scaling, offset, stroke weight, noise) to imitate handwriting. Each sample
+goes through the same preprocessing as uploads before recognition.
+
+Reports overall accuracy, how many samples would be answered locally
+(confident) vs escalated to Claude, accuracy on the locally answered ones,
+and recognition latency percentiles.
+
+Usage:
+    python scripts/benchmark_kana_recognizer.py
+    python scripts/benchmark_kana_recognizer.py --font /path/font.ttc --samples ./labelled --expected
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.image_preprocessing import preprocess_image
+from app.services.kana_recognizer import KanaRecognizer, load_fonts, render_glyph, KANA_FONT_PATHS
+from scripts.benchmark_kana_search import build_table
+from app.services.kana_index import iter_kana
+
+
+def distort(image: Image.Image, rng: random.Random) -> Image.Image:
+    """Imitate handwriting variation on a rendered glyph"""
+    width, height = image.size
+    shear = rng.uniform(-0.15, 0.15)
+    scale = rng.uniform(0.85, 1.15)
+    image = image.transform(
+        (width, height), Image.AFFINE,
+        (1 / scale, shear, rng.uniform(-8, 8), 0, 1 / scale, rng.uniform(-8, 8)),
+        resample=Image.BILINEAR, fillcolor=255
+    )
+    image = image.rotate(rng.uniform(-8, 8), resample=Image.BILINEAR, fillcolor=255)
+    stroke = rng.choice([0, 1, 2])
+    if stroke:
+        image = image.filter(ImageFilter.MinFilter(2 * stroke + 1))
+    noise = np.asarray(image, dtype=np.int16) + np.random.default_rng(rng.randrange(2 ** 32)).integers(-25, 25, (height, width))
+    return Image.fromarray(np.clip(noise, 0, 255).astype(np.uint8)).resize((width * 3, height * 3))
+
+
+def synthetic_samples(items, fonts, per_kana: int, seed: int):
+    rng = random.Random(seed)
+    for item in items:
+        for _ in range(per_kana):
+            font = rng.choice(fonts)
+            yield item["character"], distort(render_glyph(item["character"], font), rng)
+
+
+def directory_samples(path: str):
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg")):
+            yield name.split("_", 1)[0], Image.open(os.path.join(path, name))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--font", action="append", help="Font(s) with kana glyphs (defaults to KANA_FONT_PATHS)")
+    parser.add_argument("--samples", help="Directory of labelled images")
+    parser.add_argument("--per-kana", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--expected", action="store_true", help="Pass the label as expected_kana")
+    args = parser.parse_args()
+
+    fonts = load_fonts(args.font or KANA_FONT_PATHS)
+    if not fonts:
+        sys.exit("No font with kana glyphs found; pass --font")
+
+    items = [{"character": k["character"], "romaji": k["romaji"], "script": s} for s, k in iter_kana(build_table())]
+    start = time.perf_counter()
+    recognizer = KanaRecognizer(items, fonts)
+    print(f"{len(recognizer)} kana templates built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    samples = directory_samples(args.samples) if args.samples else synthetic_samples(items, fonts, args.per_kana, args.seed)
+
+    total = correct = confident = confident_correct = 0
+    latencies = []
+    for label, image in samples:
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, format="PNG")
+        prepared = preprocess_image(buffer.getvalue())
+
+        start = time.perf_counter()
+        result = recognizer.evaluate(prepared.image, label if args.expected else None)
+        latencies.append(time.perf_counter() - start)
+
+        total += 1
+        hit = result.get("character") == label
+        correct += hit
+        if result.get("confident"):
+            confident += 1
+            confident_correct += hit
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"samples               {total}")
+    print(f"top-1 accuracy        {correct / total:.1%}")
+    print(f"answered locally      {confident / total:.1%}  (rest escalate to Claude)")
+    if confident:
+        print(f"accuracy when local   {confident_correct / confident:.1%}")
+    print(f"latency p50/p95/max   {np.percentile(latencies_ms, 50):.2f} / {np.percentile(latencies_ms, 95):.2f} / {latencies_ms.max():.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: KanaIndex.search vs the previous linear scan in KanaService.search_kana.
+
+Builds a hiragana/katakana table (basic, dakuten and yoon kana) in the
+kana-data.json shape and times a mix of romaji and kana queries.
+
+Usage:
+    python scripts/benchmark_kana_search.py [--iterations 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.kana_index import KanaIndex, iter_kana
+
+HIRAGANA = (
+    "あ a,い i,う u,え e,お o,か ka,き ki,く ku,け ke,こ ko,さ sa,し shi,す su,せ se,そ so,"
+    "た ta,ち chi,つ tsu,て te,と to,な na,に ni,ぬ nu,ね ne,の no,は ha,ひ hi,ふ fu,へ he,ほ ho,"
+    "ま ma,み mi,む mu,め me,も mo,や ya,ゆ yu,よ yo,ら ra,り ri,る ru,れ re,ろ ro,わ wa,を wo,ん n,"
+    "が ga,ぎ gi,ぐ gu,げ ge,ご go,ざ za,じ ji,ず zu,ぜ ze,ぞ zo,だ da,で de,ど do,"
+    "ば ba,び bi,ぶ bu,べ be,ぼ bo,ぱ pa,ぴ pi,ぷ pu,ぺ pe,ぽ po,"
+    "きゃ kya,きゅ kyu,きょ kyo,しゃ sha,しゅ shu,しょ sho,ちゃ cha,ちゅ chu,ちょ cho,"
+    "にゃ nya,にゅ nyu,にょ nyo,ひゃ hya,ひゅ hyu,ひょ hyo,みゃ mya,みゅ myu,みょ myo,"
+    "りゃ rya,りゅ ryu,りょ ryo,じゃ ja,じゅ ju,じょ jo"
+)
+
+QUERIES = ["a", "shi", "si", "tsu", "tu", "ky", "jo", "zyo", "か", "カ", "ｶ", "しゃ", "ﾁｬ", "x"]
+
+
+def build_table():
+    hiragana = []
+    for pair in HIRAGANA.split(","):
+        character, romaji = pair.split()
+        hiragana.append({"character": character, "romaji": romaji})
+    katakana = [
+        {"character": "".join(chr(ord(c) + 0x60) for c in item["character"]), "romaji": item["romaji"]}
+        for item in hiragana
+    ]
+    return [{"hiragana": hiragana}, {"katakana": katakana}]
+
+
+def linear_search(kana_data, query):
+    # Previous implementation, adapted to either kana-data.json shape
+    results = []
+    for script_type, kana_item in iter_kana(kana_data):
+        if (query.lower() in kana_item["character"] or
+            query.lower() in kana_item["romaji"].lower()):
+            results.append({
+                "character": kana_item["character"],
+                "romaji": kana_item["romaji"],
+                "script": script_type
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    kana_data = build_table()
+    build_time = timeit.timeit(lambda: KanaIndex(kana_data), number=20) / 20
+    index = KanaIndex(kana_data)
+    print(f"{len(index)} kana, index build {build_time * 1000:.2f} ms\n")
+    print(f"{'query':<8}{'linear us':>12}{'index us':>12}{'speedup':>10}   linear/index hits")
+
+    for query in QUERIES:
+        linear = timeit.timeit(lambda: linear_search(kana_data, query), number=args.iterations)
+        indexed = timeit.timeit(lambda: index.search(query), number=args.iterations)
+        linear_us = linear / args.iterations * 1e6
+        indexed_us = indexed / args.iterations * 1e6
+        hits = f"{len(linear_search(kana_data, query))}/{len(index.search(query))}"
+        print(f"{query:<8}{linear_us:>12.2f}{indexed_us:>12.2f}{linear_us / indexed_us:>9.1f}x   {hits}")
+
+
+if __name__ == "__main__":
+    main()
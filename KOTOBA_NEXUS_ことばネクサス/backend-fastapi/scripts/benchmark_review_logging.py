@@ -0,0 +1,187 @@
+"""
+Reviews per second: per-card DynamoDB writes vs write-behind and bulk batches.
+
+Runs against moto's in-process DynamoDB with a simulated network round
+trip added to every request (a before-send hook that sleeps, releasing the
+GIL like real I/O). Every path writes the same workload: `--users` users
+answering `--cards` cards each, over `--words` distinct words.
+
+- previous: the old log_review, four sequential requests per card
+  (put_item, session update_item, get_item for the word, word update_item)
+- log_review: the new single-card path (three requests, in parallel)
+- write-behind: ReviewWriteBuffer, flushed as BatchWriteItem batches
+- bulk: one log_reviews call per user session
+
+Per-card paths run `--concurrency` requests at once, as a worker would.
+
+moto runs in this process, so its own CPU per request (a few ms, more for
+conditional updates) is charged to the worker and serialized by the GIL;
+its timings track the number of requests more than DynamoDB's would. Pass
+--endpoint-url to run against DynamoDB Local instead (tables are created
+and deleted; no latency is added).
+
+Usage:
+    python scripts/benchmark_review_logging.py [--users 20] [--cards 50] [--words 30] [--rtt-ms 8] [--concurrency 16]
+                                               [--endpoint-url http://localhost:8000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CLOUDFRONT_URL", "http://localhost")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+import boto3
+from moto import mock_aws
+
+from app.models.study_progress import (
+    StudyProgressRepository, USER_PROGRESS_TABLE, STUDY_SESSIONS_TABLE, REVIEW_LOGS_TABLE
+)
+from app.services.review_buffer import ReviewWriteBuffer
+
+
+def create_tables(resource):
+    for name, keys in (
+        (USER_PROGRESS_TABLE, [("user_id", "HASH"), ("word_id", "RANGE")]),
+        (STUDY_SESSIONS_TABLE, [("id", "HASH")]),
+        (REVIEW_LOGS_TABLE, [("id", "HASH")]),
+    ):
+        resource.create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": key, "KeyType": kind} for key, kind in keys],
+            AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"} for key, _ in keys],
+            BillingMode="PAY_PER_REQUEST"
+        )
+
+
+@contextmanager
+def dynamodb(endpoint_url):
+    """Fresh tables on DynamoDB Local (endpoint_url) or in moto"""
+    with nullcontext() if endpoint_url else mock_aws():
+        resource = boto3.resource("dynamodb", region_name="us-east-1", endpoint_url=endpoint_url)
+        create_tables(resource)
+        try:
+            yield resource
+        finally:
+            if endpoint_url:
+                for name in (USER_PROGRESS_TABLE, STUDY_SESSIONS_TABLE, REVIEW_LOGS_TABLE):
+                    resource.Table(name).delete()
+
+
+def workload(args):
+    return [
+        (f"user{u}", f"session{u}", f"word{(u * 7 + c) % args.words}", (u + c) % 4 != 0)
+        for u in range(args.users) for c in range(args.cards)
+    ]
+
+
+def previous_log_review(repository: StudyProgressRepository, user_id, session_id, word_id, correct):
+    """The log_review this change replaced, with the missing word read done as a get_item"""
+    now = datetime.now().isoformat()
+    repository.review_logs_table.put_item(Item={
+        "id": str(uuid.uuid4()), "user_id": user_id, "session_id": session_id,
+        "word_id": word_id, "correct": correct, "timestamp": now
+    })
+    repository.study_sessions_table.update_item(
+        Key={"id": session_id},
+        UpdateExpression="ADD review_count :inc, " + ("correct_count :inc" if correct else "wrong_count :inc"),
+        ExpressionAttributeValues={":inc": 1}
+    )
+    current = repository.user_progress_table.get_item(Key={"user_id": user_id, "word_id": word_id}).get("Item", {})
+    level = current.get("proficiency_level", 0)
+    level = min(10, level + 1) if correct else max(0, level - 1)
+    repository.user_progress_table.update_item(
+        Key={"user_id": user_id, "word_id": word_id},
+        UpdateExpression=(
+            "SET last_reviewed = :now, proficiency_level = :prof, "
+            + ("correct_count = if_not_exists(correct_count, :zero) + :one" if correct
+               else "wrong_count = if_not_exists(wrong_count, :zero) + :one")
+        ),
+        ExpressionAttributeValues={":now": now, ":prof": level, ":zero": 0, ":one": 1}
+    )
+
+
+async def per_card(fn, reviews, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(review):
+        async with slots:
+            await asyncio.to_thread(fn, *review)
+
+    await asyncio.gather(*(one(review) for review in reviews))
+
+
+async def write_behind(repository, reviews):
+    buffer = ReviewWriteBuffer(repository, flush_interval=0.05)
+    start = time.perf_counter()
+    for review in reviews:
+        await buffer.add(*review)
+    accepted = time.perf_counter() - start
+    await buffer.shutdown()
+    print(f"  (write-behind accepted {len(reviews)} reviews in {accepted * 1000:.1f} ms before writing them)")
+
+
+async def bulk(repository, reviews, concurrency):
+    sessions = {}
+    for user_id, session_id, word_id, correct in reviews:
+        sessions.setdefault((user_id, session_id), []).append({"word_id": word_id, "correct": correct})
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(key, items):
+        async with slots:
+            await asyncio.to_thread(repository.log_reviews, *key, items)
+
+    await asyncio.gather(*(one(key, items) for key, items in sessions.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--words", type=int, default=30)
+    parser.add_argument("--rtt-ms", type=float, default=8)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoint-url")
+    args = parser.parse_args()
+    reviews = workload(args)
+
+    runs = {
+        "previous": lambda repository: per_card(
+            lambda *review: previous_log_review(repository, *review), reviews, args.concurrency
+        ),
+        "log_review": lambda repository: per_card(repository.log_review, reviews, args.concurrency),
+        "write-behind": lambda repository: write_behind(repository, reviews),
+        "bulk": lambda repository: bulk(repository, reviews, args.concurrency),
+    }
+    rtt = 0 if args.endpoint_url else args.rtt_ms / 1000
+    target = args.endpoint_url or f"moto, {args.rtt_ms:.0f} ms per request"
+    print(f"{len(reviews)} reviews ({target}), {args.concurrency} concurrent requests")
+    print(f"{'path':>12} {'seconds':>8} {'reviews/s':>10} {'requests':>9} {'per review':>10}")
+    for name, run in runs.items():
+        with dynamodb(args.endpoint_url) as resource:
+            requests = [0]
+
+            def round_trip(**kwargs):
+                requests[0] += 1
+                if rtt:
+                    time.sleep(rtt)
+
+            resource.meta.client.meta.events.register_first("before-send.dynamodb", round_trip)
+            repository = StudyProgressRepository(resource)
+            start = time.perf_counter()
+            asyncio.run(run(repository))
+            seconds = time.perf_counter() - start
+            resource.meta.client.meta.events.unregister("before-send.dynamodb", round_trip)
+            assert resource.Table(REVIEW_LOGS_TABLE).scan(Select="COUNT")["Count"] == len(reviews)
+        print(f"{name:>12} {seconds:>8.2f} {len(reviews) / seconds:>10.0f} {requests[0]:>9} {requests[0] / len(reviews):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Time-to-first-audio and peak memory: one Polly call vs streamed sentence chunks.
+
+Uses the Polly stub with a per-request plus per-character latency (Polly's
+synthesis time grows with the text) and a fresh audio cache per run, so
+every chunk is really synthesized. The one-shot path reads the whole
+AudioStream before the first byte can be sent; the streamed path sends each
+sentence chunk in order as soon as it is ready. Peak memory is the
+tracemalloc peak of Python allocations while the passage is produced and
+discarded, as a response body would be.
+
+Usage:
+    python scripts/benchmark_tts_stream.py [--sentences 10 40 70] [--request-ms 150] [--char-ms 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CLOUDFRONT_URL", "http://localhost")
+
+from app.services.audio_cache import AudioStore
+from app.services.polly_stub import StubPollyClient
+from app.services.tts_service import TTSService, split_sentences
+
+SENTENCES = [
+    "今朝は七時に起きて、駅まで歩いて行きました。",
+    "電車の中で新しい単語を二十個覚えました！",
+    "昼ご飯は会社の近くの店でラーメンを食べました。",
+    "午後の会議はとても長かったですね？",
+    "夜は友達と映画を見て、十一時ごろ家に帰りました。",
+]
+
+
+def passage(count: int) -> str:
+    # Numbered, so no sentence repeats (repeats would be cache hits)
+    return "".join(f"{i + 1}日目、{SENTENCES[i % len(SENTENCES)]}" for i in range(count))
+
+
+async def one_shot(text: str):
+    start = time.perf_counter()
+    audio = await asyncio.to_thread(TTSService.text_to_speech, text)
+    first = time.perf_counter() - start
+    del audio
+    return first, time.perf_counter() - start
+
+
+async def streamed(service: TTSService, text: str):
+    start = time.perf_counter()
+    first = None
+    async for audio in service.stream_audio(text):
+        first = first or time.perf_counter() - start
+        del audio
+    return first, time.perf_counter() - start
+
+
+def measure(run):
+    tracemalloc.start()
+    first, total = asyncio.run(run())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, nargs="+", default=[10, 40, 70])
+    parser.add_argument("--request-ms", type=float, default=150)
+    parser.add_argument("--char-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    TTSService._client = StubPollyClient(delay=args.request_ms / 1000, delay_per_char=args.char_ms / 1000)
+    print(f"{'sentences':>9} {'chars':>6} {'chunks':>6} | {'one-shot first/total ms':>24} {'peak KB':>8} | {'streamed first/total ms':>24} {'peak KB':>8}")
+    for count in args.sentences:
+        text = passage(count)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            service = TTSService(AudioStore(cache_dir=cache_dir, bucket=None))
+            one_first, one_total, one_peak = measure(lambda: one_shot(text))
+            stream_first, stream_total, stream_peak = measure(lambda: streamed(service, text))
+        print(
+            f"{count:>9} {len(text):>6} {len(split_sentences(text)):>6} | "
+            f"{one_first * 1000:>11.0f} / {one_total * 1000:>10.0f} {one_peak / 1024:>8.0f} | "
+            f"{stream_first * 1000:>11.0f} / {stream_total * 1000:>10.0f} {stream_peak / 1024:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
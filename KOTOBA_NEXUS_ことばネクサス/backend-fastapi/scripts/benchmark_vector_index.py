@@ -0,0 +1,91 @@
+"""
+Recall/latency benchmark: LocalVectorIndex exact scan vs IVF.
+
+Generates a clustered synthetic corpus (transcript embeddings are far from
+uniform) and queries that are noisy copies of corpus vectors. Recall@k of the
+IVF index is measured against the exact top-k for several nprobe values.
+Also times building, snapshotting and loading the index.
+
+Usage:
+    python scripts/benchmark_vector_index.py [--vectors 100000] [--dim 384] [--queries 200] [--top-k 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_index import LocalVectorIndex
+
+
+def clustered_corpus(count: int, dim: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, count)
+    return centers[labels] + 0.6 * rng.normal(size=(count, dim)).astype(np.float32)
+
+
+def time_queries(index: LocalVectorIndex, queries: np.ndarray, top_k: int):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([match["id"] for match in index.query(query, top_k)])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    corpus = clustered_corpus(args.vectors, args.dim, args.topics, rng)
+    picks = rng.integers(0, args.vectors, args.queries)
+    queries = corpus[picks] + 0.3 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    index = LocalVectorIndex(args.dim, mode="exact")
+    start = time.perf_counter()
+    for offset in range(0, args.vectors, args.batch):
+        index.upsert([
+            {"id": str(i), "values": corpus[i], "metadata": {"text": str(i)}}
+            for i in range(offset, min(offset + args.batch, args.vectors))
+        ])
+    print(f"{args.vectors} x {args.dim} vectors added in {time.perf_counter() - start:.2f} s")
+
+    exact, latencies = time_queries(index, queries, args.top_k)
+    print(f"{'mode':<16}{'recall@' + str(args.top_k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{np.percentile(latencies, 50):>10.3f}{np.percentile(latencies, 95):>10.3f}")
+
+    start = time.perf_counter()
+    index.mode = "ivf"
+    index.build_ivf()
+    print(f"IVF trained ({len(index._centroids)} clusters) in {time.perf_counter() - start:.2f} s")
+
+    for nprobe in (1, 4, 8, 16, 32):
+        index.nprobe = nprobe
+        approximate, latencies = time_queries(index, queries, args.top_k)
+        recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{recall:>10.3f}{np.percentile(latencies, 50):>10.3f}{np.percentile(latencies, 95):>10.3f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        index.snapshot(directory)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = LocalVectorIndex.load(directory, mode="ivf")
+        loaded_in = time.perf_counter() - start
+        _, latencies = time_queries(loaded, queries[:20], args.top_k)
+        print(f"snapshot {saved:.2f} s, load (mmap) {loaded_in:.2f} s, first queries p50 {np.percentile(latencies, 50):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,42 @@ async def test_fetch_json():
     print("🟢 Hiragana:", first_three_hiragana)
     print("🔵 Katakana:", first_three_katakana)
 
+def test_fetch_json_cache_revalidates_with_etag():
+    import httpx
+    import app.services.cloudfront_service as cloudfront
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=[{"id": "1"}], headers={"ETag": '"v1"'})
+
+    async def run():
+        CloudFrontService.invalidate()
+        CloudFrontService._client = httpx.AsyncClient(
+            base_url="https://cdn.test", transport=httpx.MockTransport(handler)
+        )
+        try:
+            first = await CloudFrontService.fetch_json("data_verb.json")
+            second = await CloudFrontService.fetch_json("data_verb.json")
+            assert first == second == [{"id": "1"}]
+            assert calls == [None]
+
+            # Expire the entry past the stale window: the next call revalidates
+            CloudFrontService._cache["data_verb.json"].fetched_at -= (
+                cloudfront.CLOUDFRONT_CACHE_TTL + cloudfront.CLOUDFRONT_CACHE_STALE_TTL + 1
+            )
+            third = await CloudFrontService.fetch_json("data_verb.json")
+            assert third == first
+            assert calls == [None, '"v1"']
+        finally:
+            await CloudFrontService.shutdown()
+            CloudFrontService.invalidate()
+
+    asyncio.run(run())
+
 # Run the test
 if __name__ == "__main__":
     asyncio.run(test_fetch_json())
-
@@ -0,0 +1,60 @@
+import asyncio
+from app.services.evaluation_cache import EvaluationCache
+
+BASE = 0x0123456789ABCDEF
+
+def flip(phash: int, bits: int) -> int:
+    """phash with its lowest `bits` bits inverted (Hamming distance `bits`)"""
+    return phash ^ ((1 << bits) - 1)
+
+def test_near_matches_within_the_threshold(tmp_path):
+    cache = EvaluationCache(max_distance=6)
+
+    async def run():
+        await cache.put(BASE, "あ", "v1", {"character": "あ", "quality_score": 8})
+        exact = await cache.get(BASE, "あ", "v1")
+        boundary = await cache.get(flip(BASE, 6), "あ", "v1")
+        beyond = await cache.get(flip(BASE, 7), "あ", "v1")
+        other_kana = await cache.get(BASE, "い", "v1")
+        other_prompt = await cache.get(BASE, "あ", "v2")
+        return exact, boundary, beyond, other_kana, other_prompt
+
+    exact, boundary, beyond, other_kana, other_prompt = asyncio.run(run())
+    assert exact["character"] == "あ" and exact["cache_distance"] == 0
+    assert boundary["cache_distance"] == 6
+    assert beyond is None and other_kana is None and other_prompt is None
+    assert cache.stats["hits"] == 2 and cache.stats["misses"] == 3
+
+def test_open_recognition_only_matches_exact_hashes():
+    cache = EvaluationCache(max_distance=6)
+
+    async def run():
+        await cache.put(BASE, None, "v1", {"character": "シ"})
+        return await cache.get(flip(BASE, 1), None, "v1"), await cache.get(BASE, None, "v1")
+
+    near, exact = asyncio.run(run())
+    assert near is None and exact["character"] == "シ"
+
+def test_sqlite_tier_survives_restarts(tmp_path):
+    path = str(tmp_path / "evaluations.db")
+    first = EvaluationCache(path=path)
+    asyncio.run(first.put(BASE, "ア", "v1", {"character": "ア"}))
+    asyncio.run(first.put(BASE, None, "v1", {"character": "ン"}))
+    asyncio.run(first.put_object_result("bucket/key@etag", "ア", "v1", {"character": "ア"}))
+    first.close()
+
+    restarted = EvaluationCache(path=path)
+
+    async def run():
+        return (
+            await restarted.get(flip(BASE, 3), "ア", "v1"),
+            await restarted.get(flip(BASE, 3), None, "v1"),
+            await restarted.get(BASE, None, "v1"),
+            await restarted.get_object_result("bucket/key@etag", "ア", "v1"),
+        )
+
+    near, open_near, open_exact, by_object = asyncio.run(run())
+    restarted.close()
+    assert near["cache_distance"] == 3 and restarted.stats["disk_hits"] == 2
+    assert open_near is None and open_exact["character"] == "ン"
+    assert by_object == {"character": "ア"}
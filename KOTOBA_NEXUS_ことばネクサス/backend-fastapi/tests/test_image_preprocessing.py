@@ -0,0 +1,45 @@
+from io import BytesIO
+import pytest
+from PIL import Image, ImageDraw
+from fastapi import HTTPException
+from app.services import image_preprocessing
+from app.services.image_preprocessing import PreprocessConfig, preprocess_image
+
+def drawing(size=(600, 400), mode="RGB", image_format="PNG") -> bytes:
+    """A dark stroke off-center on a light (or transparent) background"""
+    background = (0, 0, 0, 0) if mode == "RGBA" else "white"
+    image = Image.new(mode, size, background)
+    ImageDraw.Draw(image).line([(100, 100), (220, 260)], fill="black", width=12)
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def status(image_data: bytes, config: PreprocessConfig = PreprocessConfig()) -> int:
+    with pytest.raises(HTTPException) as raised:
+        preprocess_image(image_data, config)
+    return raised.value.status_code
+
+def test_drawings_are_cropped_downscaled_and_reencoded():
+    prepared = preprocess_image(drawing())
+    assert prepared.media_type == "image/jpeg" and prepared.data.startswith(b"\xff\xd8")
+    assert prepared.width == prepared.height <= 256
+    assert prepared.report()["original_bytes"] == len(drawing())
+
+    # Transparent canvas exports are flattened on white, not black
+    flattened = preprocess_image(drawing(mode="RGBA"))
+    assert flattened.image.getpixel((0, 0)) > 200
+
+def test_invalid_uploads_are_refused_before_decoding():
+    assert status(b"not an image") == 415
+    assert status(drawing(), PreprocessConfig(max_upload_bytes=100)) == 413
+
+def test_truncated_images_are_unsupported_not_server_errors():
+    data = drawing(image_format="JPEG")
+    assert status(data[:len(data) // 2]) == 415
+    data = drawing()
+    assert status(data[:len(data) // 2]) == 415
+
+def test_pixel_limit_is_enforced_below_pillows_error_threshold(monkeypatch):
+    # 600x400 is 1.2x the limit: Pillow alone would only warn
+    monkeypatch.setattr(image_preprocessing, "IMAGE_MAX_PIXELS", 200_000)
+    assert status(drawing()) == 413
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+from app.services import vector_store_service
+from app.services.ingestion import IngestionQueue
+from app.services.vector_index import LocalVectorIndex
+from app.services.vector_store_service import VectorStoreService, transcription_id
+
+class FlakyEmbeddings:
+    def __init__(self, fail_on=None):
+        self.requests = []
+        self.fail_on = fail_on
+
+    def create(self, model, input):
+        if self.fail_on is not None and self.fail_on in input:
+            raise RuntimeError("embedding service unavailable")
+        self.requests.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in input])
+
+def make_store(embeddings):
+    store = VectorStoreService.__new__(VectorStoreService)
+    store.embedding_model = "test"
+    store.backend = LocalVectorIndex(dim=2, mode="exact")
+    store.claude = SimpleNamespace(embeddings=embeddings)
+    return store
+
+class FakeYouTube:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_transcription(self, video_url, lang):
+        self.calls += 1
+        return {
+            "video_id": video_url,
+            "windows": [{"start": 20.0 * i, "end": 20.0 * i + 30, "text": f"窓 {i}"} for i in range(7)],
+        }
+
+async def wait_for(queue, job_id):
+    while (await queue.get(job_id))["status"] in ("queued", "running"):
+        await asyncio.sleep(0.01)
+    return await queue.get(job_id)
+
+def test_video_job_runs_once_for_identical_submissions(monkeypatch):
+    store = make_store(FlakyEmbeddings())
+    youtube = FakeYouTube()
+
+    async def run():
+        queue = IngestionQueue(youtube, store, batch_size=3)
+        first, second = await asyncio.gather(
+            queue.submit_video("https://youtu.be/dQw4w9WgXcQ", "ja"),
+            queue.submit_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "ja"),
+        )
+        job = await wait_for(queue, first["job_id"])
+        again = await queue.submit_video("dQw4w9WgXcQ", "ja")
+        await queue.shutdown()
+        return first, second, job, again
+
+    first, second, job, again = asyncio.run(run())
+    assert first["job_id"] == second["job_id"] == again["job_id"]
+    assert sorted([first["deduplicated"], second["deduplicated"]]) == [False, True]
+    assert again["deduplicated"] is True
+    assert youtube.calls == 1
+    assert job["status"] == "done"
+    assert job["progress"] == {"chunks": 7, "skipped": 0, "batches": 3, "embedded": 7, "upserted": 7, "percent": 100.0}
+    assert [len(request) for request in store.claude.embeddings.requests] == [3, 3, 1]
+    match = store.backend.query([4.0, 1.0], 1)[0]
+    assert match["metadata"]["video_id"] == "dQw4w9WgXcQ" and "start" in match["metadata"]
+
+def test_failed_job_resumes_from_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store_service, "VECTOR_STORE_MAX_RETRIES", 1)
+    path = str(tmp_path / "jobs.sqlite")
+    embeddings = FlakyEmbeddings(fail_on="line 7")
+    store = make_store(embeddings)
+    lines = [f"line {i}" for i in range(10)]
+    store.add_transcriptions(lines[:2])
+    embeddings.requests.clear()
+
+    async def run():
+        queue = IngestionQueue(None, store, path=path, batch_size=4, embed_workers=1)
+        job = await queue.submit_texts(lines)
+        failed = await wait_for(queue, job["job_id"])
+        await queue.shutdown()
+
+        # A new worker: the failed job is retried, not deduplicated, and skips finished batches
+        embeddings.fail_on = None
+        queue = IngestionQueue(None, store, path=path, batch_size=4)
+        retried = await queue.submit_texts(lines)
+        done = await wait_for(queue, job["job_id"])
+        await queue.shutdown()
+        return failed, retried, done
+
+    failed, retried, done = asyncio.run(run())
+    assert failed["status"] == "failed" and "unavailable" in failed["error"]
+    assert failed["progress"]["skipped"] == 2 and failed["progress"]["upserted"] == 4
+    assert retried["deduplicated"] is False
+    assert done["status"] == "done" and done["progress"]["upserted"] == 8
+    # lines 2-5 were embedded once; only the failed batch was sent again
+    assert embeddings.requests == [["line 2", "line 3", "line 4", "line 5"], ["line 6", "line 7", "line 8", "line 9"]]
+    assert store.backend.fetch_ids([transcription_id(line) for line in lines]) == {transcription_id(line) for line in lines}
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from io import BytesIO
+from PIL import Image, ImageDraw
+from app.services.kana_service import KanaService
+from app.services.vision_service import VisionService
+from app.services.evaluation_cache import EvaluationCache
+from app.services.image_preprocessing import preprocess_worksheet
+
+def worksheet_png(rows: int, cols: int, cell: int = 120) -> bytes:
+    """A grid worksheet with a different stroke pattern drawn in every cell"""
+    image = Image.new("L", (cols * cell, rows * cell), 255)
+    draw = ImageDraw.Draw(image)
+    for row in range(rows + 1):
+        draw.line([(0, row * cell), (cols * cell, row * cell)], fill=0, width=3)
+    for col in range(cols + 1):
+        draw.line([(col * cell, 0), (col * cell, rows * cell)], fill=0, width=3)
+    for n in range(rows * cols):
+        left, top = (n % cols) * cell, (n // cols) * cell
+        draw.line([(left + 30, top + 30), (left + 90, top + 30 + 10 * n)], fill=0, width=8)
+        draw.ellipse([left + 40, top + 60, left + 60 + 5 * n, top + 90], outline=0, width=6)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class FakeVision:
+    """Answers packed requests with one result per image"""
+    prepare_image = VisionService.prepare_image
+
+    def __init__(self, packed_answer: bool = True):
+        self.packed_answer = packed_answer
+        self.requests = []
+
+    async def process_images(self, images, prompt, max_tokens=1000):
+        self.requests.append(len(images))
+        await asyncio.sleep(0.01)
+        answer = [{"character": "あ", "quality_score": 7} for _ in images] if self.packed_answer else "not a list"
+        return {"success": True, "text": json.dumps(answer)}
+
+    async def process_image(self, image, prompt):
+        self.requests.append(1)
+        return {"success": True, "text": '{"character": "あ", "quality_score": 7}'}
+
+def run_batch(vision: FakeVision, images, expected, monkeypatch):
+    async def no_recognizer():
+        return None
+
+    monkeypatch.setattr(KanaService, "get_recognizer", staticmethod(no_recognizer))
+    monkeypatch.setattr(KanaService, "evaluation_cache", EvaluationCache(path=None))
+    service = KanaService()
+    service.vision_service = vision
+
+    async def collect():
+        return [result async for result in service.evaluate_batch(images, expected)]
+
+    return asyncio.run(collect())
+
+def test_worksheet_cells_skip_grid_lines():
+    cells = preprocess_worksheet(worksheet_png(2, 3), 2, 3)
+    assert len(cells) == 6
+    # Each cell is cropped to its own drawing, not the whole cell with its borders
+    assert all(cell.width < 120 for cell in cells)
+
+def test_batch_packs_escalated_cells_into_one_request(monkeypatch):
+    vision = FakeVision()
+    cells = preprocess_worksheet(worksheet_png(2, 3), 2, 3)
+    results = run_batch(vision, cells, ["あ"] * 6, monkeypatch)
+
+    assert sorted(result["index"] for result in results) == list(range(6))
+    assert all(result["success"] and result["recognizer"] == "claude" for result in results)
+    assert vision.requests == [6]
+
+def test_batch_falls_back_to_single_requests(monkeypatch):
+    vision = FakeVision(packed_answer=False)
+    cells = preprocess_worksheet(worksheet_png(1, 3), 1, 3)
+    results = run_batch(vision, cells + [b"not an image"], [None] * 4, monkeypatch)
+
+    by_index = {result["index"]: result for result in results}
+    assert by_index[3] == {"index": 3, "success": False, "error": "Unsupported or invalid image format", "status_code": 415}
+    assert all(by_index[i]["character"] == "あ" for i in range(3))
+    assert vision.requests == [3, 1, 1, 1]
+
+def test_packed_results_are_not_served_to_single_requests(monkeypatch):
+    vision = FakeVision()
+    cells = preprocess_worksheet(worksheet_png(1, 2), 1, 2)
+    run_batch(vision, cells, ["あ", "あ"], monkeypatch)
+    assert vision.requests == [2]
+
+    service = KanaService()
+    service.vision_service = vision
+
+    async def again():
+        batch = [result async for result in service.evaluate_batch(cells, ["あ", "あ"])]
+        buffer = BytesIO()
+        cells[0].image.save(buffer, format="PNG")
+        single = await service.evaluate_kana_image(buffer.getvalue(), "あ")
+        return batch, single
+
+    batch, single = asyncio.run(again())
+    # The batch reuses its own results; the single request is graded by the single-image prompt
+    assert all(result["cached"] for result in batch) and not single["cached"]
+    assert vision.requests == [2, 1]
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import pytest
+from app import dependencies
+from app.services.kana_recognizer import DEFAULT_FONT_PATHS, REPO_FONT_PATH, KanaRecognizer, load_fonts, render_glyph
+from app.services.kana_service import KanaService
+from app.services.registry import ServiceRegistry
+
+KANA = [
+    {"character": "あ", "script": "hiragana", "romaji": "a"},
+    {"character": "し", "script": "hiragana", "romaji": "shi"},
+    {"character": "ツ", "script": "katakana", "romaji": "tsu"},
+]
+
+def test_the_repo_font_is_a_default():
+    assert REPO_FONT_PATH in DEFAULT_FONT_PATHS and os.path.exists(REPO_FONT_PATH)
+    fonts = load_fonts([REPO_FONT_PATH])
+    recognizer = KanaRecognizer(KANA, fonts)
+    result = recognizer.evaluate(render_glyph("し", fonts[0]), "し")
+    assert result["character"] == "し" and result["match"]
+
+def test_missing_fonts_are_reported_by_readiness(monkeypatch):
+    async def no_index():
+        return None
+
+    monkeypatch.setattr(KanaService, "_fonts", None)
+    monkeypatch.setattr(KanaService, "get_index", staticmethod(no_index))
+    monkeypatch.setattr("app.services.kana_service.load_fonts", lambda: [])
+    registry = ServiceRegistry()
+    registry.register("kana", KanaService, warmup=dependencies.warm_kana)
+
+    asyncio.run(registry.startup())
+    kana = registry.readiness()["services"]["kana"]
+    # Still usable (every evaluation goes to Claude), but not silently
+    assert kana["status"] == "ready" and "recognizer disabled: no font" in kana["error"]
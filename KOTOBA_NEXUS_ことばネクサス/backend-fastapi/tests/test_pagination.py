@@ -0,0 +1,72 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routers import vocabulary
+from app.services.vocabulary_index import VocabularyIndex
+from app.services.vocabulary_service import VocabularyService
+from app.utils import pagination
+from app.utils.pagination import encode_cursor
+
+VERBS = [{"id": f"v{i}", "japanese": f"動詞{i}", "english": f"verb {i}"} for i in range(7)]
+ADJECTIVES = [{"id": f"a{i}", "japanese": f"形容詞{i}", "english": f"adjective {i}"} for i in range(3)]
+
+@pytest.fixture
+def client(monkeypatch):
+    index = {"current": VocabularyIndex(VERBS, ADJECTIVES, "1-1")}
+
+    async def get_index():
+        return index["current"]
+
+    monkeypatch.setattr(VocabularyService, "get_index", staticmethod(get_index))
+    app = FastAPI()
+    app.include_router(vocabulary.router)
+    client = TestClient(app)
+    client.index = index
+    return client
+
+def test_cursor_round_trip_visits_every_word_once(client):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, "fields": "id"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/vocabulary/all", params=params).json()
+        assert page["total"] == 10 and all(set(item) == {"id"} for item in page["items"])
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [word["id"] for word in VERBS + ADJECTIVES]
+
+def test_tampered_and_stale_cursors_are_rejected(client):
+    first = client.get("/api/vocabulary/verbs", params={"limit": 2}).json()
+    assert [item["id"] for item in first["items"]] == ["v0", "v1"]
+
+    for cursor in ("not-a-cursor", first["next_cursor"][:-3], encode_cursor(-1, "1-1"), encode_cursor(99, "1-1")):
+        assert client.get("/api/vocabulary/verbs", params={"cursor": cursor}).status_code == 400
+
+    client.index["current"] = VocabularyIndex(VERBS[:5], ADJECTIVES, "2-1")
+    stale = client.get("/api/vocabulary/verbs", params={"cursor": first["next_cursor"]})
+    assert stale.status_code == 400 and "restart" in stale.json()["detail"]
+
+def test_unknown_fields_are_rejected(client):
+    response = client.get("/api/vocabulary/verbs", params={"fields": "id,kanji,english"})
+    assert response.status_code == 400 and "kanji" in response.json()["detail"]
+
+    projected = client.get("/api/vocabulary/adjectives", params={"fields": "id, word_type", "limit": 10}).json()
+    assert projected["items"] == [{"id": f"a{i}", "word_type": "adjective"} for i in range(3)]
+
+def test_ndjson_is_one_object_per_line_across_chunks(client, monkeypatch):
+    monkeypatch.setattr(pagination, "NDJSON_CHUNK_ROWS", 3)
+    response = client.get("/api/vocabulary/all", params={"format": "ndjson", "limit": 8, "fields": "id,english"})
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["X-Total-Count"] == "10" and response.headers["X-Next-Cursor"]
+    assert response.content.endswith(b"\n") and b"\n\n" not in response.content
+    rows = [json.loads(line) for line in response.content.decode().splitlines()]
+    assert rows == [{"id": word["id"], "english": word["english"]} for word in (VERBS + ADJECTIVES)[:8]]
+
+    rest = client.get("/api/vocabulary/all", params={"format": "ndjson", "cursor": response.headers["X-Next-Cursor"]})
+    assert [json.loads(line)["id"] for line in rest.content.decode().splitlines()] == ["a1", "a2"]
+    assert "X-Next-Cursor" not in rest.headers
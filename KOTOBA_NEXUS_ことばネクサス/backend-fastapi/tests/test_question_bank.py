@@ -0,0 +1,140 @@
+import time
+import asyncio
+from app.routers.listening import store_question, stored_question
+from app.services.question_bank import QuestionBank, topic_pool, word_pool
+from app.services.question_cache import SemanticQuestionCache
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = 0
+        self.contexts = []
+
+    async def generate_question(self, context, topic, difficulty):
+        self.calls += 1
+        number = self.calls
+        self.contexts.append(context)
+        await asyncio.sleep(0.001)
+        return {
+            "question": f"{topic} {difficulty} #{number}",
+            "options": ["a", "b", "c", "d"],
+            "correct_answer": "a",
+            "context": context,
+            "first_token_ms": 1.0,
+        }
+
+    async def generate_from_vocabulary(self, word):
+        self.calls += 1
+        return {"audio_text": f"{word['japanese']} #{self.calls}", "question": "?", "options": ["a", "b"], "correct_answer": "b"}
+
+def search(topic, top_k):
+    return [{"text": f"snippet {i}", "score": 1.0} for i in range(top_k)]
+
+def test_pools_fill_in_background_and_skip_recent_questions():
+    generator = FakeGenerator()
+    bank = QuestionBank(generator, search, path=None, target=6, low_watermark=2, max_serves=100)
+
+    async def run():
+        assert await bank.take_topic("天気", "easy", "alice") is None
+        await bank.refill_topic("天気", "easy")
+
+        alice = [await bank.take_topic(" 天気 ", "easy", "alice") for _ in range(6)]
+        exhausted = await bank.take_topic("天気", "easy", "alice")
+        bob = await bank.take_topic("天気", "easy", "bob")
+        return alice, exhausted, bob
+
+    alice, exhausted, bob = asyncio.run(run())
+    assert generator.calls == 6
+    assert len({question["id"] for question in alice}) == 6
+    assert all(question["source"] == "bank" and "first_token_ms" not in question for question in alice)
+    # Each question was generated from its own slice of the retrieved transcripts
+    assert generator.contexts[1] == "snippet 3 snippet 4 snippet 5"
+    assert exhausted is None
+    assert bob is not None
+
+def test_low_watermark_triggers_refill(tmp_path):
+    generator = FakeGenerator()
+    path = str(tmp_path / "bank.sqlite")
+    bank = QuestionBank(generator, search, path=path, target=4, low_watermark=2, max_serves=1)
+    word = {"id": "n5-12", "japanese": "雨"}
+
+    async def run():
+        await bank.refill_word(word)
+        served = [await bank.take_word(word) for _ in range(3)]
+        # Below the watermark after the third serve retired its question
+        await asyncio.sleep(0.05)
+        size = bank.size(word_pool("n5-12"))
+        await bank.close()
+        return served, size
+
+    served, size = asyncio.run(run())
+    assert all(question is not None for question in served)
+    assert size == 4 and generator.calls == 7
+
+    # Unretired questions survive a restart
+    restarted = QuestionBank(FakeGenerator(), search, path=path, target=4, low_watermark=2)
+    assert restarted.size(word_pool("n5-12")) == 4
+    assert restarted.size(topic_pool("天気", "easy")) == 0
+
+def test_failed_context_search_is_counted():
+    def broken_search(topic, top_k):
+        raise RuntimeError("vector store unavailable")
+
+    generator = FakeGenerator()
+    bank = QuestionBank(generator, broken_search, path=None, target=4, low_watermark=2)
+    errors = QuestionBank.stats["refill_errors"]
+
+    async def run():
+        return await bank.refill_topic("天気", "easy")
+
+    assert asyncio.run(run()) == 0
+    assert QuestionBank.stats["refill_errors"] == errors + 1 and generator.calls == 0
+
+def test_cold_topics_are_not_refilled_and_pools_are_bounded(tmp_path):
+    generator = FakeGenerator()
+    path = str(tmp_path / "bank.sqlite")
+    bank = QuestionBank(generator, search, path=path, target=3, low_watermark=1, max_pools=2, refill_min_requests=3)
+
+    async def run():
+        # A one-off topic: answered live by the caller, no background generations
+        for _ in range(2):
+            assert await bank.take_topic("一度だけ", "easy") is None
+        await asyncio.sleep(0.01)
+        cold_calls = generator.calls
+        # The third request earns the pool a refill
+        await bank.take_topic("一度だけ", "easy")
+        await asyncio.sleep(0.05)
+
+        await bank.refill_topic("天気", "easy")
+        for topic in ("駅", "病院", "学校"):
+            await bank.add(topic_pool(topic, "easy"), [{"question": topic, "audio_text": topic}])
+        await bank.close()
+        return cold_calls
+
+    assert asyncio.run(run()) == 0
+    assert generator.calls == 6
+    # The pinned pool stays; only the most recent unpinned pool fits beside it
+    assert bank.size(topic_pool("天気", "easy")) == 3 and bank.size(topic_pool("学校", "easy")) == 1
+    assert bank.size(topic_pool("一度だけ", "easy")) == 0 and bank.size(topic_pool("駅", "easy")) == 0
+    assert QuestionBank.stats["evicted_pools"] >= 3
+
+    restarted = QuestionBank(FakeGenerator(), search, path=path, max_pools=10)
+    assert restarted.size(topic_pool("一度だけ", "easy")) == 0 and restarted.size(topic_pool("学校", "easy")) == 1
+
+def test_live_questions_count_as_served_to_their_user():
+    generator = FakeGenerator()
+    generator.model_id = "model"
+    bank = QuestionBank(generator, search, path=None, target=3, low_watermark=0, refill_min_requests=100)
+    cache = SemanticQuestionCache(lambda texts: None, enabled=False)
+
+    async def run():
+        assert await stored_question("食べ物", "easy", "alice", False, generator, bank, cache) is None
+        question = await generator.generate_question("", "食べ物", "easy")
+        await store_question("食べ物", "easy", "alice", question, time.perf_counter(), generator, bank, cache)
+        return (
+            await stored_question("食べ物", "easy", "alice", False, generator, bank, cache),
+            await stored_question("食べ物", "easy", "bob", False, generator, bank, cache),
+        )
+
+    alice, bob = asyncio.run(run())
+    assert alice is None
+    assert bob["question"] == "食べ物 easy #1" and bob["source"] == "bank"
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import numpy as np
+from app.routers.listening import store_question, stored_question
+from app.services.question_bank import QuestionBank
+from app.services.question_cache import SemanticQuestionCache
+
+# "food" and "eating" are near neighbours (cosine ~0.99), "weather" is unrelated
+VECTORS = {
+    "food": [1.0, 0.1, 0.0],
+    "eating": [1.0, 0.2, 0.0],
+    "weather": [0.0, 0.0, 1.0],
+}
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return np.array([VECTORS[text] for text in texts], dtype=np.float32)
+
+QUESTION = {"question": "何を食べましたか？", "options": ["a", "b"], "correct_answer": "a", "context": "...", "total_ms": 900.0}
+
+def test_similar_topics_share_a_question_with_provenance():
+    cache = SemanticQuestionCache(FakeEmbedder(), threshold=0.95, ttl=60, max_entries=10)
+    hits = SemanticQuestionCache.stats["hits"]
+
+    async def run():
+        assert await cache.get("food", "easy", "model") is None
+        await cache.put(" Food ", "easy", "model", QUESTION, generation_ms=1200.0)
+        return (
+            await cache.get("eating", "easy", "model"),
+            await cache.get("eating", "hard", "model"),
+            await cache.get("eating", "easy", "other-model"),
+            await cache.get("weather", "easy", "model"),
+            await cache.get("eating", "easy", "model", bypass=True),
+        )
+
+    similar, other_difficulty, other_model, unrelated, bypassed = asyncio.run(run())
+    assert similar["question"] == QUESTION["question"] and similar["source"] == "cache"
+    assert "total_ms" not in similar
+    assert similar["cache"]["topic"] == " Food " and similar["cache"]["similarity"] > 0.95
+    assert similar["cache"]["hits"] == 1 and similar["cache"]["generation_ms"] == 1200.0
+    assert other_difficulty is None and other_model is None and unrelated is None and bypassed is None
+    assert SemanticQuestionCache.stats["hits"] == hits + 1
+    assert SemanticQuestionCache.cache_stats()["saved_ms_avg"] > 0
+
+def test_expiry_lru_eviction_and_replacement():
+    cache = SemanticQuestionCache(FakeEmbedder(), threshold=0.95, ttl=0.05, max_entries=2)
+
+    async def run():
+        await cache.put("food", "easy", "model", QUESTION, generation_ms=1.0)
+        time.sleep(0.1)
+        expired = await cache.get("food", "easy", "model")
+
+        await cache.put("food", "easy", "model", QUESTION, generation_ms=1.0)
+        await cache.put("weather", "easy", "model", QUESTION, generation_ms=1.0)
+        # Refreshing the same request replaces its entry
+        await cache.put("food", "easy", "model", {**QUESTION, "question": "新しい"}, generation_ms=1.0)
+        refreshed = await cache.get("food", "easy", "model")
+        # "weather" is least recently used and goes first
+        await cache.put("food", "hard", "model", QUESTION, generation_ms=1.0)
+        return expired, refreshed, await cache.get("weather", "easy", "model"), await cache.get("eating", "easy", "model")
+
+    expired, refreshed, evicted, kept = asyncio.run(run())
+    assert expired is None
+    assert refreshed["question"] == "新しい"
+    assert evicted is None and kept is not None
+    assert len(cache._entries) == 2
+
+def test_recently_served_questions_are_excluded():
+    cache = SemanticQuestionCache(FakeEmbedder(), threshold=0.95, ttl=60, max_entries=10)
+    generator = SimpleNamespace(model_id="model")
+    bank = QuestionBank(generator, lambda topic, top_k: [], path=None, refill_min_requests=100)
+
+    async def run():
+        await store_question("food", "easy", "alice", QUESTION, time.perf_counter(), generator, bank, cache)
+        await cache.put("eating", "easy", "model", {**QUESTION, "question": "何が好きですか？", "id": "other"}, 800.0)
+        return (
+            await stored_question("eating", "easy", "alice", False, generator, bank, cache),
+            await stored_question("eating", "easy", "alice", False, generator, bank, cache),
+            await stored_question("eating", "easy", "bob", False, generator, bank, cache),
+            await stored_question("eating", "easy", "bob", False, generator, bank, cache),
+            await stored_question("eating", "easy", "bob", False, generator, bank, cache),
+        )
+
+    alice_first, alice_again, bob_first, bob_second, bob_third = asyncio.run(run())
+    # Alice generated the "food" question, so she gets the next most similar one, once
+    assert alice_first["question"] == "何が好きですか？" and alice_first["source"] == "cache"
+    assert alice_again is None
+    # Best match first, then the runner-up, then nothing new
+    assert bob_first["question"] == "何が好きですか？"
+    assert bob_second["question"] == QUESTION["question"] and bob_second["cache"]["topic"] == "food"
+    assert bob_third is None
+    assert SemanticQuestionCache.stats["excluded"] > 0
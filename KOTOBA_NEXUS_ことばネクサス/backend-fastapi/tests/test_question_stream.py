@@ -0,0 +1,65 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import HTTPException
+from app.services.bedrock_stub import StubBedrockClient
+from app.services.question_generation_service import QuestionGenerationService
+
+def make_service(monkeypatch, client):
+    monkeypatch.setattr(QuestionGenerationService, "_client", client)
+    return QuestionGenerationService(model_id="stub-model")
+
+def test_fields_stream_before_the_completion_ends(monkeypatch):
+    client = StubBedrockClient(chunk_chars=3, first_token_delay=0.05, token_delay=0.005)
+    service = make_service(monkeypatch, client)
+
+    async def run():
+        start = time.perf_counter()
+        timeline = []
+        async for event in service.stream_question("土曜日に友達と映画を見ました。", "週末", "easy"):
+            timeline.append((time.perf_counter() - start, event))
+        return timeline
+
+    timeline = asyncio.run(run())
+    first_token_at = next(at for at, event in timeline if event["event"] == "token")
+    question_at = next(at for at, event in timeline if event.get("field") == "question")
+    done_at, done = timeline[-1]
+
+    assert first_token_at < 0.2
+    assert question_at < done_at / 2
+    fields = [(event["field"], event.get("index")) for _, event in timeline if event["event"] == "field"]
+    assert fields[:6] == [("question", None), ("options", 0), ("options", 1), ("options", 2), ("options", 3), ("options", None)]
+    assert done["event"] == "done"
+    assert done["question"]["correct_answer"] in done["question"]["options"]
+    assert "".join(event["text"] for _, event in timeline if event["event"] == "token") == client.text
+
+    body = client.calls[0]["body"]
+    assert body["anthropic_version"] == "bedrock-2023-05-31"
+    assert "土曜日に友達と映画を見ました。" in body["messages"][0]["content"]
+
+def test_generate_question_collects_the_stream(monkeypatch):
+    service = make_service(monkeypatch, StubBedrockClient())
+    question = asyncio.run(service.generate_question("context", "週末"))
+    assert question["question"] and len(question["options"]) == 4
+    assert question["context"] == "context" and question["model"] == "stub-model"
+
+def test_incomplete_answers_and_early_close(monkeypatch):
+    service = make_service(monkeypatch, StubBedrockClient(text=json.dumps({"question": "?", "options": ["a", "b"], "correct_answer": "c"})))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.generate_question("context", "topic"))
+    assert error.value.status_code == 502
+
+    client = StubBedrockClient(chunk_chars=1, token_delay=0.01)
+    service = make_service(monkeypatch, client)
+
+    async def first_token():
+        stream = service.stream_question("context", "topic")
+        async for event in stream:
+            await stream.aclose()
+            return event
+
+    assert asyncio.run(first_token())["event"] == "token"
+    time.sleep(0.05)
+    # The reader thread noticed the consumer left and closed the Bedrock stream
+    assert client.streams[0].closed
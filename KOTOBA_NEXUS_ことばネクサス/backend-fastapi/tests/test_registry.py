@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.services.registry import ServiceRegistry
+
+class Client:
+    built = 0
+
+    def __init__(self):
+        Client.built += 1
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+def test_services_are_built_once_and_closed_in_reverse():
+    registry = ServiceRegistry()
+    closed = []
+    Client.built = 0
+    registry.register("client", Client, close=lambda service: closed.append("client") or service.close())
+    registry.register("wrapper", lambda: {"client": registry.get("client")}, close=lambda service: closed.append("wrapper"))
+
+    async def run():
+        await registry.startup()
+        assert registry.get("wrapper")["client"] is registry.get("client")
+        assert registry.readiness()["ready"]
+        client = registry.get("client")
+        await registry.shutdown()
+        return client
+
+    client = asyncio.run(run())
+    assert Client.built == 1
+    assert closed == ["wrapper", "client"]
+    assert client.closed
+
+def test_failures_are_reported_not_fatal():
+    registry = ServiceRegistry()
+
+    def broken():
+        raise RuntimeError("PINECONE_API_KEY is not set")
+
+    async def cold(service):
+        raise RuntimeError("CloudFront unavailable")
+
+    registry.register("vector_store", broken)
+    registry.register("kana", Client, warmup=cold)
+    asyncio.run(registry.startup())
+
+    readiness = registry.readiness()
+    assert not readiness["ready"]
+    assert readiness["services"]["vector_store"]["status"] == "failed"
+    assert readiness["services"]["kana"] == {"status": "ready", "error": "warmup failed: CloudFront unavailable", "startup_ms": readiness["services"]["kana"]["startup_ms"]}
+    assert isinstance(registry.get("kana"), Client)
+    with pytest.raises(HTTPException) as error:
+        registry.get("vector_store")
+    assert error.value.status_code == 503
@@ -0,0 +1,58 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.utils import responses
+from app.utils.responses import VersionedResponseCache
+
+CONTENT = {"items": [{"kana": "あ", "romaji": "a"}] * 50}
+
+@pytest.fixture
+def client():
+    cache = VersionedResponseCache()
+    app = FastAPI()
+
+    @app.get("/catalog")
+    async def catalog(request: Request):
+        return await cache.respond(request, "v1", lambda: CONTENT)
+
+    client = TestClient(app)
+    client.cache = cache
+    return client
+
+def get(client, encoding, **headers):
+    return client.get("/catalog", headers={"Accept-Encoding": encoding, **headers})
+
+def test_encoding_is_negotiated_with_a_variant_etag(client):
+    identity = get(client, "identity")
+    zipped = get(client, "gzip")
+    assert identity.json() == zipped.json() == CONTENT
+    assert "Content-Encoding" not in identity.headers
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+    assert all(response.headers["Vary"] == "Accept-Encoding" for response in (identity, zipped))
+    # Serialized and compressed once for every request of this version
+    assert client.cache.stats["misses"] == 1
+
+    refused = get(client, "gzip;q=0")
+    assert "Content-Encoding" not in refused.headers
+
+    if responses.brotli is not None:
+        brotli = get(client, "gzip, br")
+        assert brotli.headers["Content-Encoding"] == "br" and brotli.headers["ETag"].endswith('-br"')
+
+def test_not_modified_carries_the_negotiated_etag(client):
+    zipped = get(client, "gzip")
+    etag = zipped.headers["ETag"]
+
+    revalidated = get(client, "gzip", **{"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag and revalidated.headers["Vary"] == "Accept-Encoding"
+    assert "Content-Encoding" not in revalidated.headers
+
+    # A validator from another encoding still matches the same body, answered with this encoding's ETag
+    identity = get(client, "identity", **{"If-None-Match": etag})
+    assert identity.status_code == 304 and identity.headers["ETag"] == etag.replace("-gzip", "")
+
+    changed = get(client, "gzip", **{"If-None-Match": '"0000"'})
+    assert changed.status_code == 200 and changed.json() == CONTENT
+    assert client.cache.stats["not_modified"] == 2
@@ -0,0 +1,83 @@
+import asyncio
+import boto3
+import pytest
+from io import BytesIO
+from fastapi import HTTPException
+from moto import mock_aws
+from PIL import Image, ImageDraw
+from app.services.kana_service import KanaService
+from app.services.s3_service import S3Service
+from app.services.vision_service import VisionService
+from app.services.evaluation_cache import EvaluationCache
+
+BUCKET = "kotoba-uploads"
+
+def drawing_png() -> bytes:
+    image = Image.new("L", (200, 200), 255)
+    ImageDraw.Draw(image).line([(40, 60), (160, 140)], fill=0, width=10)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class FakeVision:
+    prepare_image = VisionService.prepare_image
+
+    def __init__(self):
+        self.calls = 0
+
+    async def process_image(self, image, prompt):
+        self.calls += 1
+        return {"success": True, "text": '{"character": "あ", "match": true}'}
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("S3_BUCKET_NAME", BUCKET)
+    monkeypatch.setenv("AWS_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_SECRET_KEY", "testing")
+    with mock_aws():
+        S3Service.reset_client()
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield S3Service()
+    S3Service.reset_client()
+
+@pytest.fixture
+def kana_service(monkeypatch):
+    async def no_recognizer():
+        return None
+
+    monkeypatch.setattr(KanaService, "get_recognizer", staticmethod(no_recognizer))
+    monkeypatch.setattr(KanaService, "evaluation_cache", EvaluationCache(path=None))
+    service = KanaService()
+    service.vision_service = FakeVision()
+    return service
+
+def test_evaluated_key_is_not_read_again(s3, kana_service):
+    key = "user-uploads/20250301_a.png"
+    s3.s3_client.put_object(Bucket=BUCKET, Key=key, Body=drawing_png(), Metadata=s3.upload_metadata("あ"))
+
+    first = asyncio.run(kana_service.evaluate_s3_object(key, s3_service=s3))
+    second = asyncio.run(kana_service.evaluate_s3_object(key, s3_service=s3))
+
+    assert first["match"] and not first["already_evaluated"]
+    assert second["already_evaluated"] and second["character"] == "あ"
+    assert kana_service.vision_service.calls == 1
+
+    # A new upload under the same key is a new version: it is read and
+    # decoded again (here the same drawing, so the image cache answers)
+    s3.s3_client.put_object(Bucket=BUCKET, Key=key, Body=drawing_png() + b"\0", Metadata=s3.upload_metadata("あ"))
+    third = asyncio.run(kana_service.evaluate_s3_object(key, s3_service=s3))
+    assert not third["already_evaluated"] and third["cached"]
+    assert KanaService.s3_stats["bytes_read"] > 0
+
+def test_oversized_and_missing_objects(s3, kana_service):
+    key = "user-uploads/big.png"
+    s3.s3_client.put_object(Bucket=BUCKET, Key=key, Body=b"\x89PNG\r\n\x1a\n" + b"\0" * 2048)
+    obj = s3.head_object(key)
+
+    with pytest.raises(HTTPException) as error:
+        s3.read_object(obj, max_bytes=1024)
+    assert error.value.status_code == 413
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(kana_service.evaluate_s3_object("user-uploads/missing.png", s3_service=s3))
+    assert error.value.status_code == 404
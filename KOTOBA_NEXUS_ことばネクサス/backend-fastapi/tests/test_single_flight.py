@@ -0,0 +1,38 @@
+import asyncio
+from app.utils.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_fetch():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"verbs": []}
+
+    async def run():
+        return await asyncio.gather(*(flight.do("data_verb.json", fetch) for _ in range(100)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.shared == 99
+
+def test_failure_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("CloudFront unavailable")
+
+    async def run():
+        results = await asyncio.gather(
+            *(flight.do("kana-data.json", fetch) for _ in range(10)),
+            return_exceptions=True
+        )
+        # The failed flight is forgotten, so the next call retries
+        assert not flight.in_flight("kana-data.json")
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
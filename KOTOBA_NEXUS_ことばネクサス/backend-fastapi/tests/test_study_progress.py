@@ -0,0 +1,152 @@
+import asyncio
+import boto3
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from moto import mock_aws
+from app.dependencies import get_study_progress_repository
+from app.models import study_progress
+from app.models.study_progress import (
+    StudyProgressRepository, USER_PROGRESS_TABLE, STUDY_SESSIONS_TABLE, REVIEW_LOGS_TABLE
+)
+from app.routers import study_progress as study_progress_router
+from app.services.review_buffer import ReviewWriteBuffer
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        resource = boto3.resource("dynamodb", region_name="us-east-1")
+        for name, keys in (
+            (USER_PROGRESS_TABLE, [("user_id", "HASH"), ("word_id", "RANGE")]),
+            (STUDY_SESSIONS_TABLE, [("id", "HASH")]),
+            (REVIEW_LOGS_TABLE, [("id", "HASH")]),
+        ):
+            resource.create_table(
+                TableName=name,
+                KeySchema=[{"AttributeName": key, "KeyType": kind} for key, kind in keys],
+                AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"} for key, _ in keys],
+                BillingMode="PAY_PER_REQUEST"
+            )
+        yield resource
+
+def word(resource, word_id, user_id="alice"):
+    return resource.Table(USER_PROGRESS_TABLE).get_item(Key={"user_id": user_id, "word_id": word_id})["Item"]
+
+def test_bulk_reviews_are_aggregated_and_clamped(dynamodb):
+    repository = StudyProgressRepository(dynamodb)
+    reviews = (
+        [{"word_id": "ame", "correct": True}] * 12
+        + [{"word_id": "kaze", "correct": True}] * 3 + [{"word_id": "kaze", "correct": False}] * 5
+        + [{"word_id": "yuki", "correct": True}] * 4 + [{"word_id": "yuki", "correct": False}]
+    )
+    result = repository.log_reviews("alice", "s1", reviews)
+
+    assert result["logged"] == 25 and result["correct"] == 19 and result["wrong"] == 6
+    assert result["proficiency"] == {"ame": 10, "kaze": 0, "yuki": 3}
+    assert dynamodb.Table(REVIEW_LOGS_TABLE).scan()["Count"] == 25
+    session = dynamodb.Table(STUDY_SESSIONS_TABLE).get_item(Key={"id": "s1"})["Item"]
+    assert (session["review_count"], session["correct_count"], session["wrong_count"]) == (25, 19, 6)
+    assert (word(dynamodb, "ame")["correct_count"], word(dynamodb, "kaze")["wrong_count"]) == (12, 5)
+
+    again = repository.log_reviews("alice", "s2", [{"word_id": "ame", "correct": False}] * 2)
+    assert again["proficiency"] == {"ame": 8}
+
+    single = repository.log_review("alice", "s2", "yuki", True)
+    assert single["proficiency_level"] == 4 and single["review_id"]
+    assert repository.update_word_progress("alice", "new", False)["proficiency_level"] == 0
+
+    summary = repository.get_user_progress_summary("alice")
+    assert summary["mastered_words"] == 0 and summary["proficiency_distribution"][8] == 1
+
+class FlakyRepository(StudyProgressRepository):
+    """Fails the first word update, after the logs and session totals were written"""
+
+    def __init__(self, resource):
+        super().__init__(resource)
+        self.failures = 1
+
+    def apply_word_progress(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("ProvisionedThroughputExceededException")
+        return super().apply_word_progress(*args, **kwargs)
+
+def test_buffer_flushes_and_retries_only_what_failed(dynamodb):
+    repository = FlakyRepository(dynamodb)
+    buffer = ReviewWriteBuffer(repository, flush_interval=0.05, flush_size=1000)
+
+    async def run():
+        for i in range(40):
+            await buffer.add("bob", "s1", f"w{i % 4}", i % 5 != 0)
+        # First flush fails on one word, the next retries it
+        await asyncio.sleep(0.3)
+        flushed = buffer.pending
+        await buffer.add("bob", "s1", "w0", True)
+        await buffer.shutdown()
+        return flushed
+
+    assert asyncio.run(run()) == 0
+    assert buffer.pending == 0 and ReviewWriteBuffer.stats["failed_flushes"] >= 1
+    assert dynamodb.Table(REVIEW_LOGS_TABLE).scan()["Count"] == 41
+    session = dynamodb.Table(STUDY_SESSIONS_TABLE).get_item(Key={"id": "s1"})["Item"]
+    assert (session["review_count"], session["correct_count"], session["wrong_count"]) == (41, 33, 8)
+    counts = [word(dynamodb, f"w{i}", "bob") for i in range(4)]
+    assert sum(item["correct_count"] + item["wrong_count"] for item in counts) == 41
+
+@pytest.mark.parametrize("with_key", [True, False])
+def test_retried_bulk_request_is_applied_once(dynamodb, with_key):
+    repository = FlakyRepository(dynamodb)
+    reviews = [{"word_id": f"w{i % 3}", "correct": i % 4 != 0} for i in range(12)]
+    key = "retry-1" if with_key else None
+    if not with_key:
+        reviews = [{**review, "id": f"r{i}"} for i, review in enumerate(reviews)]
+
+    # The first attempt fails after the logs, the session and two of the words were written
+    with pytest.raises(RuntimeError):
+        repository.log_reviews("carol", "s9", reviews, key)
+    first = StudyProgressRepository(dynamodb).log_reviews("carol", "s9", reviews, key)
+    again = StudyProgressRepository(dynamodb).log_reviews("carol", "s9", reviews, key)
+
+    assert first["proficiency"] == again["proficiency"] == {"w0": 2, "w1": 2, "w2": 2}
+    assert dynamodb.Table(REVIEW_LOGS_TABLE).scan()["Count"] == 12
+    session = dynamodb.Table(STUDY_SESSIONS_TABLE).get_item(Key={"id": "s9"})["Item"]
+    assert (session["review_count"], session["correct_count"], session["wrong_count"]) == (12, 9, 3)
+    assert [word(dynamodb, f"w{i}", "carol")["correct_count"] for i in range(3)] == [3, 3, 3]
+
+def test_batch_markers_are_pruned_and_recent_retries_still_skipped(dynamodb, monkeypatch):
+    monkeypatch.setattr(study_progress, "REVIEW_MARKERS_MAX", 4)
+    repository = StudyProgressRepository(dynamodb)
+    reviews = [{"word_id": "ame", "correct": True}]
+    for i in range(7):
+        repository.log_reviews("dave", "s1", reviews, f"batch-{i}")
+
+    # The fifth marker pruned the list to the newest 2, then two more were appended
+    session = dynamodb.Table(STUDY_SESSIONS_TABLE).get_item(Key={"id": "s1"})["Item"]
+    assert len(session["applied_batches"]) == 4
+    assert len(word(dynamodb, "ame", "dave")["applied_batches"]) == 4
+
+    # A recent batch is still recognized; one pruned long ago is applied again
+    repository.log_reviews("dave", "s1", reviews, "batch-6")
+    assert word(dynamodb, "ame", "dave")["correct_count"] == 7
+    repository.log_reviews("dave", "s1", reviews, "batch-0")
+    assert word(dynamodb, "ame", "dave")["correct_count"] == 8
+
+def test_review_timestamps_are_validated_and_normalized(dynamodb):
+    app = FastAPI()
+    app.include_router(study_progress_router.router)
+    app.dependency_overrides[get_study_progress_repository] = lambda: StudyProgressRepository(dynamodb)
+    client = TestClient(app)
+
+    def bulk(timestamp):
+        return client.post("/api/study-progress/reviews/bulk", json={
+            "user_id": "erin", "session_id": "s1",
+            "reviews": [{"word_id": "ame", "correct": True, "timestamp": timestamp}]
+        })
+
+    assert bulk("yesterday").status_code == 422
+    assert bulk("2025-01-01 10:00:00").status_code == 200
+    assert word(dynamodb, "ame", "erin")["last_reviewed"] == "2025-01-01T10:00:00"
+    progress = client.get("/api/study-progress/erin")
+    assert progress.status_code == 200 and progress.json()["total_correct"] == 1
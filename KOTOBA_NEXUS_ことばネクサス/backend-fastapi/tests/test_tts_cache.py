@@ -0,0 +1,129 @@
+import asyncio
+import os
+import boto3
+import pytest
+from moto import mock_aws
+from fastapi import HTTPException
+from app.services.audio_cache import AudioStore
+from app.services.polly_stub import StubPollyClient
+from app.services.tts_service import TTSService
+
+BUCKET = "kotoba-audio"
+
+@pytest.fixture
+def polly(monkeypatch):
+    client = StubPollyClient(delay=0.01)
+    monkeypatch.setattr(TTSService, "_client", client)
+    return client
+
+def test_repeated_audio_is_synthesized_once(tmp_path, polly):
+    service = TTSService(AudioStore(cache_dir=str(tmp_path), bucket=None))
+
+    async def run():
+        concurrent = await asyncio.gather(*(service.generate_audio("雨が降っています。") for _ in range(5)))
+        again = await service.generate_audio("  雨が降っています。 ")
+        other_voice = await service.generate_audio("雨が降っています。", voice="Takumi")
+        return concurrent, again, other_voice
+
+    concurrent, again, other_voice = asyncio.run(run())
+    assert len(set(concurrent)) == 1 and again == concurrent[0]
+    assert again.startswith("/api/listening/audio/") and again.endswith(".mp3")
+    assert other_voice != again
+    assert [call["VoiceId"] for call in polly.calls] == ["Mizuki", "Takumi"]
+
+    path = asyncio.run(service.audio_path(again.rsplit("/", 1)[1]))
+    with open(path, "rb") as f:
+        assert f.read() == TTSService.text_to_speech("雨が降っています。")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.generate_audio("   "))
+    assert error.value.status_code == 400
+
+def test_disk_tier_is_bounded_and_survives_restarts(tmp_path, polly):
+    # Each stub synthesis of a 3-character text is about 1.2KB
+    store = AudioStore(cache_dir=str(tmp_path), max_bytes=3000, bucket=None)
+    service = TTSService(store)
+
+    async def run():
+        first = await service.generate_audio("いち。")
+        await service.generate_audio("にい。")
+        # Touch "いち。" so "にい。" is least recently used
+        await service.generate_audio("いち。")
+        await service.generate_audio("さん。")
+        return first
+
+    first = asyncio.run(run())
+    assert len(polly.calls) == 3
+    assert len(os.listdir(tmp_path)) == 2 and store.stats["bytes"] <= 3000
+
+    restarted = TTSService(AudioStore(cache_dir=str(tmp_path), max_bytes=3000, bucket=None))
+    assert asyncio.run(restarted.generate_audio("いち。")) == first
+    assert len(polly.calls) == 3
+
+def test_s3_tier_is_shared_between_workers(tmp_path, polly):
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+
+        def worker(name):
+            store = AudioStore(
+                cache_dir=str(tmp_path / name), bucket=BUCKET,
+                public_base_url="https://cdn.example.com/", s3_client=s3
+            )
+            return TTSService(store)
+
+        first, second = worker("a"), worker("b")
+        url = asyncio.run(first.generate_audio("図書館で勉強します。"))
+        assert url.startswith("https://cdn.example.com/tts-audio/")
+
+        hits = TTSService.stats["s3_hits"]
+        assert asyncio.run(second.generate_audio("図書館で勉強します。")) == url
+        assert len(polly.calls) == 1 and TTSService.stats["s3_hits"] == hits + 1
+
+        stored = s3.head_object(Bucket=BUCKET, Key="tts-audio/" + url.rsplit("/", 1)[1])
+        assert stored["ContentType"] == "audio/mpeg" and "immutable" in stored["CacheControl"]
+        # The second worker's disk is filled on first read
+        assert asyncio.run(second.audio_path(url.rsplit("/", 1)[1])) is not None
+
+class FailingUploads:
+    """S3 client whose next `failures` uploads fail"""
+
+    def __init__(self, client, failures):
+        self.client = client
+        self.failures = failures
+
+    def put_object(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("upload failed")
+        return self.client.put_object(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+def test_failed_upload_leaves_no_public_url(tmp_path, polly):
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+
+        def store(failures=0):
+            return AudioStore(
+                cache_dir=str(tmp_path), bucket=BUCKET,
+                public_base_url="https://cdn.example.com", s3_client=FailingUploads(s3, failures)
+            )
+
+        service = TTSService(store(failures=1))
+        with pytest.raises(RuntimeError):
+            asyncio.run(service.generate_audio("駅はどこですか。"))
+        assert os.listdir(tmp_path) == [] and AudioStore.stats["s3_upload_errors"] >= 1
+
+        url = asyncio.run(service.generate_audio("駅はどこですか。"))
+        assert url.startswith("https://cdn.example.com/tts-audio/")
+        assert len(polly.calls) == 2
+
+        # Another worker with the audio on disk but not seen in S3 links to this app
+        name = url.rsplit("/", 1)[1]
+        other = store()
+        assert other.local_path(name) is not None
+        assert other.url(name) == "/api/listening/audio/" + name
+        assert other.has_remote(name) and other.url(name) == url
@@ -0,0 +1,62 @@
+import asyncio
+import time
+import pytest
+from app.services.audio_cache import AudioStore
+from app.services.polly_stub import StubPollyClient
+from app.services.tts_service import TTSService, split_sentences
+
+# The first sentence is the longest, so later chunks finish before it
+PASSAGE = "昨日は朝から雨が降っていたので、友達と一緒に駅の近くの喫茶店で長い時間話していました。" + "".join(
+    f"{n}時に駅前で友達と会って、一緒に電車に乗りました。" for n in range(1, 9)
+)
+
+@pytest.fixture
+def polly(monkeypatch):
+    client = StubPollyClient(delay=0.02, delay_per_char=0.002)
+    monkeypatch.setattr(TTSService, "_client", client)
+    return client
+
+def test_split_sentences():
+    assert split_sentences("はい。そうです！本当ですか？「行きましょう。」彼は言った", min_chars=1) == [
+        "はい。", "そうです！", "本当ですか？", "「行きましょう。」", "彼は言った"
+    ]
+    # Short sentences are merged; nothing exceeds max_chars, cut after 、 where possible
+    assert split_sentences("はい。いいえ。", min_chars=10) == ["はい。いいえ。"]
+    assert split_sentences("あ" * 10 + "、" + "い" * 10 + "。", min_chars=1, max_chars=12) == ["あ" * 10 + "、", "い" * 10 + "。"]
+    assert all(len(chunk) <= 10 for chunk in split_sentences("あいうえお" * 5, max_chars=10))
+
+def test_stream_starts_early_and_keeps_order(tmp_path, polly):
+    service = TTSService(AudioStore(cache_dir=str(tmp_path), bucket=None))
+    chunks = split_sentences(PASSAGE)
+    assert len(chunks) > 3
+
+    async def run():
+        start = time.perf_counter()
+        pieces, first_at = [], None
+        async for audio in service.stream_audio(PASSAGE):
+            first_at = first_at or time.perf_counter() - start
+            pieces.append(audio)
+        return pieces, first_at, time.perf_counter() - start
+
+    pieces, first_at, total = asyncio.run(run())
+    assert pieces == [TTSService.text_to_speech(chunk) for chunk in chunks]
+    # One Polly call for the whole passage would take 0.02 + 0.002 * len(PASSAGE) seconds
+    assert first_at < (0.02 + 0.002 * len(PASSAGE)) / 2
+    assert total < 0.02 * len(chunks) + 0.002 * len(PASSAGE)
+
+    # Every chunk was cached: streaming the passage again synthesizes nothing
+    calls = len(polly.calls)
+    again, _, _ = asyncio.run(run())
+    assert again == pieces and len(polly.calls) == calls
+
+def test_texts_over_the_polly_limit_are_chunked(tmp_path, monkeypatch):
+    polly = StubPollyClient()
+    monkeypatch.setattr(TTSService, "_client", polly)
+    service = TTSService(AudioStore(cache_dir=str(tmp_path), bucket=None))
+    text = "図書館で日本語の本を読みました。" * 250
+
+    url = asyncio.run(service.generate_audio(text))
+    assert max(len(call["Text"]) for call in polly.calls) <= 1500
+    path = asyncio.run(service.audio_path(url.rsplit("/", 1)[1]))
+    with open(path, "rb") as f:
+        assert f.read() == b"".join(TTSService.text_to_speech(chunk) for chunk in split_sentences(text))
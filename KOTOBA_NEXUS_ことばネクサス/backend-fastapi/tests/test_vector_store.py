@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import vector_store_service
+from app.services.vector_store_service import VectorStoreService, transcription_id
+from app.services.embedding_cache import EmbeddingCache
+from app.services.vector_index import LocalVectorIndex
+from app.services.vector_backends import VectorBackend
+
+class RecordingIndex(LocalVectorIndex):
+    def __init__(self):
+        super().__init__(dim=2, mode="exact")
+        self.upserts = []
+
+    def upsert(self, vectors):
+        self.upserts.append(len(vectors))
+        super().upsert(vectors)
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.requests = []
+
+    def create(self, model, input):
+        self.requests.append(len(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in input])
+
+def make_store():
+    store = VectorStoreService.__new__(VectorStoreService)
+    store.embedding_model = "test"
+    store.backend = RecordingIndex()
+    store.claude = SimpleNamespace(embeddings=FakeEmbeddings())
+    return store
+
+def test_reingesting_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(vector_store_service, "EMBED_BATCH_SIZE", 10)
+    monkeypatch.setattr(vector_store_service, "UPSERT_BATCH_SIZE", 25)
+    store = make_store()
+    lines = [f"字幕 {i}" for i in range(95)]
+
+    first = store.add_transcriptions(lines + ["字幕  0"])
+    assert first == {"received": 96, "skipped": 1, "added": 95}
+    assert sorted(store.claude.embeddings.requests) == [5] + [10] * 9
+    assert sorted(store.backend.upserts) == [20, 25, 25, 25]
+    assert store.backend.fetch_ids([transcription_id("字幕 3")]) == {transcription_id("字幕 3")}
+
+    second = store.add_transcriptions(lines[:50] + ["new line"])
+    assert second == {"received": 51, "skipped": 50, "added": 1}
+    assert store.claude.embeddings.requests[-1] == 1
+    assert len(store.backend) == 96
+
+def test_query_embeddings_are_cached(tmp_path, monkeypatch):
+    path = str(tmp_path / "embeddings.sqlite")
+    monkeypatch.setattr(VectorStoreService, "embedding_cache", EmbeddingCache(max_entries=2, path=path))
+    store = make_store()
+
+    first = store.embed_texts(["食べ物", "天気", "食べ物 "])
+    assert store.claude.embeddings.requests == [2]
+    assert (first[0] == first[2]).all()
+
+    store.embed_text("旅行")   # evicts 食べ物 from memory; it stays on disk
+    store.embed_text("食べ物")
+    assert store.claude.embeddings.requests == [2, 1]
+    assert VectorStoreService.embedding_cache.stats["disk_hits"] == 1
+
+    # A new process starts with an empty memory tier
+    monkeypatch.setattr(VectorStoreService, "embedding_cache", EmbeddingCache(path=path))
+    restarted = make_store()
+    assert (restarted.embed_text("天気") == first[1]).all()
+    assert restarted.claude.embeddings.requests == []
+
+def test_local_index_add_delete_snapshot(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(500, 16)).astype(np.float32)
+    index = LocalVectorIndex(16, mode="ivf", nprobe=4)
+    index.upsert([{"id": f"v{i}", "values": v, "metadata": {"text": str(i)}} for i, v in enumerate(vectors)])
+
+    top = index.query(vectors[42], 3)
+    assert top[0]["id"] == "v42" and abs(top[0]["score"] - 1) < 1e-5
+
+    index.delete([f"v{i}" for i in range(0, 500, 2)])
+    assert len(index) == 250
+    assert index.query(vectors[42], 1)[0]["id"] != "v42"
+
+    index.snapshot(str(tmp_path / "index"))
+    loaded = LocalVectorIndex.load(str(tmp_path / "index"), mode="ivf", nprobe=4)
+    assert len(loaded) == 250
+    assert loaded.query(vectors[43], 1)[0]["metadata"] == {"text": "43"}
+
+    # The mapped snapshot is copy-on-write: adding after load works
+    loaded.upsert([{"id": "new", "values": vectors[0], "metadata": {"text": "new"}}])
+    assert loaded.query(vectors[0], 1)[0]["id"] == "new"
+
+@pytest.mark.parametrize("options", [{"mode": "exact"}, {}])
+def test_untrained_snapshot_accepts_writes_after_load(tmp_path, options):
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(5, 8)).astype(np.float32)
+    index = LocalVectorIndex(8, **options)
+    index.upsert([{"id": f"v{i}", "values": v, "metadata": {"text": str(i)}} for i, v in enumerate(vectors)])
+    index.snapshot(str(tmp_path / "index"))
+
+    loaded = LocalVectorIndex.load(str(tmp_path / "index"), **options)
+    loaded.upsert([{"id": "new", "values": vectors[0], "metadata": {"text": "new"}}])
+    loaded.delete(["v2"])
+    assert len(loaded) == 5
+    assert loaded.query(vectors[2], 1)[0]["id"] != "v2"
+    assert loaded.query(vectors[3], 1)[0]["id"] == "v3"
+
+def test_incomplete_backends_fail_when_constructed():
+    class NoQuery(VectorBackend):
+        def fetch_ids(self, ids):
+            return set()
+
+        def upsert(self, vectors):
+            pass
+
+        def delete(self, ids):
+            pass
+
+    with pytest.raises(TypeError):
+        NoQuery()
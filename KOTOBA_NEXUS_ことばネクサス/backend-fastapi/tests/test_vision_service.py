@@ -0,0 +1,74 @@
+import asyncio
+import httpx
+import anthropic
+import pytest
+from fastapi import HTTPException
+from app.services import vision_service
+from app.services.vision_service import VisionService
+from app.utils.concurrency import BoundedLimiter
+
+REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+def status_error(status: int) -> anthropic.APIStatusError:
+    response = httpx.Response(status, request=REQUEST)
+    return anthropic.APIStatusError(f"status {status}", response=response, body=None)
+
+class FakeMessages:
+    def __init__(self, error=None, delay=0.0):
+        self.error = error
+        self.delay = delay
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        raise self.error
+
+class FakeClaude:
+    def __init__(self, **kwargs):
+        self.messages = FakeMessages(**kwargs)
+
+def call(service: VisionService):
+    async def run():
+        return await service.process_images([], "prompt")
+    return asyncio.run(run())
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(VisionService, "limiter", BoundedLimiter(1, 0))
+    service = VisionService()
+    assert service.claude.max_retries == 0 and service.claude.timeout > vision_service.VISION_CALL_TIMEOUT
+    return service
+
+@pytest.mark.parametrize("error, status", [
+    (anthropic.APITimeoutError(request=REQUEST), 504),
+    (status_error(429), 503),
+    (status_error(529), 503),
+    (status_error(500), 502),
+    (anthropic.APIConnectionError(request=REQUEST), 502),
+])
+def test_upstream_failures_are_not_client_errors(service, error, status):
+    service.claude = FakeClaude(error=error)
+    with pytest.raises(HTTPException) as raised:
+        call(service)
+    assert raised.value.status_code == status
+
+def test_rejected_requests_stay_unsuccessful_results(service):
+    service.claude = FakeClaude(error=status_error(400))
+    assert call(service)["success"] is False
+
+def test_slow_calls_time_out_and_full_queues_are_rejected(service, monkeypatch):
+    monkeypatch.setattr(vision_service, "VISION_CALL_TIMEOUT", 0.05)
+    service.claude = FakeClaude(error=status_error(500), delay=1)
+
+    async def run():
+        first = asyncio.ensure_future(service.process_images([], "prompt"))
+        await asyncio.sleep(0)
+        # The only slot is taken and no one may wait for it
+        with pytest.raises(HTTPException) as busy:
+            await service.process_images([], "prompt")
+        with pytest.raises(HTTPException) as slow:
+            await first
+        return busy.value, slow.value
+
+    busy, slow = asyncio.run(run())
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == "2"
+    assert slow.status_code == 504
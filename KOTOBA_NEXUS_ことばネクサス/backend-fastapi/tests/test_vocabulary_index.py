@@ -0,0 +1,30 @@
+from app.services.vocabulary_index import VocabularyIndex
+
+VERBS = [
+    {"id": "v1", "japanese": "食べる", "romaji": "taberu", "english": "to eat"},
+    {"id": "v2", "japanese": "飲む", "romaji": "nomu", "english": "to drink"},
+    {"id": "v3", "japanese": "食べ始める", "romaji": "tabehajimeru", "english": "to start eating"},
+]
+ADJECTIVES = [
+    {"id": "a1", "japanese": "高い", "romaji": "takai", "english": "tall; expensive"},
+]
+
+def test_lookup_by_id_does_not_mutate_source():
+    index = VocabularyIndex(VERBS, ADJECTIVES, "v1")
+    word = index.get("a1")
+    assert word["word_type"] == "adjective"
+    assert "word_type" not in ADJECTIVES[0]
+    assert index.get("missing") is None
+
+def test_search_ranks_exact_then_prefix_then_substring():
+    index = VocabularyIndex(VERBS, ADJECTIVES, "v1")
+    total, results = index.search("TABE")
+    assert total == 2
+    assert [word["id"] for word in results] == ["v1", "v3"]
+
+    total, results = index.search("食べる")
+    assert [word["id"] for word in results] == ["v1"]
+
+    total, results = index.search("to", limit=2, offset=1)
+    assert total == 3
+    assert len(results) == 2
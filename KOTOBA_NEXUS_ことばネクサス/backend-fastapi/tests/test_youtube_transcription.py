@@ -0,0 +1,100 @@
+import asyncio
+import os
+import httpx
+import pytest
+from fastapi import HTTPException
+from app.services.subtitles import SubtitleParser, parse_subtitles, window_segments
+from app.services.youtube_transcription_service import YouTubeTranscriptionService, video_id_from_url
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+VIDEO_ID = "dQw4w9WgXcQ"
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8", newline="") as f:
+        return f.read()
+
+def test_parser_handles_chunked_rolling_vtt_and_srt():
+    document = read_fixture("auto_captions.ja.vtt")
+    parser = SubtitleParser()
+    segments = []
+    # Feed in awkward chunks, splitting lines and multibyte text
+    for offset in range(0, len(document), 7):
+        segments.extend(parser.feed(document[offset:offset + 7]))
+    segments.extend(parser.close())
+
+    assert [segment.text for segment in segments] == ["こんにちは皆さん", "今日は天気がいいです", "公園に行きましょう", "また&明日"]
+    assert (segments[1].start, segments[1].end) == (4.01, 12.0)
+
+    # Uploaded subtitles keep a line repeated by the speaker
+    srt = parse_subtitles([read_fixture("subtitles.ja.srt")])
+    assert [(segment.start, segment.text) for segment in srt] == [(1.0, "はい"), (3.5, "はい そうです")]
+
+def test_windows_overlap():
+    segments = parse_subtitles([read_fixture("auto_captions.ja.vtt")])
+    windows = window_segments(segments, window_seconds=30, overlap_seconds=20, separator="")
+    assert [window["text"] for window in windows] == [
+        "こんにちは皆さん今日は天気がいいです公園に行きましょう",
+        "公園に行きましょうまた&明日",
+    ]
+    assert (windows[0]["start"], windows[0]["end"]) == (0.0, 25.0)
+    assert (windows[1]["start"], windows[1]["end"]) == (12.01, 40.0)
+
+def test_video_ids():
+    assert video_id_from_url(f"https://www.youtube.com/watch?v={VIDEO_ID}&t=30s") == VIDEO_ID
+    assert video_id_from_url(f"https://youtu.be/{VIDEO_ID}?si=abc") == VIDEO_ID
+    assert video_id_from_url(f"youtube.com/shorts/{VIDEO_ID}") == VIDEO_ID
+    assert video_id_from_url("https://example.com/watch?v=dQw4w9WgXcQ") is None
+
+def test_transcription_is_fetched_once_and_cached_on_disk(tmp_path, monkeypatch):
+    calls = {"info": 0, "track": 0}
+
+    def extract_info(video_url):
+        calls["info"] += 1
+        return {
+            "id": VIDEO_ID,
+            "title": "fixture",
+            "duration": 40,
+            "subtitles": {"en": [{"ext": "vtt", "url": "https://subs.test/en.vtt"}]},
+            "automatic_captions": {
+                "ja": [{"ext": "json3", "url": "https://subs.test/ja.json3"}, {"ext": "vtt", "url": "https://subs.test/ja.vtt"}],
+            },
+        }
+
+    def handler(request):
+        calls["track"] += 1
+        assert str(request.url) == "https://subs.test/ja.vtt"
+        return httpx.Response(200, text=read_fixture("auto_captions.ja.vtt"))
+
+    monkeypatch.setattr(YouTubeTranscriptionService, "extract_info", staticmethod(extract_info))
+
+    async def run():
+        service = YouTubeTranscriptionService(cache_dir=str(tmp_path))
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        first, second = await asyncio.gather(
+            service.get_transcription(f"https://youtu.be/{VIDEO_ID}", "ja"),
+            service.get_transcription(f"https://www.youtube.com/watch?v={VIDEO_ID}", "ja"),
+        )
+        await service.close()
+
+        # A new worker reads the disk cache and never calls yt-dlp
+        restarted = YouTubeTranscriptionService(cache_dir=str(tmp_path))
+        third = await restarted.get_transcription(VIDEO_ID, "ja")
+        with pytest.raises(HTTPException) as error:
+            await restarted.get_transcription(VIDEO_ID, "fr")
+        return first, second, third, error.value
+
+    first, second, third, error = asyncio.run(run())
+    assert calls == {"info": 2, "track": 1}
+    assert first["source"] == "automatic" and first["cached"] is False
+    assert first["text"] == "こんにちは皆さん今日は天気がいいです公園に行きましょうまた&明日"
+    assert second["segments"] == first["segments"]
+    assert third["cached"] is True and third["windows"] == first["windows"]
+    assert error.status_code == 404
+
+@pytest.mark.parametrize("lang", ["../../etc/passwd", "ja/../x", "", "j", "ja_JP", "ja-"])
+def test_language_must_be_a_tag(tmp_path, lang):
+    service = YouTubeTranscriptionService(cache_dir=str(tmp_path))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.get_transcription(VIDEO_ID, lang))
+    assert error.value.status_code == 400
+    assert os.listdir(tmp_path) == []